@@ -1,5 +1,8 @@
 from fastapi import APIRouter, HTTPException
-from app.models.llm_parsed import DiseaseHistoryRequest, ParsedDiseaseResponse
+from app.core.config import settings
+from app.models.llm_parsed import (
+    DiseaseHistoryBatchRequest, DiseaseHistoryRequest, ParsedDiseaseBatchResponse, ParsedDiseaseResponse,
+)
 from app.services.llm_service import LLMService
 
 router = APIRouter()
@@ -14,9 +17,29 @@ async def parse_disease(request: DiseaseHistoryRequest):
     if not request.history.strip():
         raise HTTPException(status_code=400, detail="Medical history cannot be empty.")  # ✅ Ensure valid input
 
-    result = LLMService.process_disease_history(request.history, request.img_url)
+    # ✅ Awaited on the async LLM gateway; slow LLM calls don't block other requests
+    result = await LLMService.process_disease_history(request.history, request.img_url)
 
     if not result["diseases"]:
         raise HTTPException(status_code=400, detail="No diseases detected.")
 
-    return result
\ No newline at end of file
+    return result
+
+
+@router.post("/parse-disease-histories", response_model=ParsedDiseaseBatchResponse)
+async def parse_diseases(request: DiseaseHistoryBatchRequest):
+    """
+    Batch form of /parse-disease-history for bulk onboarding: one result per history, in order.
+    Histories with no detected diseases get an empty list instead of failing the whole batch.
+    """
+    if not request.histories:
+        raise HTTPException(status_code=400, detail="At least one medical history is required.")
+    if len(request.histories) > settings.LLM_BATCH_MAX_HISTORIES:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.LLM_BATCH_MAX_HISTORIES} histories per request.",
+        )
+
+    # ✅ Duplicates, cached and locally matched histories skip the LLM; the rest share multi-item prompts
+    results = await LLMService.process_disease_histories(request.histories)
+
+    return {"results": results}
@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from app.core.concurrency import run_in_pool
 from app.core.database import get_db
 from app.models.recent_activity import RecentActivity
-from app.services.recommender.hybrid import hybrid_recommendation
+from app.services.exercise_service import get_exercise_index
+from app.services.recommender.exercise_model import get_exercise_model
+from app.services.recommender.workers import recommend
+from app.services.recommender.interaction_matrix import apply_interaction_delta, interaction_score
+from app.services.recommender.popularity import apply_like_delta
+from app.services.recommender.refresh_scheduler import get_refresh_scheduler
 from pydantic import BaseModel
 from app.models.user import User
-from app.models.recommendations import Recommendation  # Fixed model name
-from app.models.meal import Meal
+from app.repositories.recommendation_repository import delete_recommendations, get_recent_meal_recommendations
+from app.services.recommendations import store_recommendations
 from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
 router = APIRouter()
 
 
@@ -36,38 +40,37 @@ async def recommend_meals(user_id: int, top_n: int = 10, refresh: bool = False,
     
     If refresh=True, forces regeneration of recommendations
     """
+    # ✅ Run the blocking DB and recommender work on the bounded worker pool, off the event loop
+    return await run_in_pool(_recommend_meals, db, user_id, top_n, refresh)
+
+
+def _recommend_meals(db: Session, user_id: int, top_n: int, refresh: bool):
     # Check if we have recent recommendations stored (less than 24 hours old)
     recent_time = datetime.utcnow() - timedelta(hours=24)
     
     # Only use stored recommendations if not forcing refresh
     if not refresh:
-        stored_recommendations = db.query(Recommendation).filter(
-            Recommendation.user_id == user_id,
-            Recommendation.created_at > recent_time
-        ).all()
-        
+        # ✅ One query: stored recommendations joined to their meals, response columns only
+        stored_recommendations = get_recent_meal_recommendations(db, user_id, recent_time)
+
         if stored_recommendations:
-    # Format stored recommendations
-            recommendations_list = []
-            for rec in stored_recommendations:
-                meal = db.query(Meal).filter(Meal.meal_id == rec.meal_id).first()
-                print(meal.veg_non)
-                if meal:
-                    recommendations_list.append({
-                        "meal_id": meal.meal_id,
-                        "name": meal.name,
-                        "nutrient": meal.nutrient,
-                        "disease": meal.disease,
-                        "diet": meal.diet,
-                        "is_vegetarian": True if meal.veg_non == 0 else False,
-                        "reason": rec.recommendation_reason
-                    })
-            
+            recommendations_list = [
+                {
+                    "meal_id": row.meal_id,
+                    "name": row.name,
+                    "nutrient": row.nutrient,
+                    "disease": row.disease,
+                    "diet": row.diet,
+                    "is_vegetarian": True if row.veg_non == 0 else False,
+                    "reason": row.recommendation_reason
+                }
+                for row in stored_recommendations
+            ]
             return {"user_id": user_id, "recommendations": recommendations_list}
 
             
     # Generate fresh recommendations
-    recommendations = hybrid_recommendation(db, user_id, top_n)
+    recommendations = recommend(db, user_id, top_n)
     
     if isinstance(recommendations, dict) and "error" in recommendations:
         raise HTTPException(status_code=404, detail=recommendations["error"])
@@ -88,13 +91,18 @@ class InteractionRequest(BaseModel):
 @router.post("/interact")
 async def interact_with_meal(
     request: InteractionRequest, 
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
     Logs user interactions (like, dislike, purchase, and rating) with meals.
-    After interaction, triggers recommendations for users with similar disease history.
+    After interaction, drops the user's stored recommendations (the next read recomputes them) and schedules
+    a refresh of those of users with similar disease history.
     """
+    # ✅ DB writes run on the worker pool
+    return await run_in_pool(_interact_with_meal, request, db)
+
+
+def _interact_with_meal(request: InteractionRequest, db: Session):
     valid_actions = ["like", "dislike", "buy", "rate"]
     if request.action not in valid_actions:
         raise HTTPException(status_code=400, detail="Invalid action. Choose from 'like', 'dislike', 'buy', or 'rate'.")
@@ -110,6 +118,8 @@ async def interact_with_meal(
         RecentActivity.meal_id == request.meal_id
     ).first()
 
+    was_liked = bool(existing_activity.liked) if existing_activity else False
+
     if not existing_activity:
         # Create a new entry if interaction doesn't exist
         existing_activity = RecentActivity(
@@ -134,22 +144,20 @@ async def interact_with_meal(
         
         existing_activity.timestamp = datetime.now()
 
+    score = interaction_score(existing_activity.liked, existing_activity.purchased, existing_activity.rated)
+    # ✅ Invalidate the user's stored set in the same transaction, so a read right after this interaction
+    # (e.g. the dislike flow fetching a replacement meal) never serves a set that predates it
+    delete_recommendations(db, [request.user_id])
     db.commit()
 
-    # Update recommendations for the current user
-    recommendations = hybrid_recommendation(db, request.user_id)
-    for rec in recommendations:
-        if "is_vegetarian" not in rec and "diet" in rec:
-            rec["is_vegetarian"] = "vegetarian" in rec["diet"].lower() if rec["diet"] else False
-    store_recommendations(db, request.user_id, recommendations)
-    
-    # Update recommendations for users with similar disease history in the background
-    background_tasks.add_task(
-        update_recommendations_for_similar_users, 
-        db=db, 
-        user_id=request.user_id, 
-        user_disease=user.disease
-    )
+    # ✅ Patch the cached interaction matrix in place instead of rebuilding it on the next request
+    apply_interaction_delta(request.user_id, request.meal_id, score)
+    # ✅ Keep the global and cohort like counts current without recounting the activity table
+    apply_like_delta(request.meal_id, user.disease, was_liked, existing_activity.liked)
+
+    # ✅ Refresh the cohort's stored recommendations after the debounce window;
+    # repeat interactions while a refresh is pending are coalesced into it
+    get_refresh_scheduler().mark_cohort(user.disease)
 
     return {"message": f"Meal {request.meal_id} {request.action}d successfully!", "action": request.action}
 
@@ -158,6 +166,11 @@ async def recommend_exercises(user_id: int, exercise_request: ExerciseRequest, d
     """
     Recommend exercises based on user's physical attributes using machine learning.
     """
+    # ✅ Model inference runs on the worker pool
+    return await run_in_pool(_recommend_exercises, user_id, exercise_request, db)
+
+
+def _recommend_exercises(user_id: int, exercise_request: ExerciseRequest, db: Session):
     try:
         height = exercise_request.height
         weight = exercise_request.weight
@@ -173,61 +186,22 @@ async def recommend_exercises(user_id: int, exercise_request: ExerciseRequest, d
         else:
             bmi_category = "Obese"
 
-        # Load exercise data using pd.read_csv
+        # ✅ Load the exercise data and the trained intensity model once; requests only run inference
         try:
-            exercise_df = pd.read_csv("/app/data/cleaned/cleaned_exercise.csv")
+            exercise_model = get_exercise_model()
+            exercise_index = get_exercise_index()
         except FileNotFoundError:
             raise HTTPException(status_code=500, detail="Exercise data file not found")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error loading exercise data: {str(e)}")
 
+        predicted_intensity = exercise_model.predict(bmi)
 
-        from sklearn.ensemble import RandomForestRegressor
-        from sklearn.preprocessing import StandardScaler
-
-        # Train model - Correct the column names to match the exercise dataset
-        X_train = exercise_df[["bmi"]]
-        y_train = exercise_df["exercise_intensity"]
-
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(X_train_scaled, y_train)
-
-        user_features = np.array([[bmi]])
-        user_features_scaled = scaler.transform(user_features)
-        predicted_intensity = model.predict(user_features_scaled)[0]
-
-        feature_importance = model.feature_importances_
-
-        intensity_range = (max(0, predicted_intensity - 1), min(10, predicted_intensity + 1))
-
-        # Filter exercises based on the predicted intensity range
-        filtered_exercises = exercise_df[
-            exercise_df['exercise_intensity'].between(intensity_range[0], intensity_range[1])
-        ]
-
-        if len(filtered_exercises) < 5:
-            intensity_range = (max(0, predicted_intensity - 2), min(10, predicted_intensity + 2))
-            filtered_exercises = exercise_df[
-                exercise_df['exercise_intensity'].between(intensity_range[0], intensity_range[1])
-            ]
-
-        exercise_types = filtered_exercises['exercise'].unique()
-        recommended_exercises = pd.DataFrame()
-
-        for exercise_type in exercise_types:
-            type_exercises = filtered_exercises[filtered_exercises['exercise'] == exercise_type]
-            if not type_exercises.empty:
-                type_exercises['intensity_diff'] = abs(type_exercises['exercise_intensity'] - predicted_intensity)
-                type_exercises = type_exercises.sort_values('intensity_diff').head(2)
-                recommended_exercises = pd.concat([recommended_exercises, type_exercises])
-
-        recommended_exercises = recommended_exercises.head(5)
+        # ✅ Band query and "two closest per type" on the pre-sorted exercise index
+        recommended_exercises = exercise_index.recommend(predicted_intensity, limit=5)
 
         exercise_list = []
-        for _, exercise in recommended_exercises.iterrows():
+        for exercise in recommended_exercises:
             exercise_info = {
                 "name": exercise['exercise'],
                 "type": "Not available",
@@ -246,67 +220,19 @@ async def recommend_exercises(user_id: int, exercise_request: ExerciseRequest, d
             "bmi": bmi,
             "bmi_category": bmi_category,
             "predicted_intensity": float(predicted_intensity),
-            "feature_importance": {
-                "bmi": float(feature_importance[0])
-            },
+            "feature_importance": exercise_model.feature_importance,
             "recommendations": exercise_recommendations
         }
     except Exception as e:
         print(f"Error recommending exercises: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error recommending exercises: {str(e)}")
     
-def store_recommendations(db: Session, user_id: int, recommendations: list):
+@router.get("/refresh-metrics")
+async def refresh_metrics():
     """
-    Store recommendations in the database
+    Queue depth, refresh lag and counters of the background recommendation refresh.
     """
-    try:
-        # Clear existing recommendations for the user
-        db.query(Recommendation).filter(Recommendation.user_id == user_id).delete()
-        
-        # Store new recommendations
-        for rec in recommendations:
-            meal_id = rec["meal_id"]
-            
-            new_recommendation = Recommendation(
-                user_id=user_id,
-                meal_id=meal_id,
-                recommendation_reason="Based on your preferences and similar users",
-                created_at=datetime.utcnow()
-            )
-            db.add(new_recommendation)
-        
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        print(f"Error storing recommendations for user {user_id}: {str(e)}")
-
-def update_recommendations_for_similar_users(db: Session, user_id: int, user_disease: str):
-    """
-    Background task to update recommendations for users with similar disease history.
-    """
-    # Find users with similar disease history
-    similar_users = db.query(User).filter(
-        User.user_id != user_id,  # Exclude the current user
-        User.disease == user_disease  # Match the exact disease
-    ).all()
-    
-    # Add the current user to the list to update their recommendations too
-    current_user = db.query(User).filter(User.user_id == user_id).first()
-    if current_user:
-        similar_users.append(current_user)
-    
-    # Generate new recommendations for each similar user
-    for similar_user in similar_users:
-        try:
-            # Generate recommendations using the hybrid recommender
-            recommendations = hybrid_recommendation(db, similar_user.user_id)
-            
-            # Store the recommendations
-            store_recommendations(db, similar_user.user_id, recommendations)
-            
-            print(f"Updated recommendations for user {similar_user.user_id} with disease {user_disease}")
-        except Exception as e:
-            print(f"Error updating recommendations for user {similar_user.user_id}: {str(e)}")
+    return get_refresh_scheduler().metrics()
 
 
 # Add a new endpoint to refresh recommendations on login
@@ -318,9 +244,14 @@ async def refresh_user_recommendations(
     """
     Refreshes recommendations for a user, typically called after login
     """
+    # ✅ Recommendation refresh runs on the worker pool
+    return await run_in_pool(_refresh_user_recommendations, user_id, db)
+
+
+def _refresh_user_recommendations(user_id: int, db: Session):
     try:
         # Generate fresh recommendations
-        recommendations = hybrid_recommendation(db, user_id)
+        recommendations = recommend(db, user_id)
         
         # Store the recommendations
         store_recommendations(db, user_id, recommendations)
@@ -338,18 +269,8 @@ async def rerun_recommendations(
     Reruns both exercise and meal recommendations for the user after profile updates.
     """
     try:
-        # Fetch user data
-        user = db.query(User).filter(User.user_id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        # Rerun meal recommendations
-        meal_recommendations = hybrid_recommendation(db, user_id, top_n=10)
-        if isinstance(meal_recommendations, dict) and "error" in meal_recommendations:
-            raise HTTPException(status_code=500, detail=meal_recommendations["error"])
-
-        # Store meal recommendations in the database
-        store_recommendations(db, user_id, meal_recommendations)
+        # ✅ Rerun meal recommendations on the worker pool
+        user, meal_recommendations = await run_in_pool(_rerun_meal_recommendations, user_id, db)
 
         # Create exercise request with updated user data
         exercise_request = ExerciseRequest(
@@ -371,3 +292,19 @@ async def rerun_recommendations(
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to rerun recommendations: {str(e)}")
+
+
+def _rerun_meal_recommendations(user_id: int, db: Session):
+    # Fetch user data
+    user = db.query(User).filter(User.user_id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Rerun meal recommendations
+    meal_recommendations = recommend(db, user_id, top_n=10)
+    if isinstance(meal_recommendations, dict) and "error" in meal_recommendations:
+        raise HTTPException(status_code=500, detail=meal_recommendations["error"])
+
+    # Store meal recommendations in the database
+    store_recommendations(db, user_id, meal_recommendations)
+    return user, meal_recommendations
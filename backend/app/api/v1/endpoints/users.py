@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from app.core.concurrency import run_in_pool
 from app.core.database import get_db
 from app.services.user_service import create_user, get_user_by_username, update_user, login_user
 from pydantic import BaseModel
@@ -48,6 +49,11 @@ async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
     """
     Fetch user profile data by user_id.
     """
+    # ✅ Sync DB session: query on the worker pool, off the event loop
+    return await run_in_pool(_get_user_profile, user_id, db)
+
+
+def _get_user_profile(user_id: int, db: Session):
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -64,16 +70,20 @@ async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
 
 @router.post("/signup")
 async def signup(user: SignupRequest, db: Session = Depends(get_db)):
-
     print("Received Data:", user.dict())  # ✅ Debugging
-    
-    db_user = get_user_by_username(db, user.username)
-    if db_user:
+
+    # ✅ Reject taken usernames before spending an LLM call on them
+    if await run_in_pool(get_user_by_username, db, user.username):
         raise HTTPException(status_code=400, detail="Username already exists")
-    
-    # ✅ Call LLM to parse disease and recommend diet
-    disease_diet_data = LLMService.process_disease_history(user.disease)
-    
+
+    # ✅ Call LLM to parse disease and recommend diet (awaited on the async gateway, off the worker pool)
+    disease_diet_data = await LLMService.process_disease_history(user.disease)
+
+    # ✅ bcrypt hashing and DB insert block; run them on the worker pool
+    return await run_in_pool(_signup, user, disease_diet_data, db)
+
+
+def _signup(user: SignupRequest, disease_diet_data: dict, db: Session):
     parsed_diseases = ", ".join(disease_diet_data["diseases"])
     recommended_diet = disease_diet_data["recommended_diet"]
 
@@ -99,6 +109,11 @@ async def login(user: LoginRequest, db: Session = Depends(get_db)):
     """
     User login endpoint that triggers recommendations.
     """
+    # ✅ bcrypt check and login recommendations run on the worker pool
+    return await run_in_pool(_login, user, db)
+
+
+def _login(user: LoginRequest, db: Session):
     result = login_user(db, user.username, user.password)
     
     if "error" in result:
@@ -108,9 +123,14 @@ async def login(user: LoginRequest, db: Session = Depends(get_db)):
 
 @router.put("/update-user/{user_id}")
 async def update_user_details(user_id: int, user_update: UserUpdateRequest, db: Session = Depends(get_db)):
-    # Process disease history and get recommended diet
-    disease_diet_data = LLMService.process_disease_history(user_update.disease)
-    
+    # Process disease history and get recommended diet (awaited on the async LLM gateway)
+    disease_diet_data = await LLMService.process_disease_history(user_update.disease)
+
+    # ✅ DB update runs on the worker pool
+    return await run_in_pool(_update_user_details, user_id, user_update, disease_diet_data, db)
+
+
+def _update_user_details(user_id: int, user_update: UserUpdateRequest, disease_diet_data: dict, db: Session):
     parsed_diseases = ", ".join(disease_diet_data["diseases"])
     recommended_diet = disease_diet_data["recommended_diet"]
 
@@ -137,6 +157,11 @@ async def change_password(user_id: int, password_data: ChangePasswordRequest, db
     Change user password endpoint.
     Requires old password verification before updating to new password.
     """
+    # ✅ bcrypt verify/hash run on the worker pool
+    return await run_in_pool(_change_password, user_id, password_data, db)
+
+
+def _change_password(user_id: int, password_data: ChangePasswordRequest, db: Session):
     # Find the user
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
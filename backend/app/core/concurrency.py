@@ -0,0 +1,42 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    The bounded pool that blocking request work (sync SQLAlchemy sessions, recommender and model code,
+    bcrypt, LLM calls) runs on. Its size is WORKER_POOL_SIZE, so at most that many such jobs run at once
+    and the rest queue instead of oversubscribing the CPU.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.WORKER_POOL_SIZE, thread_name_prefix="worker")
+    return _executor
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """
+    Awaits `func(*args, **kwargs)` on the worker pool, keeping the event loop free for other requests.
+    Exceptions (including HTTPException) propagate to the caller.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor():
+    """
+    Waits for running jobs and stops the pool. Called when the application shuts down.
+    """
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
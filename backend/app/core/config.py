@@ -8,6 +8,52 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your_secret_key_here"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60  # Token expires in 1 hour
     OPENAI_API_KEY:str = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")  # e.g. a local stub server; empty = the OpenAI API
+
+    # LLM gateway: per-attempt timeout, calls in flight at once, retries with exponential backoff
+    LLM_MODEL: str = "gpt-3.5-turbo"
+    LLM_TIMEOUT_SECONDS: float = 20
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # Threads that blocking request work (DB sessions, recommenders, models, bcrypt, LLM calls) is offloaded to
+    WORKER_POOL_SIZE: int = 8
+
+    # In-memory meal catalog: how often to check the `meals` table for added/removed rows
+    MEAL_CATALOG_CHECK_SECONDS: float = 60
+
+    # Precomputed recommender artifacts (similarity indexes, fitted models)
+    ARTIFACTS_DIR: str = os.getenv("ARTIFACTS_DIR", "data/artifacts")
+    ITEM_SIMILARITY_TOP_K: int = 50
+    ITEM_SIMILARITY_METRIC: str = "pearson"  # "pearson" or "cosine"
+    USER_SIMILARITY_METRIC: str = "pearson"  # "pearson" or "cosine"
+    USER_NEIGHBOUR_LSH_MIN_USERS: int = 0  # Use the approximate LSH index from this many users (0 = always exact)
+    INTERACTION_FOLD_CELLS: int = 4096  # Pending interaction cells kept beside the CSR matrix before a fold
+    USER_PROFILE_CACHE_SIZE: int = 10000  # Cached content-based profile vectors
+    RECOMMENDER_PROCESSES: int = 0  # Worker processes for hybrid recommendations (0 = run in the API process)
+    RECOMMENDER_SNAPSHOT_MAX_UPDATES: int = 200  # Updates replayed by workers before a fresh snapshot is written
+
+    # Background refresh of stored recommendations after interactions
+    RECOMMENDATION_REFRESH_WINDOW_SECONDS: float = 5  # Repeat marks for a user or cohort within this window coalesce
+    RECOMMENDATION_REFRESH_BATCH_SIZE: int = 50  # Users refreshed per batch (one session each)
+    RECOMMENDATION_REFRESH_WORKERS: int = 2  # Batches refreshed at once
+
+    # Parsed disease histories, cached in memory and in a SQLite file under ARTIFACTS_DIR ("" = memory only)
+    DISEASE_PARSE_CACHE_SIZE: int = 10000
+    DISEASE_PARSE_CACHE_FILE: str = "disease_parse_cache.sqlite3"
+
+    # Batch parsing: histories the cache and local matcher can't resolve are sent this many per LLM prompt
+    LLM_BATCH_ITEMS: int = 20
+    LLM_BATCH_MAX_HISTORIES: int = 1000  # Largest batch accepted by /llm/parse-disease-histories
+
+    # Datasets the disease parser reads on first use: valid diseases (user profiles) and disease → diets (meals)
+    USER_PROFILES_DATA_PATH: str = os.getenv("USER_PROFILES_DATA_PATH", "/app/data/cleaned/cleaned_user_profiles.csv")
+    MEALS_DATA_PATH: str = os.getenv("MEALS_DATA_PATH", "/app/data/cleaned/cleaned_meals.csv")
+
+    # Exercise dataset the intensity model is trained on; the saved model is retrained when its hash changes
+    EXERCISE_DATA_PATH: str = os.getenv("EXERCISE_DATA_PATH", "/app/data/cleaned/cleaned_exercise.csv")
+    EXERCISE_INTENSITY_ENGINE: str = "table"  # "table" (exported step table) or "forest" (model.predict)
 
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import ast
+from typing import Dict, FrozenSet, Iterable, Set
+import pandas as pd
+
+
+def parse_list(value) -> list:
+    """
+    A list column cell: the string form of a Python list ("['a', 'b']") parsed, lists as-is, anything else empty.
+    """
+    if isinstance(value, str):
+        return list(ast.literal_eval(value))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return []
+
+
+def scan_diets(disease_diet_map: pd.DataFrame, disease: str) -> Set[str]:
+    """
+    Diets of every meal whose Disease column contains `disease` (case-insensitive): a full scan of the table.
+    """
+    matched_diets = set()
+    matching_rows = disease_diet_map[disease_diet_map["Disease"].str.contains(disease, case=False, na=False)]
+    for diet_list in matching_rows["Diet"]:
+        matched_diets.update(parse_list(diet_list))
+    return matched_diets
+
+
+class DiseaseDietIndex:
+    """
+    Disease → diets lookup over the meals dataset, built once.
+
+    Every disease named in the Disease column is a key, mapped to the frozen set of diets of the meals
+    `scan_diets` would match for it, with the list columns parsed once at build time. A lookup for several
+    diseases is then a union of precomputed sets. Diseases that are not keys fall back to `scan_diets`.
+    """
+
+    def __init__(self, disease_diet_map: pd.DataFrame):
+        self.disease_diet_map = disease_diet_map
+        row_diets = [frozenset(parse_list(diet_list)) for diet_list in disease_diet_map["Diet"]]
+
+        diseases = set()
+        for disease_list in disease_diet_map["Disease"].dropna():
+            diseases.update(str(disease).lower() for disease in parse_list(disease_list))
+
+        self.diets: Dict[str, FrozenSet[str]] = {}
+        for disease in sorted(diseases):
+            matches = disease_diet_map["Disease"].str.contains(disease, case=False, na=False).to_numpy()
+            self.diets[disease] = frozenset().union(*(row_diets[i] for i in matches.nonzero()[0]))
+
+    def lookup(self, diseases: Iterable[str]) -> Set[str]:
+        """
+        Union of the diets recommended for each of `diseases`.
+        """
+        matched_diets = set()
+        for disease in diseases:
+            diets = self.diets.get(disease.lower())
+            if diets is None:
+                diets = scan_diets(self.disease_diet_map, disease)
+            matched_diets.update(diets)
+        return matched_diets
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+
+# Words a disease history may contain besides disease names and still be resolved locally
+FILLER_WORDS = {
+    "a", "also", "am", "an", "and", "as", "chronic", "diagnosed", "from", "had", "has", "have", "having",
+    "history", "i", "i'm", "im", "mild", "my", "of", "or", "plus", "severe", "suffer", "suffering", "the", "with",
+}
+PARSER_VERSION = 2  # Part of every cache key; bump when the local matcher or prompts change what a parse returns
+
+# Curated spellings and word forms of dataset disease names. Only these are resolved besides exact names:
+# similarity matching would also accept different conditions that are spelt alike (hypotension → hypertension).
+DISEASE_ALIASES = {
+    "anaemia": "anemia", "anaemic": "anemia", "anemic": "anemia",
+    "diabetes": "diabeties", "diabetic": "diabeties",
+    "goiter": "goitre",
+    "obese": "obesity",
+    "pregnant": "pregnancy",
+    "hypertensive": "hypertension",
+    "heart_diseases": "heart_disease", "cardiac_disease": "heart_disease",
+    "kidney_diseases": "kidney_disease", "renal_disease": "kidney_disease",
+}
+
+
+def normalise_history(history: str) -> str:
+    """
+    Lowercased history with whitespace collapsed, so trivially different spellings share a cache entry.
+    """
+    return " ".join(history.lower().split())
+
+
+def disease_set_version(valid_diseases: Iterable[str]) -> str:
+    """
+    Short hash of the valid disease set; cached parses are only reused while the set is unchanged.
+    """
+    return hashlib.sha256("\n".join(sorted(valid_diseases)).encode("utf-8")).hexdigest()[:16]
+
+
+def match_known_diseases(history: str, valid_diseases) -> Optional[List[str]]:
+    """
+    Resolves a history that only names known diseases, without the LLM.
+
+    Tokens are matched against `valid_diseases` exactly, as underscore-joined pairs ("kidney disease" →
+    kidney_disease) or through DISEASE_ALIASES ("diabetes" → diabeties). Returns the diseases in order of first
+    mention if every token is a disease or a filler word ("and", "with", ...); otherwise returns None and
+    the history needs the LLM.
+    """
+    tokens = re.findall(r"[a-z0-9_']+", normalise_history(history))
+    valid = set(valid_diseases)
+    found = []
+    i = 0
+    while i < len(tokens):
+        disease = None
+        if i + 1 < len(tokens):
+            disease = _known_disease(f"{tokens[i]}_{tokens[i + 1]}", valid)
+            step = 2
+        if disease is None:
+            disease = _known_disease(tokens[i], valid)
+            step = 1
+        if disease is None:
+            if tokens[i] not in FILLER_WORDS:
+                return None
+        elif disease not in found:
+            found.append(disease)
+        i += step
+    return found or None
+
+
+def parse_numbered_diseases(reply: str, count: int, valid_diseases) -> List[Optional[List[str]]]:
+    """
+    Per-item diseases from the reply to a multi-item prompt: a JSON object mapping item numbers ("1" to
+    `count`) to lists of diseases, possibly wrapped in other text. Diseases outside `valid_diseases` are
+    dropped; items the reply doesn't cover (or a reply that isn't JSON) come back as None.
+    """
+    start, end = reply.find("{"), reply.rfind("}")
+    try:
+        payload = json.loads(reply[start:end + 1]) if 0 <= start < end else {}
+    except ValueError:
+        payload = {}
+    if not isinstance(payload, dict):
+        payload = {}
+
+    results = []
+    for number in range(1, count + 1):
+        items = payload.get(str(number))
+        if isinstance(items, str):
+            items = items.split(",")
+        if not isinstance(items, list):
+            results.append(None)
+            continue
+        found = []
+        for disease in items:
+            disease = str(disease).strip()
+            if disease in valid_diseases and disease not in found:
+                found.append(disease)
+        results.append(found)
+    return results
+
+
+def _known_disease(token, valid):
+    if token in valid:
+        return token
+    alias = DISEASE_ALIASES.get(token)
+    return alias if alias in valid else None
+
+
+class DiseaseParseCache:
+    """
+    Content-addressed cache of disease parses: sha256(valid disease set version, normalised history) →
+    list of diseases.
+
+    Entries live in an in-memory LRU of `max_size` entries, backed by a SQLite file at `path` so they
+    survive restarts and are shared by every worker process. Without a path (or if the file cannot be
+    opened) the cache is memory-only.
+    """
+
+    def __init__(self, max_size=10000, path=None):
+        self.max_size = max_size
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._connection = sqlite3.connect(path, check_same_thread=False)
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS disease_parses (key TEXT PRIMARY KEY, diseases TEXT NOT NULL)"
+                )
+                self._connection.commit()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Disease parse cache is memory-only, could not open {path}: {str(e)}")
+                self._connection = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(history: str, version: str) -> str:
+        key = f"{PARSER_VERSION}\0{version}\0{normalise_history(history)}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key) -> Optional[List[str]]:
+        with self._lock:
+            diseases = self._entries.get(key)
+            if diseases is not None:
+                self._entries.move_to_end(key)
+                return list(diseases)
+            if self._connection is None:
+                return None
+            try:
+                row = self._connection.execute("SELECT diseases FROM disease_parses WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading disease parse cache: {str(e)}")
+                return None
+            if row is None:
+                return None
+            diseases = json.loads(row[0])
+            self._remember(key, diseases)
+            return list(diseases)
+
+    def put(self, key, diseases: List[str]):
+        with self._lock:
+            self._remember(key, list(diseases))
+            if self._connection is not None:
+                try:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO disease_parses (key, diseases) VALUES (?, ?)", (key, json.dumps(diseases)),
+                    )
+                    self._connection.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing disease parse cache: {str(e)}")
+
+    def get_many(self, keys) -> Dict[str, List[str]]:
+        """
+        The cached parses among `keys`, {key: diseases}: memory first, then one query for the rest.
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for key in dict.fromkeys(keys):
+                diseases = self._entries.get(key)
+                if diseases is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = list(diseases)
+                else:
+                    missing.append(key)
+            if not missing or self._connection is None:
+                return found
+            try:
+                rows = []
+                # SQLite caps the number of bound parameters per statement
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows += self._connection.execute(
+                        f"SELECT key, diseases FROM disease_parses WHERE key IN ({', '.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error reading disease parse cache: {str(e)}")
+                return found
+            for key, diseases in rows:
+                diseases = json.loads(diseases)
+                self._remember(key, diseases)
+                found[key] = list(diseases)
+        return found
+
+    def put_many(self, parses: Dict[str, List[str]]):
+        """
+        Stores several parses, {key: diseases}, with one executemany and a single commit.
+        """
+        if not parses:
+            return
+        with self._lock:
+            for key, diseases in parses.items():
+                self._remember(key, list(diseases))
+            if self._connection is not None:
+                try:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO disease_parses (key, diseases) VALUES (?, ?)",
+                        [(key, json.dumps(diseases)) for key, diseases in parses.items()],
+                    )
+                    self._connection.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing disease parse cache: {str(e)}")
+
+    def _remember(self, key, diseases):
+        self._entries[key] = diseases
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_disease_parse_cache() -> DiseaseParseCache:
+    """
+    The shared cache, persisted under ARTIFACTS_DIR (DISEASE_PARSE_CACHE_FILE; empty for memory-only).
+    """
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                path = None
+                if settings.DISEASE_PARSE_CACHE_FILE:
+                    path = os.path.join(settings.ARTIFACTS_DIR, settings.DISEASE_PARSE_CACHE_FILE)
+                _cache = DiseaseParseCache(settings.DISEASE_PARSE_CACHE_SIZE, path)
+    return _cache
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+from typing import Dict, List
+from app.core.config import settings
+
+
+def retryable_errors() -> tuple:
+    """
+    Failures worth retrying: the request may succeed a moment later. The openai package is imported here,
+    on first use, rather than by every process that imports the app.
+    """
+    import openai
+
+    return (
+        asyncio.TimeoutError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+
+
+class LLMGateway:
+    """
+    Async gateway for chat completions, shared by every request.
+
+    - Each attempt is bounded by `timeout` seconds.
+    - At most `max_concurrency` calls are in flight at once; the rest wait without blocking the event loop.
+    - Timeouts, connection errors, 429s and 5xx responses are retried up to `max_retries` times, with
+      exponential backoff (`backoff`, doubling per attempt, plus jitter).
+    - Identical requests (same model and messages) made while one is in flight share its result
+      (single-flight), so a burst of the same prompt costs one call.
+    """
+
+    def __init__(self, client=None, model=None, timeout=None, max_concurrency=None, max_retries=None, backoff=None):
+        self.model = model or settings.LLM_MODEL
+        self.timeout = settings.LLM_TIMEOUT_SECONDS if timeout is None else timeout
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.LLM_RETRY_BACKOFF_SECONDS if backoff is None else backoff
+        self._client = client
+        self._loop = None
+        self._semaphore = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+
+            # Retries are handled here, so they are counted against the same backoff and concurrency limit
+            self._client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL or None,
+                max_retries=0,
+            )
+        return self._client
+
+    def _bind_loop(self):
+        # The semaphore and in-flight futures belong to one event loop; start afresh if the loop changed
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._in_flight = {}
+
+    async def complete(self, messages: List[dict]) -> str:
+        """
+        The text of the first choice for `messages`. Raises the last error once retries are exhausted.
+        """
+        self._bind_loop()
+        key = hashlib.sha256(json.dumps([self.model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._complete_with_retries(messages))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded: one caller giving up does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _complete_with_retries(self, messages):
+        retryable = retryable_errors()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(
+                        self.client.chat.completions.create(model=self.model, messages=messages, timeout=self.timeout),
+                        self.timeout,
+                    )
+                return response.choices[0].message.content or ""
+            except retryable:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random() / 2))
+
+
+_gateway = None
+_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """
+    The shared gateway; its OpenAI client is created on first use.
+    """
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
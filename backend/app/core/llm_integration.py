@@ -1,32 +1,88 @@
-import openai
+import asyncio
+import threading
 import pandas as pd
 from typing import List, Dict, Optional
+from app.core.concurrency import run_in_pool
 from app.core.config import settings
-import ast
+from app.core.disease_parsing import (
+    DiseaseParseCache, disease_set_version, get_disease_parse_cache, match_known_diseases, normalise_history,
+    parse_numbered_diseases,
+)
+from app.core.diet_index import DiseaseDietIndex
+from app.core.llm_gateway import get_llm_gateway
 
-# ✅ Initialize OpenAI client (New API format)
-client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
 
-# Load preprocessed files
-DIET_FILE_PATH = "data/cleaned/cleaned_meals.csv"
-USER_PROFILES_PATH = "data/cleaned/cleaned_user_profiles.csv"
+class DiseaseData:
+    """
+    Valid diseases (from the user profile dataset) and the disease → diet index (from the meals dataset).
+    """
+
+    def __init__(self, user_profiles: pd.DataFrame, disease_diet_map: pd.DataFrame):
+        self.valid_diseases = set()
+        for diseases in user_profiles["Disease"].dropna():
+            for disease in diseases.split():
+                self.valid_diseases.add(disease.strip())
+
+        self.valid_diseases_version = disease_set_version(self.valid_diseases)
+        self.disease_diet_map = disease_diet_map
+        self.disease_diet_index = DiseaseDietIndex(disease_diet_map)  # ✅ Disease → diets, built once
+
+
+_disease_data = None
+_lock = threading.Lock()
 
-# Load valid diseases from the user profile dataset
-user_profiles = pd.read_csv(USER_PROFILES_PATH)
-valid_diseases = set()
 
-for diseases in user_profiles["Disease"].dropna():
-    for disease in diseases.split():
-        valid_diseases.add(disease.strip())
+def load_disease_data() -> DiseaseData:
+    """
+    The datasets, read from USER_PROFILES_DATA_PATH and MEALS_DATA_PATH once per process: at application
+    startup, or on first use when imported elsewhere.
+    """
+    global _disease_data
+    if _disease_data is None:
+        with _lock:
+            if _disease_data is None:
+                _disease_data = DiseaseData(
+                    pd.read_csv(settings.USER_PROFILES_DATA_PATH), pd.read_csv(settings.MEALS_DATA_PATH),
+                )
+    return _disease_data
+
 
-def parse_disease_history(history: str, img_url: Optional[str] = None) -> List[str]:
+async def parse_disease_history(history: str, img_url: Optional[str] = None) -> List[str]:
     """
     Uses GPT-3.5-Turbo to extract diseases ONLY from the preprocessed user profile dataset.
     Supports both text and optional image input.
+    Text-only histories are answered from the parse cache or the local matcher when possible.
     """
     if not history.strip():
         return []  # ✅ Handle empty history input gracefully
 
+    if img_url:
+        return await ask_llm_for_diseases(history, img_url) or []  # The image is not part of the cache key
+
+    # ✅ Identical histories (after normalisation) are parsed once per valid disease set; the cache's
+    # SQLite reads and writes run on the worker pool, off the event loop
+    data = load_disease_data()
+    cache = get_disease_parse_cache()
+    key = DiseaseParseCache.key(history, data.valid_diseases_version)
+    diseases = await run_in_pool(cache.get, key)
+    if diseases is not None:
+        return diseases
+
+    # ✅ Histories that just name known diseases are resolved without the LLM
+    diseases = match_known_diseases(history, data.valid_diseases)
+    if diseases is None:
+        diseases = await ask_llm_for_diseases(history)
+        if diseases is None:
+            return []  # The call failed; don't cache the failure
+    await run_in_pool(cache.put, key, diseases)
+    return diseases
+
+
+async def ask_llm_for_diseases(history: str, img_url: Optional[str] = None) -> Optional[List[str]]:
+    """
+    One GPT-3.5-Turbo call through the LLM gateway; returns the valid diseases it found, or None if the call failed.
+    """
+    valid_diseases = load_disease_data().valid_diseases
     valid_diseases_str = ", ".join(valid_diseases)
 
     prompt = (
@@ -41,12 +97,8 @@ def parse_disease_history(history: str, img_url: Optional[str] = None) -> List[s
         if img_url:
             messages.append({"role": "user", "content": {"type": "image_url", "image_url": {"url": img_url}}})
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # ✅ Using GPT-3.5-Turbo
-            messages=messages
-        )
-
-        diseases = response.choices[0].message.content.strip()
+        # ✅ Awaited on the shared async gateway (timeouts, retries, bounded concurrency, coalescing)
+        diseases = (await get_llm_gateway().complete(messages)).strip()
         print(diseases)
         if not diseases:
             return []  # ✅ Ensure a response is always returned
@@ -57,26 +109,105 @@ def parse_disease_history(history: str, img_url: Optional[str] = None) -> List[s
     
     except Exception as e:
         print("Error calling OpenAI:", e)
-        return []  # ✅ Prevent crashes if OpenAI API fails
+        return None  # ✅ Prevent crashes if OpenAI API fails
+
+
+async def parse_disease_histories(histories: List[str]) -> List[List[str]]:
+    """
+    Batch form of parse_disease_history for text-only histories; results are in the order of `histories`.
+    Duplicate histories are parsed once. Cached and locally matched histories are resolved first, and the
+    rest are packed LLM_BATCH_ITEMS to a prompt, with the prompts sent concurrently.
+    """
+    data = load_disease_data()
+    cache = get_disease_parse_cache()
+    keys = [DiseaseParseCache.key(history, data.valid_diseases_version) if history.strip() else None
+            for history in histories]
+
+    # ✅ One cache read and one cache write for the whole batch, both on the worker pool
+    resolved, pending = await run_in_pool(_resolve_locally, cache, data.valid_diseases, histories, keys)
+
+    # ✅ One multi-item prompt per LLM_BATCH_ITEMS unresolved histories instead of one call each
+    pending_keys = list(pending)
+    size = max(1, settings.LLM_BATCH_ITEMS)
+    chunks = [pending_keys[i:i + size] for i in range(0, len(pending_keys), size)]
+    replies = await asyncio.gather(*(ask_llm_for_diseases_batch([pending[key] for key in chunk]) for chunk in chunks))
+
+    parsed = {}
+    missing = []
+    for chunk, reply in zip(chunks, replies):
+        for position, key in enumerate(chunk):
+            diseases = None if reply is None else reply[position]
+            if diseases is not None:
+                parsed[key] = diseases
+            elif reply is None:
+                resolved[key] = []  # The call failed; don't cache the failure
+            else:
+                missing.append(key)  # The reply skipped this item; ask for it on its own
 
+    for key, diseases in zip(missing, await asyncio.gather(*(ask_llm_for_diseases(pending[key]) for key in missing))):
+        if diseases is not None:
+            parsed[key] = diseases
+        resolved[key] = diseases or []
 
-# Load preprocessed diet dataset
-disease_diet_map = pd.read_csv(DIET_FILE_PATH)
+    await run_in_pool(cache.put_many, parsed)
+    resolved.update(parsed)
+    return [list(resolved[key]) if key is not None else [] for key in keys]
 
-def recommend_diet(diseases: List[str]) -> str:
+
+def _resolve_locally(cache, valid_diseases, histories, keys):
+    """
+    Splits a batch into parses known without the LLM, {key: diseases} (cached or locally matched; new
+    matches are cached), and the histories still to send, {key: first history with that key}, in order.
+    """
+    cached = cache.get_many([key for key in keys if key is not None])
+    resolved, matched, pending = {}, {}, {}
+    for history, key in zip(histories, keys):
+        if key is None or key in resolved or key in pending:
+            continue
+        diseases = cached.get(key)
+        if diseases is None:
+            diseases = match_known_diseases(history, valid_diseases)
+            if diseases is None:
+                pending[key] = history
+                continue
+            matched[key] = diseases
+        resolved[key] = diseases
+    cache.put_many(matched)
+    return resolved, pending
+
+
+async def ask_llm_for_diseases_batch(histories: List[str]) -> Optional[List[Optional[List[str]]]]:
+    """
+    One GPT-3.5-Turbo call for several histories, answered as a JSON object keyed by item number.
+    Returns the valid diseases per history (None for items the reply left out), or None if the call failed.
+    """
+    valid_diseases = load_disease_data().valid_diseases
+    valid_diseases_str = ", ".join(sorted(valid_diseases))
+    numbered = "\n".join(f"{number}. {normalise_history(history)}" for number, history in enumerate(histories, 1))
+
+    prompt = (
+        f"Extract diseases from each of the following numbered medical histories:\n\n{numbered}\n\n"
+        f"Only return diseases in this list: {valid_diseases_str}.\n"
+        f"Respond with a JSON object mapping every history number to a list of its diseases, "
+        f'for example {{"1": ["anemia"], "2": []}}.'
+    )
+
+    try:
+        reply = await get_llm_gateway().complete([{"role": "user", "content": prompt}])
+        return parse_numbered_diseases(reply, len(histories), valid_diseases)
+
+    except Exception as e:
+        print("Error calling OpenAI for batch disease parsing:", e)
+        return None
+
+
+async def recommend_diet(diseases: List[str]) -> str:
     """
     Matches extracted diseases to recommended diets based on the preprocessed dataset.
     If no match is found, queries GPT-3.5-Turbo for a dynamic recommendation.
     """
-    matched_diets = set()
-
-    for disease in diseases:
-        matching_rows = disease_diet_map[disease_diet_map["Disease"].str.contains(disease, case=False, na=False)]
-    
-        for diet_list in matching_rows["Diet"]:
-            # Convert the string representation of a list into an actual Python list
-            parsed_diets = ast.literal_eval(diet_list) if isinstance(diet_list, str) else diet_list
-            matched_diets.update(parsed_diets)  # Add individual diets to the set
+    # ✅ Union of the precomputed diet sets instead of scanning the meals table per disease
+    matched_diets = load_disease_data().disease_diet_index.lookup(diseases)
         
     if matched_diets:
         
@@ -88,28 +219,42 @@ def recommend_diet(diseases: List[str]) -> str:
     llm_prompt = f"Suggest a suitable diet for someone with the following condition(s): {', '.join(diseases)}."
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # ✅ Using GPT-3.5-Turbo
-            messages=[
-                {"role": "system", "content": "You are a nutrition expert providing evidence-based diet recommendations."},
-                {"role": "user", "content": llm_prompt}
-            ]
-        )
-        return response.choices[0].message.content.strip()
+        response = await get_llm_gateway().complete([
+            {"role": "system", "content": "You are a nutrition expert providing evidence-based diet recommendations."},
+            {"role": "user", "content": llm_prompt}
+        ])
+        return response.strip()
     
     except Exception as e:
         print("Error calling OpenAI for diet recommendation:", e)
         return "No specific diet recommendation available."
 
-def parse_disease_and_recommend_diet(history: str, img_url: Optional[str] = None) -> Dict:
+async def parse_disease_and_recommend_diet(history: str, img_url: Optional[str] = None) -> Dict:
     """
     Extracts diseases and recommends a diet based on validated disease list.
     Supports optional image input.
     """
-    diseases = parse_disease_history(history, img_url)
-    recommended_diet = recommend_diet(diseases)
+    diseases = await parse_disease_history(history, img_url)
+    if not diseases:
+        # ✅ Nothing to recommend for; skip the diet fallback call
+        return {"diseases": [], "recommended_diet": "No diseases detected."}
+    recommended_diet = await recommend_diet(diseases)
 
     return {
         "diseases": diseases,
         "recommended_diet": recommended_diet
     }
+
+
+async def parse_diseases_and_recommend_diets(histories: List[str]) -> List[Dict]:
+    """
+    Batch form of parse_disease_and_recommend_diet for text-only histories, in the order of `histories`.
+    """
+    parsed = await parse_disease_histories(histories)
+    # ✅ Diets come from the index; identical LLM fallbacks for unmatched diseases share one call in the gateway
+    diets = await asyncio.gather(*(recommend_diet(diseases) for diseases in parsed if diseases))
+    diets = iter(diets)
+    return [
+        {"diseases": diseases, "recommended_diet": next(diets) if diseases else "No diseases detected."}
+        for diseases in parsed
+    ]
@@ -1,13 +1,47 @@
 # [Cascade PR Demo] This is a non-functional comment for PR demonstration.
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.endpoints import api_router  # Ensure this is correct
+from app.core.concurrency import shutdown_executor
 from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.llm_integration import load_disease_data
+from app.services.recommender.content_model import load_content_model
+from app.services.recommender.exercise_model import load_exercise_model
+from app.services.recommender.refresh_scheduler import get_refresh_scheduler, stop_refresh_scheduler
+from app.services.recommender.similarity_index import load_item_similarity_index
+from app.services.recommender.workers import start_recommendation_workers, stop_recommendation_workers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ✅ Memory-map precomputed recommender artifacts once, before serving requests
+    load_item_similarity_index()
+    load_content_model()
+    load_exercise_model()
+    try:
+        load_disease_data()  # ✅ Disease parsing datasets, read once here rather than at import time
+    except OSError as e:
+        print(f"Error loading disease datasets, retrying on first use: {str(e)}")
+    if settings.RECOMMENDER_PROCESSES > 0:
+        db = SessionLocal()
+        try:
+            start_recommendation_workers(db)
+        finally:
+            db.close()
+    get_refresh_scheduler()  # ✅ Background refresh of stored recommendations after interactions
+    yield
+    stop_refresh_scheduler()
+    stop_recommendation_workers()
+    shutdown_executor()
+
 
 app = FastAPI(
     title="NutriBuddy API",
     description="API for parsing disease history and recommending diets",
     version="1.0",
+    lifespan=lifespan,
 )
 
 # ✅ Enable CORS (Allow requests from frontend)
@@ -8,3 +8,9 @@ class DiseaseHistoryRequest(BaseModel):
 class ParsedDiseaseResponse(BaseModel):
     diseases: List[str]
     recommended_diet: str
+
+class DiseaseHistoryBatchRequest(BaseModel):
+    histories: List[str]  # Text-only; results come back in the same order
+
+class ParsedDiseaseBatchResponse(BaseModel):
+    results: List[ParsedDiseaseResponse]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, Text, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -8,6 +8,10 @@ class Recommendation(Base):
     Stores recommended meals & exercises for a user.
     """
     __tablename__ = "recommendations"
+    __table_args__ = (
+        # ✅ Serves "this user's recommendations newer than X" from the index alone
+        Index("ix_recommendations_user_id_created_at", "user_id", "created_at"),
+    )
 
     recommendation_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,63 @@
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from app.models.meal import Meal
+from app.models.recommendations import Recommendation
+
+# Function to replace the stored recommendations of one or more users
+def replace_recommendations(db: Session, recommendations_by_user: dict, reason: str):
+    """
+    Replaces each user's recommendation set with {user_id: [recommendation dicts]} in one transaction:
+    one DELETE for all the users and one bulk INSERT, instead of one round trip per recommendation.
+    The INSERT is a single cached statement executed with every row (`executemany`, which SQLAlchemy
+    sends as multi-row VALUES batches on PostgreSQL). The caller handles rollback on error.
+    """
+    if not recommendations_by_user:
+        return
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            "user_id": user_id,
+            "meal_id": rec.get("meal_id"),
+            "exercise_id": rec.get("exercise_id"),
+            "recommendation_reason": reason,
+            "created_at": created_at,
+        }
+        for user_id, recommendations in recommendations_by_user.items()
+        for rec in recommendations
+    ]
+
+    db.execute(delete(Recommendation).where(Recommendation.user_id.in_(list(recommendations_by_user))))
+    if rows:
+        db.execute(insert(Recommendation), rows)
+    db.commit()
+
+# Function to drop the stored recommendations of one or more users
+def delete_recommendations(db: Session, user_ids):
+    """
+    Deletes the users' stored recommendation sets in one statement, as part of the caller's transaction
+    (the caller commits). The next read recomputes them.
+    """
+    db.execute(delete(Recommendation).where(Recommendation.user_id.in_(list(user_ids))))
+
+# Function to read a user's stored meal recommendations newer than `since`
+def get_recent_meal_recommendations(db: Session, user_id: int, since: datetime):
+    """
+    One query joining `recommendations` to `meals` (found through the (user_id, created_at) index),
+    projecting only the columns a response needs. Rows come back in the order they were stored;
+    recommendations whose meal no longer exists are dropped by the join.
+    """
+    return db.execute(
+        select(
+            Meal.meal_id,
+            Meal.name,
+            Meal.nutrient,
+            Meal.disease,
+            Meal.diet,
+            Meal.veg_non,
+            Recommendation.recommendation_reason,
+        )
+        .join(Meal, Meal.meal_id == Recommendation.meal_id)
+        .where(Recommendation.user_id == user_id, Recommendation.created_at > since)
+        .order_by(Recommendation.recommendation_id)
+    ).all()
@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+import pandas as pd
+from app.services.recommender.exercise_model import load_exercise_data
+
+
+class ExerciseIndex:
+    """
+    The exercise dataset pre-sorted for intensity-band queries.
+
+    `intensities` is every row's intensity in ascending order, for counting a band with two binary searches.
+    Rows are also grouped per exercise type (CSR-style: `type_offsets[t]:type_offsets[t + 1]` into the
+    `type_rows` / `type_intensities` arrays), each group sorted by intensity, so one type's band is a slice.
+    Ties keep the dataset's row order throughout.
+    """
+
+    def __init__(self, exercises: pd.DataFrame):
+        self.names = exercises["exercise"].to_numpy(dtype=object)
+        self.durations = exercises["duration"].to_numpy()
+        self.calories = exercises["calories_burn"].to_numpy()
+        self.intensity_values = exercises["exercise_intensity"].to_numpy()
+        intensity = self.intensity_values.astype(np.float64)
+        rows = np.arange(len(exercises))
+
+        self.intensities = np.sort(intensity, kind="stable")
+
+        self.type_names, type_codes = np.unique(self.names.astype(str), return_inverse=True)
+        order = np.lexsort((rows, intensity, type_codes))
+        self.type_rows = rows[order]
+        self.type_intensities = intensity[order]
+        self.type_offsets = np.searchsorted(type_codes[order], np.arange(len(self.type_names) + 1))
+
+    def __len__(self):
+        return len(self.intensities)
+
+    def band_count(self, low, high) -> int:
+        """
+        Number of exercises with `low <= intensity <= high`.
+        """
+        return int(np.searchsorted(self.intensities, high, side="right") - np.searchsorted(self.intensities, low, side="left"))
+
+    def closest_per_type(self, target, low, high, per_type=2):
+        """
+        For each exercise type with rows in the band, the `per_type` rows closest in intensity to `target`
+        (ties in dataset order). Types are ordered by their first row in the dataset, like `unique()` on the
+        filtered frame. Returns (row positions, intensity differences), concatenated in that order.
+        """
+        groups = []
+        for t in range(len(self.type_names)):
+            start, end = self.type_offsets[t], self.type_offsets[t + 1]
+            intensities = self.type_intensities[start:end]
+            band_start = start + np.searchsorted(intensities, low, side="left")
+            band_end = start + np.searchsorted(intensities, high, side="right")
+            if band_start == band_end:
+                continue
+
+            rows = self.type_rows[band_start:band_end]
+            diffs = np.abs(self.type_intensities[band_start:band_end] - target)
+            chosen = np.lexsort((rows, diffs))[:per_type]
+            groups.append((rows.min(), rows[chosen], diffs[chosen]))
+
+        groups.sort(key=lambda group: group[0])
+        if not groups:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate([group[1] for group in groups]), np.concatenate([group[2] for group in groups])
+
+    def recommend(self, predicted_intensity, limit=5):
+        """
+        Exercises within ±1 of the predicted intensity (±2 if fewer than `limit` qualify), clipped to 0–10;
+        two per type, closest first, at most `limit` in total. Returns a list of row dicts.
+        """
+        low, high = max(0, predicted_intensity - 1), min(10, predicted_intensity + 1)
+        if self.band_count(low, high) < limit:
+            low, high = max(0, predicted_intensity - 2), min(10, predicted_intensity + 2)
+
+        rows, diffs = self.closest_per_type(predicted_intensity, low, high)
+        return [
+            {
+                "exercise": self.names[row],
+                "duration": self.durations[row],
+                "calories_burn": self.calories[row],
+                "exercise_intensity": self.intensity_values[row],
+                "intensity_diff": float(diff),
+            }
+            for row, diff in zip(rows[:limit], diffs[:limit])
+        ]
+
+
+_exercise_index = None
+_lock = threading.Lock()
+
+
+def get_exercise_index() -> ExerciseIndex:
+    """
+    Returns the shared index over the exercise dataset, building it on first use.
+    Raises FileNotFoundError if the exercise dataset is missing.
+    """
+    global _exercise_index
+    if _exercise_index is None:
+        exercises = load_exercise_data()
+        with _lock:
+            if _exercise_index is None:
+                _exercise_index = ExerciseIndex(exercises)
+    return _exercise_index
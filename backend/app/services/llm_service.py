@@ -1,15 +1,27 @@
-from app.core.llm_integration import parse_disease_and_recommend_diet
-from typing import Optional
+from app.core.llm_integration import parse_disease_and_recommend_diet, parse_diseases_and_recommend_diets
+from typing import List, Optional
 
 class LLMService:
     @staticmethod
-    def process_disease_history(history: str, img_url: Optional[str] = None):
+    async def process_disease_history(history: str, img_url: Optional[str] = None):
         if not history.strip():
             return {"diseases": [], "recommended_diet": "No history provided."}  # ✅ Handle empty input
 
-        result = parse_disease_and_recommend_diet(history, img_url)
+        result = await parse_disease_and_recommend_diet(history, img_url)
 
         if not result.get("diseases"):
             return {"diseases": [], "recommended_diet": "No diseases detected."}  # ✅ Prevent OpenAI failures
 
         return result
+
+    @staticmethod
+    async def process_disease_histories(histories: List[str]):
+        """
+        One result per history, in order, each shaped like process_disease_history's.
+        """
+        results = await parse_diseases_and_recommend_diets(histories)
+
+        return [
+            {"diseases": [], "recommended_diet": "No history provided."} if not history.strip() else result
+            for history, result in zip(histories, results)
+        ]
@@ -0,0 +1,147 @@
+import threading
+import time
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.meal import Meal
+
+COLUMNS = ("meal_id", "name", "category", "nutrient", "disease", "diet", "veg_non", "price")
+
+
+class MealCatalog:
+    """
+    Columnar in-memory copy of the `meals` table.
+
+    Each column is a NumPy array aligned with `meal_ids` (sorted ascending), so lookups by id are binary
+    searches and filters are vectorised masks. `version` is the table marker the catalog was loaded at.
+    """
+
+    def __init__(self, rows, version=None):
+        rows = sorted(rows, key=lambda row: row[0])
+        self.version = version
+        self.meal_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.names = np.array([row[1] for row in rows], dtype=object)
+        self.categories = np.array([row[2] for row in rows], dtype=object)
+        self.nutrients = np.array([row[3] for row in rows], dtype=object)
+        self.diseases = np.array([row[4] for row in rows], dtype=object)
+        self.diets = np.array([row[5] for row in rows], dtype=object)
+        self.veg_non = np.array([bool(row[6]) for row in rows], dtype=bool)
+        self.prices = np.array([np.nan if row[7] is None else float(row[7]) for row in rows], dtype=np.float64)
+
+    @classmethod
+    def from_db(cls, db: Session):
+        """
+        Loads every meal with one column-only query.
+        """
+        rows = db.query(*(getattr(Meal, column) for column in COLUMNS)).all()
+        return cls([tuple(row) for row in rows], catalog_version(db))
+
+    def __len__(self):
+        return len(self.meal_ids)
+
+    def __contains__(self, meal_id):
+        return self.position(meal_id) is not None
+
+    def __iter__(self):
+        for position in range(len(self.meal_ids)):
+            yield self.record(position)
+
+    def position(self, meal_id):
+        """
+        Row position of `meal_id`, or None if the meal is not in the catalog.
+        """
+        if meal_id is None or len(self.meal_ids) == 0:
+            return None
+        position = int(np.searchsorted(self.meal_ids, int(meal_id)))
+        if position < len(self.meal_ids) and self.meal_ids[position] == int(meal_id):
+            return position
+        return None
+
+    def positions(self, meal_ids):
+        """
+        Vectorised lookup: returns (positions, found mask) for an array of meal ids.
+        """
+        meal_ids = np.asarray(meal_ids, dtype=np.int64)
+        if len(self.meal_ids) == 0:
+            return np.zeros(len(meal_ids), dtype=np.int64), np.zeros(len(meal_ids), dtype=bool)
+        positions = np.clip(np.searchsorted(self.meal_ids, meal_ids), 0, len(self.meal_ids) - 1)
+        return positions, self.meal_ids[positions] == meal_ids
+
+    def record(self, position) -> dict:
+        """
+        All catalog columns of the meal at `position`, as a plain dict.
+        """
+        price = self.prices[position]
+        return {
+            "meal_id": int(self.meal_ids[position]),
+            "name": self.names[position],
+            "category": self.categories[position],
+            "nutrient": self.nutrients[position],
+            "disease": self.diseases[position],
+            "diet": self.diets[position],
+            "veg_non": bool(self.veg_non[position]),
+            "price": None if np.isnan(price) else float(price),
+        }
+
+    def get(self, meal_id):
+        """
+        The catalog record for `meal_id`, or None.
+        """
+        position = self.position(meal_id)
+        return None if position is None else self.record(position)
+
+    def filter(self, vegetarian=None, max_price=None, exclude=None) -> np.ndarray:
+        """
+        Boolean mask over the catalog rows matching every given condition.
+        """
+        mask = np.ones(len(self.meal_ids), dtype=bool)
+        if vegetarian is not None:
+            mask &= self.veg_non == (not vegetarian)
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if exclude is not None and len(exclude):
+            mask &= ~np.isin(self.meal_ids, np.asarray(list(exclude), dtype=np.int64))
+        return mask
+
+
+def catalog_version(db: Session):
+    """
+    Cheap marker that changes whenever meals are added or removed: (row count, highest meal_id).
+    """
+    count, max_meal_id = db.query(func.count(Meal.meal_id), func.max(Meal.meal_id)).one()
+    return (count, max_meal_id)
+
+
+_catalog = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_meal_catalog(db: Session) -> MealCatalog:
+    """
+    Returns the shared catalog. The version marker is re-checked at most every
+    MEAL_CATALOG_CHECK_SECONDS, and the catalog is reloaded only when the marker has changed.
+    """
+    global _catalog, _checked_at
+    now = time.monotonic()
+    if _catalog is not None and now - _checked_at < settings.MEAL_CATALOG_CHECK_SECONDS:
+        return _catalog
+
+    with _lock:
+        if _catalog is None:
+            _catalog = MealCatalog.from_db(db)
+        elif now - _checked_at >= settings.MEAL_CATALOG_CHECK_SECONDS:
+            if catalog_version(db) != _catalog.version:
+                _catalog = MealCatalog.from_db(db)
+        _checked_at = now
+    return _catalog
+
+
+def invalidate_meal_catalog():
+    """
+    Forces a reload on next use, e.g. after editing existing meals (which the version marker cannot see).
+    """
+    global _catalog
+    with _lock:
+        _catalog = None
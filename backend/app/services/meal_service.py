@@ -0,0 +1,61 @@
+from typing import Dict, Iterable, List
+from sqlalchemy.orm import Session
+from app.models.meal import Meal
+from app.services.meal_catalog import COLUMNS, MealCatalog, get_meal_catalog
+
+
+def get_meals_by_ids(db: Session, meal_ids: Iterable[int], catalog: MealCatalog = None) -> Dict[int, dict]:
+    """
+    Resolves meal ids to catalog records (see `MealCatalog.record`), keyed by meal_id.
+    Ids are served from the in-memory catalog (the shared one unless `catalog` is given); any it does
+    not know yet are fetched with a single `IN (...)` query. Unknown ids are simply absent from the result.
+    """
+    unique_ids = list(dict.fromkeys(int(meal_id) for meal_id in meal_ids if meal_id is not None))
+    if not unique_ids:
+        return {}
+
+    if catalog is None:
+        catalog = get_meal_catalog(db)
+    records = {}
+    missing_ids = []
+    positions, found = catalog.positions(unique_ids)
+    for meal_id, position, known in zip(unique_ids, positions.tolist(), found.tolist()):
+        if known:
+            records[meal_id] = catalog.record(position)
+        else:
+            missing_ids.append(meal_id)
+
+    if missing_ids:
+        rows = db.query(*(getattr(Meal, column) for column in COLUMNS)).filter(Meal.meal_id.in_(missing_ids)).all()
+        for row in rows:
+            records[row.meal_id] = {column: getattr(row, column) for column in COLUMNS}
+    return records
+
+
+def meal_to_dict(meal: dict) -> dict:
+    """
+    The meal fields shared by every recommendation response.
+    """
+    return {
+        "meal_id": meal["meal_id"],
+        "name": meal["name"],
+        "nutrient": meal["nutrient"],
+        "disease": meal["disease"],
+        "diet": meal["diet"],
+    }
+
+
+def hydrate_meals(db: Session, meal_ids: Iterable[int], catalog: MealCatalog = None, **fields) -> List[dict]:
+    """
+    Builds response dicts for `meal_ids` in the given order, resolving all of them at once.
+    Extra keyword fields (e.g. score="item-based") are added to every dict; unknown meals are skipped.
+    """
+    meal_ids = [int(meal_id) for meal_id in meal_ids if meal_id is not None]
+    meals = get_meals_by_ids(db, meal_ids, catalog)
+
+    hydrated = []
+    for meal_id in meal_ids:
+        meal = meals.get(meal_id)
+        if meal:
+            hydrated.append({**meal_to_dict(meal), **fields})
+    return hydrated
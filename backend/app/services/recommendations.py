@@ -0,0 +1,32 @@
+from sqlalchemy.orm import Session
+from app.repositories.recommendation_repository import replace_recommendations
+
+DEFAULT_REASON = "Based on your preferences and similar users"
+
+
+def store_recommendations(db: Session, user_id: int, recommendations: list, reason: str = DEFAULT_REASON):
+    """
+    Store recommendations in the database, replacing the user's previous ones
+    """
+    try:
+        # ✅ One DELETE and one bulk INSERT in a single transaction
+        replace_recommendations(db, {user_id: recommendations}, reason)
+    except Exception as e:
+        db.rollback()
+        print(f"Error storing recommendations for user {user_id}: {str(e)}")
+
+
+def store_recommendations_batch(db: Session, recommendations_by_user: dict, reason: str = DEFAULT_REASON):
+    """
+    Replaces the stored recommendations of several users at once, in a single transaction.
+    Users whose entry is not a list (e.g. an error dict) are left untouched. Errors are re-raised.
+    """
+    recommendations_by_user = {
+        user_id: recommendations for user_id, recommendations in recommendations_by_user.items()
+        if isinstance(recommendations, list)
+    }
+    try:
+        replace_recommendations(db, recommendations_by_user, reason)
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Callable, Optional
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_KEPT = 3  # Published versions kept besides the current one, for readers still on an older version
+
+
+def current_version_path(root) -> Optional[str]:
+    """
+    The directory of the version currently published under `root`, or None if nothing is published.
+    """
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as pointer_file:
+            name = pointer_file.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(root, name)
+    return path if name and os.path.isdir(path) else None
+
+
+def publish(root, version, write: Callable[[str], None]) -> str:
+    """
+    Publishes an immutable version of an artifact under `root` and returns its directory.
+
+    `write(path)` fills a private temporary directory, which is renamed to `root/<version>`; the CURRENT
+    pointer is then swapped to it with an atomic os.replace. A published version is never written again,
+    so readers that memory-map its files are unaffected by later builds. If `root/<version>` already exists
+    (the same build was published by another process) it is reused as is.
+    """
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, version)
+    if not os.path.isdir(path):
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=root)
+        try:
+            write(staging)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        try:
+            os.rename(staging, path)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    pointer = os.path.join(root, f".{CURRENT_FILE}-{uuid.uuid4().hex}")
+    with open(pointer, "w") as pointer_file:
+        pointer_file.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+    prune(root)
+    return path
+
+
+def prune(root, keep=VERSIONS_KEPT):
+    """
+    Removes all but the `keep` most recent versions besides the current one. Processes that still map
+    files of a removed version keep them until they move on, per POSIX unlink semantics.
+    """
+    current = current_version_path(root)
+    versions = [
+        os.path.join(root, name) for name in os.listdir(root)
+        if not name.startswith(".") and name != CURRENT_FILE and os.path.join(root, name) != current
+    ]
+    versions = [path for path in versions if os.path.isdir(path)]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for path in versions[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
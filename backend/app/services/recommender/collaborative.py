@@ -1,197 +1,142 @@
-import pandas as pd
-import numpy as np
 from sqlalchemy.orm import Session
-from app.models.recent_activity import RecentActivity
-from app.models.meal import Meal
+from app.services.meal_service import hydrate_meals
+from app.services.recommender.context import RecommendationContext
+from app.services.recommender.interaction_matrix import get_interaction_matrix
+from app.services.recommender.similarity_index import get_item_similarity_index
+from app.services.recommender.topk import top_k
+from app.services.recommender.user_neighbours import get_user_neighbour_engine
 
-def recommend_user_based(db: Session, user_id: int, top_n=10):
+def recommend_user_based(db: Session, user_id: int, top_n=10, context: RecommendationContext = None):
     """
     Recommend meals using user-based collaborative filtering (Pearson Correlation).
+    With a `context`, meals are resolved from its catalog.
     """
-    # ✅ Load user interactions from the database
-    activities_query = db.query(RecentActivity).all()
-    
-    # Create a DataFrame with user interactions
-    # Consider liked and purchased as positive signals (value 1)
-    interactions = []
-    for activity in activities_query:
-        # Create an interaction score based on user actions
-        score = 0
-        if activity.liked:
-            score += 1
-        if activity.purchased:
-            score += 1
-        if activity.rated:
-            score += 1
-        
-        if score > 0:  # Only include positive interactions
-            interactions.append({
-                "user_id": activity.user_id, 
-                "meal_id": activity.meal_id, 
-                "score": score
-            })
-    
-    meal_ratings = pd.DataFrame(interactions)
+    # ✅ Reuse the shared interaction matrix instead of reloading the activity table
+    interactions = get_interaction_matrix(db)
 
-    if meal_ratings.empty:
+    if interactions.is_empty():
         return []  # Return empty list instead of error dict for consistency
 
     # Check if user exists in the dataset
-    if user_id not in meal_ratings["user_id"].unique():
+    if not interactions.has_user(user_id):
         return []  # Return empty list if user not found
 
-    # ✅ Aggregate interactions to prevent duplicates (take the max score if multiple exist)
-    meal_ratings = meal_ratings.groupby(["user_id", "meal_id"], as_index=False)["score"].max()
-
-    # ✅ Create a user-item matrix
-    try:
-        user_ratings = meal_ratings.pivot(index="user_id", columns="meal_id", values="score").fillna(0)
-    except ValueError:
-        return []  # Handle pivot error gracefully
-    
-    # ✅ Compute user similarity
-    try:
-        user_similarity = user_ratings.corr(method="pearson").fillna(0)
-    except Exception:
-        return []  # Handle correlation error gracefully
-
-    if user_id not in user_similarity.index:
-        return []  # Return empty list if user not in similarity matrix
-
-    # Find similar users (exclude self-similarity)
-    similar_users = user_similarity[user_id].sort_values(ascending=False)
-    if len(similar_users) > 1:
-        similar_users = similar_users[1:min(len(similar_users), top_n+1)]
-    else:
+    # ✅ Find similar users (excluding the user) from the sparse matrix, without a user×user matrix
+    similar_users = get_user_neighbour_engine(db).top_neighbours(user_id, top_n)
+    if not similar_users:
         return []  # No similar users found
     
+    candidate_meal_ids = neighbour_candidates(interactions, user_id, similar_users)
+    
+    # ✅ Resolve the candidate meals in one query and return top N unique recommendations
+    catalog = context.catalog if context else None
+    return hydrate_top(db, candidate_meal_ids, catalog, top_n, score="user-based")
+
+
+def hydrate_top(db: Session, meal_ids, catalog, top_n, **fields):
+    """
+    `hydrate_meals(...)[:top_n]`, building dicts only for the first `top_n` meals when the catalog knows all of them.
+    """
+    if catalog is not None and len(meal_ids) > top_n and catalog.positions(meal_ids)[1].all():
+        meal_ids = meal_ids[:top_n]
+    return hydrate_meals(db, meal_ids, catalog, **fields)[:top_n]
+
+
+def neighbour_candidates(interactions, user_id, similar_users):
+    """
+    Meals the user's positively similar neighbours interacted with and the user has not, most similar user first.
+    """
     # Get user's existing interactions to exclude from recommendations
-    user_interacted_meals = set(meal_ratings[meal_ratings["user_id"] == user_id]["meal_id"].values)
+    user_interacted_meals = set(interactions.user_meals(user_id).tolist())
     
-    # Collect recommendations from similar users
-    recommended_meals = []
-    for sim_user, similarity in similar_users.items():
+    # Collect candidate meals from similar users, most similar user first
+    candidate_meal_ids = []
+    for sim_user, similarity in similar_users:
         if similarity <= 0:  # Skip users with non-positive similarity
             continue
             
         # Get meals that similar user interacted with
-        sim_user_meals = meal_ratings[meal_ratings["user_id"] == sim_user]["meal_id"].values
+        sim_user_meals = interactions.user_meals(sim_user).tolist()
         
         # Add meals that user hasn't interacted with yet
         for meal_id in sim_user_meals:
             if meal_id not in user_interacted_meals:
-                meal = db.query(Meal).filter(Meal.meal_id == meal_id).first()
-                if meal:
-                    recommended_meals.append({
-                        "meal_id": meal_id,
-                        "name": meal.name,
-                        "nutrient": meal.nutrient,
-                        "disease": meal.disease,
-                        "diet": meal.diet,
-                        "score": "user-based"
-                    })
-                    user_interacted_meals.add(meal_id)  # Avoid duplicate recommendations
-    
-    # Return top N unique recommendations
-    return recommended_meals[:top_n]
+                candidate_meal_ids.append(meal_id)
+                user_interacted_meals.add(meal_id)  # Avoid duplicate recommendations
+    return candidate_meal_ids
+
 
+def recommend_user_based_batch(db: Session, contexts, top_n=10):
+    """
+    `recommend_user_based` for several users: {user_id: recommendations} for the RecommendationContexts
+    in `contexts`. Neighbours for all of them come from one batched similarity computation.
+    """
+    results = {context.user_id: [] for context in contexts}
+    interactions = get_interaction_matrix(db)
+    if interactions.is_empty():
+        return results
+
+    user_ids = [context.user_id for context in contexts if interactions.has_user(context.user_id)]
+    neighbours = get_user_neighbour_engine(db).top_neighbours_batch(user_ids, top_n)
+    for context in contexts:
+        if neighbours.get(context.user_id):
+            candidate_meal_ids = neighbour_candidates(interactions, context.user_id, neighbours[context.user_id])
+            results[context.user_id] = hydrate_top(db, candidate_meal_ids, context.catalog, top_n, score="user-based")
+    return results
 
-def recommend_item_based(db: Session, user_id: int, top_n=10):
+
+def recommend_item_based(db: Session, user_id: int, top_n=10, context: RecommendationContext = None):
     """
     Recommend meals using item-based collaborative filtering.
+    With a `context`, meals are resolved from its catalog.
     """
-    # ✅ Load user interactions from the database
-    activities_query = db.query(RecentActivity).all()
-    
-    # Create a DataFrame with user interactions
-    interactions = []
-    for activity in activities_query:
-        # Create an interaction score based on user actions
-        score = 0
-        if activity.liked:
-            score += 1
-        if activity.purchased:
-            score += 1
-        if activity.rated:
-            score += 1
-        
-        if score > 0:  # Only include positive interactions
-            interactions.append({
-                "user_id": activity.user_id, 
-                "meal_id": activity.meal_id, 
-                "score": score
-            })
-    
-    meal_ratings = pd.DataFrame(interactions)
+    # ✅ Reuse the shared interaction matrix instead of reloading the activity table
+    interactions = get_interaction_matrix(db)
 
-    if meal_ratings.empty:
+    if interactions.is_empty():
         return []  # Return empty list instead of error dict
 
     # Check if user exists in the dataset
-    if user_id not in meal_ratings["user_id"].unique():
+    if not interactions.has_user(user_id):
         return []  # Return empty list if user not found
 
-    # ✅ Aggregate interactions to prevent duplicates
-    meal_ratings = meal_ratings.groupby(["user_id", "meal_id"], as_index=False)["score"].max()
-
-    # ✅ Create a user-item matrix
-    try:
-        user_ratings = meal_ratings.pivot(index="user_id", columns="meal_id", values="score").fillna(0)
-    except ValueError:
-        return []  # Handle pivot error gracefully
-
-    # ✅ Compute item similarity (meal-to-meal similarity)
-    try:
-        item_similarity = user_ratings.T.corr(method="pearson").fillna(0)
-    except Exception:
-        return []  # Handle correlation error gracefully
-
     # ✅ Get meals the user has interacted with
-    user_meals = meal_ratings[meal_ratings["user_id"] == user_id]["meal_id"].values
+    user_meals = interactions.user_meals(user_id)
     
     if len(user_meals) == 0:
         return []  # User hasn't interacted with any meals
+
+    # ✅ Score candidate meals from the precomputed top-K neighbour lists (meal-to-meal similarity)
+    item_similarity = get_item_similarity_index(db)
+    candidate_ids, candidate_scores = item_similarity.score_meals(user_meals, exclude=user_meals)
+
+    # Select the top N meals by score
+    sorted_meal_ids = candidate_ids[top_k(candidate_scores, top_n)].tolist()
     
-    # Get user's existing interactions to exclude from recommendations
-    user_interacted_meals = set(user_meals)
-    
-    # Calculate recommendation scores for each meal
-    meal_scores = {}
-    for meal_id in user_meals:
-        if meal_id in item_similarity.index:
-            # Get similar meals
-            similar_meals = item_similarity[meal_id].sort_values(ascending=False)
-            
-            # Skip the meal itself (perfect correlation of 1.0)
-            if len(similar_meals) > 1:
-                similar_meals = similar_meals[1:]
-            
-            # Add similarity scores to meal_scores
-            for sim_meal_id, similarity in similar_meals.items():
-                if similarity <= 0 or sim_meal_id in user_interacted_meals:
-                    continue
-                    
-                if sim_meal_id not in meal_scores:
-                    meal_scores[sim_meal_id] = 0
-                
-                # Add weighted similarity score
-                meal_scores[sim_meal_id] += similarity
-    
-    # Sort meals by score
-    sorted_meals = sorted(meal_scores.items(), key=lambda x: x[1], reverse=True)
-    
-    # Get meal details for top recommendations
-    recommended_meals = []
-    for meal_id, score in sorted_meals[:top_n]:
-        meal = db.query(Meal).filter(Meal.meal_id == meal_id).first()
-        if meal:
-            recommended_meals.append({
-                "meal_id": meal_id,
-                "name": meal.name,
-                "nutrient": meal.nutrient,
-                "disease": meal.disease,
-                "diet": meal.diet,
-                "score": "item-based"
-            })
-    
-    return recommended_meals
+    # ✅ Get meal details for top recommendations in one query
+    catalog = context.catalog if context else None
+    return hydrate_meals(db, sorted_meal_ids, catalog, score="item-based")
+
+
+def recommend_item_based_batch(db: Session, contexts, top_n=10):
+    """
+    `recommend_item_based` for several users: {user_id: recommendations} for the RecommendationContexts
+    in `contexts`. All users' candidates are scored with one product against the similarity index.
+    """
+    results = {context.user_id: [] for context in contexts}
+    interactions = get_interaction_matrix(db)
+    if interactions.is_empty():
+        return results
+
+    contexts = [context for context in contexts if interactions.has_user(context.user_id)]
+    user_meals = [interactions.user_meals(context.user_id) for context in contexts]
+    contexts = [context for context, meals in zip(contexts, user_meals) if len(meals)]
+    user_meals = [meals for meals in user_meals if len(meals)]
+    if not contexts:
+        return results
+
+    scored = get_item_similarity_index(db).score_meals_batch(user_meals)
+    for context, (candidate_ids, candidate_scores) in zip(contexts, scored):
+        sorted_meal_ids = candidate_ids[top_k(candidate_scores, top_n)].tolist()
+        results[context.user_id] = hydrate_meals(db, sorted_meal_ids, context.catalog, score="item-based")
+    return results
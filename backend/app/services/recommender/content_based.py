@@ -1,65 +1,34 @@
-import pandas as pd
+import numpy as np
 from sqlalchemy.orm import Session
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from app.models.user import User
-from app.models.meal import Meal
-from app.models.recent_activity import RecentActivity
+from app.services.recommender.content_model import get_content_model
+from app.services.recommender.context import RecommendationContext
+from app.services.recommender.profile_vectors import get_user_profile_vector, get_user_profile_vectors, user_profile_text
+from app.services.recommender.topk import top_k
 
-def recommend_content_based(db: Session, user_id: int, top_n=10):
+def recommend_content_based(db: Session, user_id: int, top_n=10, context: RecommendationContext = None):
     """
     Recommend meals based on a user's disease history and dietary preferences 
     using TF-IDF content-based filtering.
+    `context` (see RecommendationContext) supplies the user, their interactions and the catalog when given.
     """
-    # Get user profile
-    user = db.query(User).filter(User.user_id == user_id).first()
+    if context is None:
+        context = RecommendationContext.from_db(db, user_id)
     
-    if not user:
+    if not context:
         return []  # Return empty list for consistency with other recommenders
     
-    # Get user's preferred diet and disease history
-    user_diet = user.diet if user.diet else ""
-    user_disease = user.disease if user.disease else ""
+    # Get user profile and existing interactions to exclude from recommendations
+    user = context.user
+    interacted_meal_ids = context.interacted_meal_ids
     
-    # Get user's existing interactions to exclude from recommendations
-    user_interactions = db.query(RecentActivity).filter(
-        RecentActivity.user_id == user_id
-    ).all()
+    # ✅ Read all meals from the in-memory catalog instead of scanning the table
+    catalog = context.catalog
     
-    interacted_meal_ids = set()
-    for interaction in user_interactions:
-        interacted_meal_ids.add(interaction.meal_id)
-    
-    # Load all meals from the database
-    meals_query = db.query(Meal).all()
-    
-    # Convert to DataFrame, handling SQLAlchemy state
-    meals_data = []
-    for meal in meals_query:
-        meal_dict = {
-            "meal_id": meal.meal_id,
-            "name": meal.name,
-            "nutrient": meal.nutrient if meal.nutrient else "",
-            "disease": meal.disease if meal.disease else "",
-            "diet": meal.diet if meal.diet else ""
-        }
-        meals_data.append(meal_dict)
-    
-    meals = pd.DataFrame(meals_data)
-    
-    if meals.empty:
+    if len(catalog) == 0:
         return []  # Return empty list if no meals found
     
-    # Create feature text by combining relevant attributes
-    # Include all relevant features for better matching
-    meals["features"] = (
-        meals["nutrient"] + " " + 
-        meals["disease"] + " " + 
-        meals["diet"]
-    ).str.lower()  # Convert to lowercase for better matching
-    
-    # Create user profile feature text
-    user_profile = (user_diet + " " + user_disease).lower()
+    # Create user profile feature text from the preferred diet and disease history
+    user_profile = user_profile_text(user.diet, user.disease)
     
     # Handle empty user profile
     if not user_profile.strip():
@@ -67,39 +36,71 @@ def recommend_content_based(db: Session, user_id: int, top_n=10):
         return []
     
     try:
-        # Initialize and fit TF-IDF vectorizer
-        vectorizer = TfidfVectorizer(stop_words='english')  # Remove common English words
-        meal_vectors = vectorizer.fit_transform(meals["features"])
-        
-        # Transform user profile
-        user_vector = vectorizer.transform([user_profile])
+        # ✅ Reuse the fitted TF-IDF model; it is refitted only when the meal catalog changes
+        content_model = get_content_model(db, catalog)
         
-        # Compute cosine similarity
-        similarity_scores = cosine_similarity(user_vector, meal_vectors).flatten()
-        
-        # Add similarity scores to meals DataFrame
-        meals["similarity"] = similarity_scores
+        # Use the cached profile vector and compute cosine similarity (one sparse mat-vec)
+        user_vector = get_user_profile_vector(content_model, user.user_id, user_profile)
+        similarity_scores = content_model.score(user_vector)[0]
         
         # Filter out meals the user has already interacted with
-        meals = meals[~meals["meal_id"].isin(interacted_meal_ids)]
+        interacted = np.isin(catalog.meal_ids, list(interacted_meal_ids))
         
         # Recommend top N meals with highest similarity
-        recommended_meals = meals.sort_values(by="similarity", ascending=False).head(top_n)
-        
-        # Convert to list of dictionaries with consistent format
-        result = []
-        for _, meal in recommended_meals.iterrows():
-            result.append({
-                "meal_id": meal["meal_id"],
-                "name": meal["name"],
-                "nutrient": meal["nutrient"],
-                "disease": meal["disease"],
-                "diet": meal["diet"],
-                "score": "content-based"
-            })
-        
-        return result
+        return top_meals(catalog, similarity_scores, top_n, interacted)
     
     except Exception as e:
         print(f"Error in content-based recommendation: {str(e)}")
         return []  # Return empty list on error
+
+
+def top_meals(catalog, similarity_scores, top_n, interacted):
+    """
+    The `top_n` catalog meals by similarity, skipping interacted ones, as recommendation dicts.
+    """
+    top_positions = top_k(similarity_scores, top_n, exclude=interacted)
+
+    # Convert to list of dictionaries with consistent format
+    result = []
+    for position in top_positions:
+        result.append({
+            "meal_id": int(catalog.meal_ids[position]),
+            "name": catalog.names[position],
+            "nutrient": catalog.nutrients[position] or "",
+            "disease": catalog.diseases[position] or "",
+            "diet": catalog.diets[position] or "",
+            "score": "content-based"
+        })
+    return result
+
+
+def recommend_content_based_batch(db: Session, contexts, top_n=10):
+    """
+    `recommend_content_based` for several users at once: {user_id: recommendations} for the
+    RecommendationContexts in `contexts` (all sharing one catalog). The users' profile vectors are
+    stacked and scored against every meal with a single sparse matrix-matrix product.
+    """
+    results = {context.user_id: [] for context in contexts}
+    if not contexts or len(contexts[0].catalog) == 0:
+        return results
+    catalog = contexts[0].catalog
+
+    # Users with an empty profile get no content-based recommendations
+    profiles = {context.user_id: user_profile_text(context.user.diet, context.user.disease) for context in contexts}
+    contexts = [context for context in contexts if profiles[context.user_id].strip()]
+    if not contexts:
+        return results
+
+    try:
+        content_model = get_content_model(db, catalog)
+        user_vectors = get_user_profile_vectors(
+            content_model, [(context.user_id, profiles[context.user_id]) for context in contexts],
+        )
+        similarity_scores = content_model.score(user_vectors)
+
+        for context, scores in zip(contexts, similarity_scores):
+            interacted = np.isin(catalog.meal_ids, list(context.interacted_meal_ids))
+            results[context.user_id] = top_meals(catalog, scores, top_n, interacted)
+    except Exception as e:
+        print(f"Error in content-based recommendation: {str(e)}")
+    return results
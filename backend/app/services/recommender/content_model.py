@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.services.meal_catalog import MealCatalog, get_meal_catalog
+from app.services.recommender import artifacts
+
+MODEL_DIR_NAME = "content_model"
+
+
+def meal_features(catalog: MealCatalog):
+    """
+    Feature text per meal: nutrient, disease and diet, lowercased.
+    """
+    return [
+        f"{nutrient or ''} {disease or ''} {diet or ''}".lower()
+        for nutrient, disease, diet in zip(catalog.nutrients, catalog.diseases, catalog.diets)
+    ]
+
+
+def catalog_fingerprint(catalog: MealCatalog) -> str:
+    """
+    Hash of the meal ids and feature text the model is fitted on; it changes only when the catalog does.
+    """
+    digest = hashlib.sha256()
+    for meal_id, features in zip(catalog.meal_ids.tolist(), meal_features(catalog)):
+        digest.update(f"{meal_id}\t{features}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ContentModel:
+    """
+    Fitted TF-IDF vectorizer and the L2-normalised sparse meal matrix for content-based filtering.
+    Rows of `meal_vectors` are aligned with `meal_ids`, so cosine similarity is a plain dot product.
+    `path` is the published version directory the model was saved to or loaded from, if any.
+    """
+
+    def __init__(self, vectorizer, meal_ids, meal_vectors, fingerprint, path=None):
+        self.vectorizer = vectorizer
+        self.meal_ids = meal_ids
+        self.meal_vectors = meal_vectors
+        self.fingerprint = fingerprint
+        self.path = path
+
+    @classmethod
+    def build(cls, catalog: MealCatalog):
+        vectorizer = TfidfVectorizer(stop_words='english')  # Remove common English words
+        meal_vectors = normalize(vectorizer.fit_transform(meal_features(catalog))).tocsr()
+        return cls(vectorizer, catalog.meal_ids.copy(), meal_vectors, catalog_fingerprint(catalog))
+
+    def transform(self, texts):
+        """
+        L2-normalised TF-IDF vectors for `texts`, in the meal vector space.
+        """
+        return normalize(self.vectorizer.transform(texts))
+
+    def score(self, vectors) -> np.ndarray:
+        """
+        Cosine similarity of each row of `vectors` with every meal: one sparse mat-mul.
+        Returns a dense (len(vectors), len(meal_ids)) array.
+        """
+        return np.asarray((vectors @ self.meal_vectors.T).toarray())
+
+    def save(self, path):
+        """
+        Writes the vectorizer (joblib) and the CSR arrays of the meal matrix (.npy) into `path`.
+        Use `publish` to replace a saved model that other processes may be reading.
+        """
+        os.makedirs(path, exist_ok=True)
+        joblib.dump(self.vectorizer, os.path.join(path, "vectorizer.joblib"))
+        np.save(os.path.join(path, "meal_ids.npy"), np.asarray(self.meal_ids))
+        np.save(os.path.join(path, "data.npy"), self.meal_vectors.data)
+        np.save(os.path.join(path, "indices.npy"), self.meal_vectors.indices)
+        np.save(os.path.join(path, "indptr.npy"), self.meal_vectors.indptr)
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump({"fingerprint": self.fingerprint, "shape": list(self.meal_vectors.shape)}, meta_file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a saved model; with `mmap=True` the meal matrix arrays are memory-mapped read-only.
+        """
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        meal_vectors = sparse.csr_matrix(
+            (
+                np.load(os.path.join(path, "data.npy"), mmap_mode=mmap_mode),
+                np.load(os.path.join(path, "indices.npy"), mmap_mode=mmap_mode),
+                np.load(os.path.join(path, "indptr.npy"), mmap_mode=mmap_mode),
+            ),
+            shape=tuple(meta["shape"]),
+        )
+        return cls(
+            joblib.load(os.path.join(path, "vectorizer.joblib")),
+            np.load(os.path.join(path, "meal_ids.npy"), mmap_mode=mmap_mode),
+            meal_vectors,
+            meta["fingerprint"],
+            path,
+        )
+
+    def publish(self, root):
+        """
+        Saves the model as a new immutable version under `root` (named by its fingerprint) and makes it
+        the current one; files of earlier versions, which readers may have memory-mapped, are left untouched.
+        """
+        self.path = artifacts.publish(root, self.fingerprint[:16], self.save)
+        return self.path
+
+
+def model_path() -> str:
+    return os.path.join(settings.ARTIFACTS_DIR, MODEL_DIR_NAME)
+
+
+_content_model = None
+_model_catalog = None  # The catalog instance the current model was checked against
+_lock = threading.Lock()
+
+
+def load_content_model(path=None):
+    """
+    Loads a saved model: the version directory `path`, or the currently published one. Called at application
+    startup and by worker processes; a newly loaded version is checked against the meal catalog on next use.
+    """
+    global _content_model, _model_catalog
+    path = path or artifacts.current_version_path(model_path())
+    if path is not None and (_content_model is None or _content_model.path != path):
+        with _lock:
+            _content_model = ContentModel.load(path)
+            _model_catalog = None
+    return _content_model
+
+
+def get_content_model(db: Session, catalog: MealCatalog = None) -> ContentModel:
+    """
+    Returns the shared content model, refitting (and saving) it only when the meal catalog has changed.
+    `catalog` defaults to the shared meal catalog.
+    """
+    global _content_model, _model_catalog
+    if catalog is None:
+        catalog = get_meal_catalog(db)
+    if _content_model is not None and _model_catalog is catalog:
+        return _content_model
+
+    with _lock:
+        if _content_model is None or _model_catalog is not catalog:
+            if _content_model is None or _content_model.fingerprint != catalog_fingerprint(catalog):
+                _content_model = ContentModel.build(catalog)
+                try:
+                    _content_model.publish(model_path())
+                except OSError as e:
+                    print(f"Could not save content model: {str(e)}")
+            _model_catalog = catalog
+    return _content_model
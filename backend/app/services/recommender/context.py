@@ -0,0 +1,91 @@
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models.recent_activity import RecentActivity
+from app.models.user import User
+from app.services.meal_catalog import MealCatalog, get_meal_catalog
+from app.services.recommender.popularity import PopularityCounts, get_popularity_counts
+
+
+class RecommendationContext:
+    """
+    Everything one recommendation request needs, loaded once and shared by every stage: the user, their
+    meal interactions, the meal catalog and the materialised like counts (see PopularityCounts).
+    `liked_meal_ids` keeps the order the likes were recorded in.
+    """
+
+    def __init__(self, user, catalog: MealCatalog, interacted_meal_ids, liked_meal_ids, popularity: PopularityCounts):
+        self.user = user
+        self.catalog = catalog
+        self.interacted_meal_ids = interacted_meal_ids
+        self.liked_meal_ids = liked_meal_ids
+        self.popularity = popularity
+
+    @property
+    def user_id(self):
+        return self.user.user_id
+
+    @classmethod
+    def from_db(cls, db: Session, user_id):
+        """
+        Loads the context with two queries, the user and their activities; the catalog and the like
+        counts come from the shared in-memory copies. Returns None if the user does not exist.
+        """
+        user = db.query(User).filter(User.user_id == user_id).first()
+        if not user:
+            return None
+
+        activities = db.query(RecentActivity.meal_id, RecentActivity.liked).filter(
+            RecentActivity.user_id == user_id,
+            RecentActivity.meal_id.isnot(None),
+        ).order_by(RecentActivity.activity_id).all()
+
+        return cls(
+            user,
+            get_meal_catalog(db),
+            {meal_id for meal_id, _ in activities},
+            [meal_id for meal_id, liked in activities if liked],
+            get_popularity_counts(db),
+        )
+
+    @classmethod
+    def from_db_batch(cls, db: Session, user_ids):
+        """
+        Contexts for several users with two queries in total, the users and all their activities.
+        Returns {user_id: context} for the users that exist.
+        """
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        users = db.query(User).filter(User.user_id.in_(user_ids)).all()
+        if not users:
+            return {}
+
+        activities = db.query(RecentActivity.user_id, RecentActivity.meal_id, RecentActivity.liked).filter(
+            RecentActivity.user_id.in_(user_ids),
+            RecentActivity.meal_id.isnot(None),
+        ).order_by(RecentActivity.activity_id).all()
+        by_user = {user.user_id: [] for user in users}
+        for user_id, meal_id, liked in activities:
+            by_user[user_id].append((meal_id, liked))
+
+        catalog = get_meal_catalog(db)
+        popularity = get_popularity_counts(db)
+        return {
+            user.user_id: cls(
+                user,
+                catalog,
+                {meal_id for meal_id, _ in by_user[user.user_id]},
+                [meal_id for meal_id, liked in by_user[user.user_id] if liked],
+                popularity,
+            )
+            for user in users
+        }
+
+    def like_counts(self, meal_ids):
+        """
+        (global likes, cohort likes, in the cohort's five most liked) for each of `meal_ids`, as arrays.
+        The cohort is the users sharing this user's disease history.
+        """
+        disease = self.user.disease
+        global_likes = self.popularity.meal_likes(meal_ids)
+        cohort_likes = self.popularity.cohort_likes(disease, meal_ids)
+        cohort_top = np.isin(np.asarray(meal_ids, dtype=np.int64), self.popularity.cohort_top(disease, 5))
+        return global_likes, cohort_likes, cohort_top
@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+from app.core.config import settings
+from app.services.recommender import artifacts
+
+MODEL_DIR_NAME = "exercise_model"
+MODEL_VERSION = 3  # Bump when the features, estimator or artifact layout change
+ENGINES = ("table", "forest")
+
+
+def data_hash(path) -> str:
+    """
+    SHA-256 of the exercise CSV; a saved model is stale once this changes.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as data_file:
+        for chunk in iter(lambda: data_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IntensityTable:
+    """
+    The forest's prediction as a step function of BMI, for a `predict` without scikit-learn.
+
+    A forest over a single feature is piecewise constant between the split thresholds of its trees, so
+    `thresholds` (sorted, in the scaled feature space) and one value per interval reproduce it exactly:
+    interval i holds inputs `thresholds[i-1] < x <= thresholds[i]`, like the trees' `x <= threshold` test.
+    """
+
+    def __init__(self, mean, scale, thresholds, values):
+        self.mean = float(mean)
+        self.scale = float(scale)
+        self.thresholds = thresholds
+        self.values = values
+
+    @classmethod
+    def from_forest(cls, scaler, forest):
+        thresholds = np.unique(np.concatenate([
+            tree.tree_.threshold[tree.tree_.feature >= 0] for tree in forest.estimators_
+        ]))
+        # Trees compare float32 inputs; probe each interval with a float32 inside it
+        probes = thresholds.astype(np.float32)
+        probes = np.where(probes > thresholds, np.nextafter(probes, np.float32(-np.inf)), probes)
+        if len(thresholds):
+            last = np.float32(thresholds[-1])
+            if last <= thresholds[-1]:
+                last = np.nextafter(last, np.float32(np.inf))
+            probes = np.append(probes, last)
+        else:
+            probes = np.zeros(1, dtype=np.float32)
+        values = forest.predict(probes.reshape(-1, 1))
+        return cls(scaler.mean_[0], scaler.scale_[0], thresholds, values)
+
+    def predict(self, bmi):
+        """
+        Intensity for a BMI value (or an array of them), identical to the forest's prediction.
+        """
+        scaled = ((np.asarray(bmi, dtype=np.float64) - self.mean) / self.scale).astype(np.float32)
+        return self.values[np.searchsorted(self.thresholds, scaled.astype(np.float64), side="left")]
+
+
+class ExerciseModel:
+    """
+    BMI → exercise intensity regressor: a StandardScaler and a RandomForestRegressor fitted on the
+    exercise dataset. `data_hash` identifies the CSV it was trained on. The lookup table and the
+    feature importances are derived once from the forest and saved with it.
+    """
+
+    def __init__(self, scaler, forest, data_hash, version=MODEL_VERSION, table=None, feature_importance=None):
+        self.scaler = scaler
+        self.forest = forest
+        self.data_hash = data_hash
+        self.version = version
+        self.table = table if table is not None else IntensityTable.from_forest(scaler, forest)
+        if feature_importance is None:
+            feature_importance = {"bmi": float(forest.feature_importances_[0])}
+        self.feature_importance = feature_importance
+
+    @classmethod
+    def train(cls, exercises: pd.DataFrame, data_hash=None):
+        # Train model - Correct the column names to match the exercise dataset
+        X_train = exercises[["bmi"]].to_numpy(dtype=np.float64)
+        y_train = exercises["exercise_intensity"]
+
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+
+        forest = RandomForestRegressor(n_estimators=100, random_state=42)
+        forest.fit(X_train_scaled, y_train)
+        return cls(scaler, forest, data_hash)
+
+    def predict(self, bmi, engine=None) -> float:
+        """
+        Predicted exercise intensity for one BMI value. `engine` is "table" (the exported IntensityTable,
+        no scikit-learn call) or "forest"; it defaults to the EXERCISE_INTENSITY_ENGINE setting.
+        """
+        engine = engine or settings.EXERCISE_INTENSITY_ENGINE
+        if engine == "table":
+            return float(self.table.predict(bmi))
+        if engine == "forest":
+            return float(self.forest.predict(self.scaler.transform(np.array([[bmi]])))[0])
+        raise ValueError(f"Unknown exercise intensity engine '{engine}'. Choose from {', '.join(ENGINES)}.")
+
+    def is_fresh(self, data_hash) -> bool:
+        return self.version == MODEL_VERSION and self.data_hash == data_hash
+
+    def save(self, path):
+        """
+        Writes the fitted scaler and forest (joblib), the exported lookup table (.npy) and a meta.json
+        with the artifact version, data hash and feature importances. Use `publish` to replace a saved model
+        in place of others.
+        """
+        os.makedirs(path, exist_ok=True)
+        joblib.dump({"scaler": self.scaler, "forest": self.forest}, os.path.join(path, "model.joblib"))
+        np.save(os.path.join(path, "table_thresholds.npy"), self.table.thresholds)
+        np.save(os.path.join(path, "table_values.npy"), self.table.values)
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump({
+                "version": self.version,
+                "data_hash": self.data_hash,
+                "sklearn_version": sklearn.__version__,
+                "table": {"mean": self.table.mean, "scale": self.table.scale},
+                "feature_importance": self.feature_importance,
+            }, meta_file)
+
+    def publish(self, root) -> str:
+        """
+        Saves the model as a new immutable version under `root`, named by the artifact version, scikit-learn
+        version and data hash, and makes it the current one. Earlier versions are left untouched.
+        """
+        version = f"v{self.version}-sklearn{sklearn.__version__}-{(self.data_hash or 'unhashed')[:16]}"
+        return artifacts.publish(root, version, self.save)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        if meta.get("version") != MODEL_VERSION or meta.get("sklearn_version") != sklearn.__version__:
+            return None  # Written by an incompatible build; retrain instead of unpickling it
+        estimators = joblib.load(os.path.join(path, "model.joblib"))
+        table = IntensityTable(
+            meta["table"]["mean"],
+            meta["table"]["scale"],
+            np.load(os.path.join(path, "table_thresholds.npy")),
+            np.load(os.path.join(path, "table_values.npy")),
+        )
+        return cls(
+            estimators["scaler"], estimators["forest"], meta["data_hash"], meta["version"], table,
+            meta["feature_importance"],
+        )
+
+
+def model_path() -> str:
+    return os.path.join(settings.ARTIFACTS_DIR, MODEL_DIR_NAME)
+
+
+_exercise_model = None
+_exercises = None
+_lock = threading.Lock()
+
+
+def load_exercise_data() -> pd.DataFrame:
+    """
+    The exercise dataset, read from EXERCISE_DATA_PATH once per process.
+    """
+    global _exercises
+    if _exercises is None:
+        with _lock:
+            if _exercises is None:
+                _exercises = pd.read_csv(settings.EXERCISE_DATA_PATH)
+    return _exercises
+
+
+def load_exercise_model():
+    """
+    Loads the saved model if it exists and was trained on the current CSV. Called at application startup;
+    a missing or stale artifact is retrained on first use instead.
+    """
+    global _exercise_model
+    path = artifacts.current_version_path(model_path())
+    if path is None or not os.path.exists(settings.EXERCISE_DATA_PATH):
+        return _exercise_model
+    model = ExerciseModel.load(path)
+    if model is not None and model.is_fresh(data_hash(settings.EXERCISE_DATA_PATH)):
+        with _lock:
+            _exercise_model = model
+    return _exercise_model
+
+
+def get_exercise_model() -> ExerciseModel:
+    """
+    Returns the shared model, training and saving it if there is no fresh one.
+    Raises FileNotFoundError if the exercise dataset is missing.
+    """
+    global _exercise_model
+    if _exercise_model is None:
+        current_hash = data_hash(settings.EXERCISE_DATA_PATH)
+        exercises = load_exercise_data()
+        with _lock:
+            if _exercise_model is None:
+                model = ExerciseModel.train(exercises, current_hash)
+                try:
+                    model.publish(model_path())
+                except OSError as e:
+                    print(f"Could not save exercise model: {str(e)}")
+                _exercise_model = model
+    return _exercise_model
+
+
+def main():
+    """
+    Offline step: trains the exercise intensity model from the CSV and saves it.
+
+    Usage: python -m app.services.recommender.exercise_model [--data path/to/cleaned_exercise.csv]
+    """
+    parser = argparse.ArgumentParser(description="Train the exercise intensity model.")
+    parser.add_argument("--data", default=settings.EXERCISE_DATA_PATH)
+    parser.add_argument("--output", default=model_path())
+    args = parser.parse_args()
+
+    model = ExerciseModel.train(pd.read_csv(args.data), data_hash(args.data))
+    path = model.publish(args.output)
+    print(f"Saved exercise model v{model.version} for {args.data} ({model.data_hash[:12]}) "
+          f"with a {len(model.table.values)}-step intensity table to {path}")
+
+
+if __name__ == "__main__":
+    main()
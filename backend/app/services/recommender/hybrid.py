@@ -1,10 +1,12 @@
-from app.services.recommender.content_based import recommend_content_based
-from app.services.recommender.collaborative import recommend_user_based, recommend_item_based
+from app.services.recommender.content_based import recommend_content_based, recommend_content_based_batch
+from app.services.recommender.collaborative import (
+    recommend_user_based, recommend_item_based, recommend_user_based_batch, recommend_item_based_batch,
+)
+import numpy as np
 from sqlalchemy.orm import Session
-from app.models.recent_activity import RecentActivity
-from app.models.user import User
-from app.models.meal import Meal
-from collections import Counter
+from app.services.meal_service import hydrate_meals
+from app.services.recommender.context import RecommendationContext
+from app.services.recommender.topk import top_k
 
 def hybrid_recommendation(db: Session, user_id, top_n=15):
     """
@@ -12,88 +14,89 @@ def hybrid_recommendation(db: Session, user_id, top_n=15):
     Prioritizes meals that multiple users (with similar conditions) have liked.
     """
 
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if not user:
+    # ✅ Load the user, their interactions, like counts and the catalog once for every stage
+    context = RecommendationContext.from_db(db, user_id)
+    if not context:
         return {"error": "User not found"}
 
-    # ✅ Fetch users with the same condition
-    similar_users = db.query(User).filter(User.disease == user.disease).all()
-    similar_user_ids = [u.user_id for u in similar_users]
-
-    # ✅ Track meals based on popularity across ALL users (not just similar)
-    global_liked_meal_counts = Counter(
-        activity.meal_id
-        for activity in db.query(RecentActivity)
-        .filter(RecentActivity.liked == True)
-        .all()
-    )
-
-    # ✅ Track most liked meals by similar users
-    similar_liked_meal_counts = Counter(
-        activity.meal_id
-        for activity in db.query(RecentActivity)
-        .filter(RecentActivity.user_id.in_(similar_user_ids), RecentActivity.liked == True)
-        .all()
-    )
-
     # ✅ Get standard recommendations
-    content_based = recommend_content_based(db, user_id, top_n * 2)
-    user_based = recommend_user_based(db, user_id, top_n * 2)
-    item_based = recommend_item_based(db, user_id, top_n * 2)
+    content_based = recommend_content_based(db, user_id, top_n * 2, context=context)
+    user_based = recommend_user_based(db, user_id, top_n * 2, context=context)
+    item_based = recommend_item_based(db, user_id, top_n * 2, context=context)
 
-    # ✅ Merge & rank recommendations
-    recommendations = []
-    meal_priority = {}
+    return rank_recommendations(db, context, content_based, user_based, item_based)
 
+
+def hybrid_recommendation_batch(db: Session, user_ids, top_n=15):
+    """
+    `hybrid_recommendation` for several users (e.g. a cohort refresh): {user_id: recommendations}.
+
+    Contexts are loaded with two queries in total, and each stage runs once for the whole batch as a
+    matrix-matrix product (profile vectors × TF-IDF matrix, user rows × interaction matrix, meal indicator
+    rows × similarity index). Results match calling `hybrid_recommendation` for each user.
+    Unknown users map to {"error": "User not found"}.
+    """
+    contexts = RecommendationContext.from_db_batch(db, user_ids)
+    batch = list(contexts.values())
+
+    content_based = recommend_content_based_batch(db, batch, top_n * 2)
+    user_based = recommend_user_based_batch(db, batch, top_n * 2)
+    item_based = recommend_item_based_batch(db, batch, top_n * 2)
+
+    results = {}
+    for user_id in user_ids:
+        context = contexts.get(int(user_id))
+        if not context:
+            results[user_id] = {"error": "User not found"}
+            continue
+        results[user_id] = rank_recommendations(
+            db, context, content_based[context.user_id], user_based[context.user_id], item_based[context.user_id],
+        )
+    return results
+
+
+def rank_recommendations(db: Session, context: RecommendationContext, content_based, user_based, item_based):
+    """
+    Merges the three stages' recommendations for one user and ranks them by likes: global, within the
+    user's cohort and the user's own. Previously liked meals missing from the result are put on top.
+    """
+    # ✅ Merge recommendations; a meal suggested by several stages is kept once, from the first stage
+    recommendations = []
+    seen_meal_ids = set()
     for rec_list in [content_based, user_based, item_based]:
         if isinstance(rec_list, list):
             for rec in rec_list:
-                if isinstance(rec, dict):
-                    meal_id = rec["meal_id"]
+                if isinstance(rec, dict) and rec["meal_id"] not in seen_meal_ids:
+                    seen_meal_ids.add(rec["meal_id"])
+                    recommendations.append(rec)
 
-                    # ✅ Assign priority based on likes by **all users** and **similar users**
-                    priority = global_liked_meal_counts.get(meal_id, 0) * 3  # Global impact
-                    priority += similar_liked_meal_counts.get(meal_id, 0) * 5  # Personal impact
+    # ✅ Score all candidates at once against the catalog-aligned like counts
+    candidate_ids = np.array([rec["meal_id"] for rec in recommendations], dtype=np.int64)
+    global_likes, cohort_likes, cohort_top = context.like_counts(candidate_ids)
 
-                    # ✅ Boost meals the user has already liked
-                    if db.query(RecentActivity).filter_by(user_id=user_id, meal_id=meal_id, liked=True).first():
-                        priority += 10  # Increase priority for the same user
+    # Assign priority based on likes by **all users** and **similar users**
+    priority = global_likes * 3  # Global impact
+    priority += cohort_likes * 5  # Personal impact
 
-                    meal_priority[meal_id] = priority
-                    recommendations.append(rec)
+    # Boost meals the user has already liked
+    priority += np.isin(candidate_ids, context.liked_meal_ids) * 10  # Increase priority for the same user
+
+    # Boost meals that are popular among users with the same disease (top 5 most liked in the cohort)
+    priority += cohort_top * 25  # Give high priority to disease-specific popular meals
+
+    # ✅ Rank recommendations by popularity & personal preference (ties keep their merge order)
+    recommendations = [recommendations[i] for i in top_k(priority, len(recommendations))]
+
+    # Add user's liked/purchased meals to the top if not already included
+    recommended_meal_ids = {r["meal_id"] for r in recommendations}
+    missing_liked_meal_ids = []
+    for meal_id in context.liked_meal_ids:
+        if meal_id not in recommended_meal_ids:
+            missing_liked_meal_ids.append(meal_id)
+            recommended_meal_ids.add(meal_id)
 
-    # Add this code right here
-    # Boost meals that are popular among users with the same disease
-    for meal_id, count in similar_liked_meal_counts.most_common(5):  # Top 5 most popular meals
-        if meal_id in meal_priority:
-            meal_priority[meal_id] += 25  # Give high priority to disease-specific popular meals
-
-    # ✅ Sort recommendations by popularity & personal preference
-    recommendations.sort(key=lambda r: meal_priority.get(r["meal_id"], 0), reverse=True)
-
-    user_liked_meals = db.query(RecentActivity).filter_by(user_id=user_id, liked=True).all()
-
-# After your initial recommendations are sorted
-# Add user's liked/purchased meals to the top if not already included
-    user_liked_meal_ids = [activity.meal_id for activity in user_liked_meals]
-    for meal_id in user_liked_meal_ids:
-        if meal_id not in [r["meal_id"] for r in recommendations]:
-            meal = db.query(Meal).filter(Meal.meal_id == meal_id).first()
-            if meal:
-                recommendations.insert(0, {
-                    "meal_id": meal.meal_id,
-                    "name": meal.name,
-                    "nutrient": meal.nutrient,
-                    "disease": meal.disease,
-                    "diet": meal.diet,
-                    "source": "previously-liked"
-                })
-
-    # ✅ Ensure at least 10 meals are in recommendations
-    if len(recommendations) < 10:
-        missing_count = 10 - len(recommendations)
-        additional_meals = db.query(Meal).filter(
-            Meal.meal_id.notin_([r["meal_id"] for r in recommendations])
-        ).limit(missing_count).all()
+    # ✅ Resolve liked meals from the catalog; each is moved to the top, so the last liked ends up first
+    previously_liked = hydrate_meals(db, missing_liked_meal_ids, context.catalog, source="previously-liked")
+    recommendations = previously_liked[::-1] + recommendations
 
     return recommendations
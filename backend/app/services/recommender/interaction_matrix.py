@@ -0,0 +1,471 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.recent_activity import RecentActivity
+from app.services.recommender.update_log import update_log
+
+
+class InteractionMatrix:
+    """
+    In-process user×meal interaction matrix shared by the collaborative recommenders.
+
+    Each cell holds the interaction score (liked + purchased + rated) for a user and a meal,
+    taking the max when the activity table has duplicate rows. Only positive interactions are stored.
+
+    Writes are applied in place through `apply_delta`, which also keeps the per-user sums and
+    sums of squares needed for Pearson similarity up to date. Cells that are not in the CSR structure yet
+    (and every cell of new users and meals) go to a pending overlay, which readers consult through a
+    `snapshot()` and which is folded into the CSR once it holds more than INTERACTION_FOLD_CELLS cells.
+    """
+
+    def __init__(self, user_ids, meal_ids, matrix):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.meal_ids = np.asarray(meal_ids, dtype=np.int64)
+        self._matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        self._matrix.sort_indices()
+        self.user_index = {int(user_id): i for i, user_id in enumerate(self.user_ids)}
+        self.meal_index = {int(meal_id): i for i, meal_id in enumerate(self.meal_ids)}
+
+        # Cells that are not part of the CSR structure yet, and their overlay (built on the next snapshot)
+        self._pending = {}
+        self._overlay = None
+        self._lock = threading.RLock()
+
+        # ✅ Per-user statistics for Pearson similarity (means and norms are derived from these)
+        self.row_sums = np.asarray(self._matrix.sum(axis=1), dtype=np.float64).ravel()
+        self.row_sq_sums = np.asarray(self._matrix.multiply(self._matrix).sum(axis=1), dtype=np.float64).ravel()
+        self.row_counts = np.diff(self._matrix.indptr).astype(np.int64)
+
+        # Backing arrays with spare capacity, so adding a user or meal is amortised O(1)
+        self._buffers = {}
+
+    @classmethod
+    def from_interactions(cls, user_ids, meal_ids, scores):
+        """
+        Builds the matrix from parallel arrays of (user_id, meal_id, score) triples.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        meal_ids = np.asarray(meal_ids, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+
+        positive = scores > 0  # Only include positive interactions
+        user_ids, meal_ids, scores = user_ids[positive], meal_ids[positive], scores[positive]
+
+        unique_users, rows = np.unique(user_ids, return_inverse=True)
+        unique_meals, cols = np.unique(meal_ids, return_inverse=True)
+
+        # ✅ Aggregate duplicates by keeping the max score: sort by (cell, score) and keep the last of each cell
+        cells = rows.astype(np.int64) * max(len(unique_meals), 1) + cols
+        order = np.lexsort((scores, cells))
+        cells, scores = cells[order], scores[order]
+        last = np.ones(len(cells), dtype=bool)
+        last[:-1] = cells[1:] != cells[:-1]
+
+        matrix = sparse.csr_matrix(
+            (scores[last], (rows[order][last], cols[order][last])),
+            shape=(len(unique_users), len(unique_meals)),
+        )
+        return cls(unique_users, unique_meals, matrix)
+
+    @classmethod
+    def from_db(cls, db: Session):
+        """
+        Loads every meal interaction from `user_activity` in a single column-only query.
+        """
+        rows = db.query(
+            RecentActivity.user_id,
+            RecentActivity.meal_id,
+            RecentActivity.liked,
+            RecentActivity.purchased,
+            RecentActivity.rated,
+        ).filter(RecentActivity.meal_id.isnot(None)).all()
+
+        user_ids = [row.user_id for row in rows]
+        meal_ids = [row.meal_id for row in rows]
+        scores = [interaction_score(row.liked, row.purchased, row.rated) for row in rows]
+        return cls.from_interactions(user_ids, meal_ids, scores)
+
+    def save(self, path):
+        """
+        Writes the user/meal ids and the CSR arrays (pending cells folded in) as .npy files into `path`.
+        """
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            matrix = self.matrix
+            np.save(os.path.join(path, "user_ids.npy"), self.user_ids)
+            np.save(os.path.join(path, "meal_ids.npy"), self.meal_ids)
+            np.save(os.path.join(path, "data.npy"), matrix.data)
+            np.save(os.path.join(path, "indices.npy"), matrix.indices)
+            np.save(os.path.join(path, "indptr.npy"), matrix.indptr)
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump({"shape": list(matrix.shape)}, meta_file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a saved matrix. With `mmap=True` the CSR arrays are memory-mapped copy-on-write: processes
+        share the file's pages, and only pages touched by `apply_delta` become private.
+        """
+        mmap_mode = "c" if mmap else None
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        matrix = sparse.csr_matrix(
+            (
+                np.load(os.path.join(path, "data.npy"), mmap_mode=mmap_mode),
+                np.load(os.path.join(path, "indices.npy"), mmap_mode=mmap_mode),
+                np.load(os.path.join(path, "indptr.npy"), mmap_mode=mmap_mode),
+            ),
+            shape=tuple(meta["shape"]),
+        )
+        return cls(np.load(os.path.join(path, "user_ids.npy")), np.load(os.path.join(path, "meal_ids.npy")), matrix)
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """
+        The full CSR matrix, with the pending overlay folded in. Costs O(non-zeros) when there is an overlay;
+        hot paths read a `snapshot()` instead.
+        """
+        if self._pending or self._matrix.shape != self.shape:
+            with self._lock:
+                self._fold_pending()
+        return self._matrix
+
+    @property
+    def shape(self):
+        return (len(self.user_ids), len(self.meal_ids))
+
+    def is_empty(self) -> bool:
+        return not self.row_counts.any()
+
+    def has_user(self, user_id) -> bool:
+        row = self.user_index.get(int(user_id))
+        return row is not None and self.row_counts[row] > 0
+
+    def user_means(self) -> np.ndarray:
+        """
+        Mean score of every user across all meals (zeros included), as used by Pearson similarity.
+        """
+        return self.snapshot().user_means()
+
+    def user_norms(self) -> np.ndarray:
+        """
+        L2 norm of every user's raw score vector.
+        """
+        return self.snapshot().user_norms()
+
+    def user_centred_norms(self) -> np.ndarray:
+        """
+        L2 norm of every user's mean-centred score vector (the Pearson denominator).
+        """
+        return self.snapshot().user_centred_norms()
+
+    def snapshot(self) -> "InteractionSnapshot":
+        """
+        A consistent view of the ids, the CSR matrix plus the pending overlay, and the per-user statistics.
+
+        Costs O(pending cells) when cells were added since the last snapshot, O(1) otherwise.
+        A snapshot's shapes never change; scores written later to cells it already covers may or may not
+        show in it.
+        """
+        with self._lock:
+            if self._overlay is None or self._overlay[1].shape[1] != len(self.meal_ids):
+                self._overlay = self._pending_overlay()
+            overlay_rows, overlay = self._overlay
+            return InteractionSnapshot(
+                self.user_ids, self.meal_ids, self.user_index, self.meal_index, self._matrix, overlay_rows, overlay,
+                self.row_sums, self.row_sq_sums, self.row_counts,
+            )
+
+    def apply_delta(self, user_id, meal_id, score):
+        """
+        Sets the score of one (user, meal) cell in place and updates the per-user statistics.
+        Costs O(log row length) for cells already in the CSR structure and O(1) amortised for new cells,
+        users and meals; every INTERACTION_FOLD_CELLS new cells, one write also folds the overlay (O(non-zeros)).
+        """
+        score = float(score)
+        with self._lock:
+            row = self.user_index.get(int(user_id))
+            col = self.meal_index.get(int(meal_id))
+            if score <= 0 and (row is None or col is None):
+                return  # Nothing stored for this cell, and zeros are not stored
+
+            if row is None:
+                row = self._add_user(user_id)
+            if col is None:
+                col = self._add_meal(meal_id)
+
+            pos = self._position(row, col)
+            if pos is not None:
+                old = self._matrix.data[pos]
+                self._matrix.data[pos] = score
+            else:
+                old = self._pending.get((row, col), 0.0)
+                self._pending[(row, col)] = score
+                self._overlay = None
+
+            self.row_sums[row] += score - old
+            self.row_sq_sums[row] += score ** 2 - old ** 2
+            self.row_counts[row] += int(score > 0) - int(old > 0)
+
+            if len(self._pending) > settings.INTERACTION_FOLD_CELLS:
+                self._fold_pending()
+
+    def user_meals(self, user_id) -> np.ndarray:
+        """
+        Returns the meal ids the user interacted with positively, in matrix column order.
+        Unknown users get an empty array.
+        """
+        interactions = self.snapshot()
+        row = interactions.row_of(user_id)
+        if row is None:
+            return np.empty(0, dtype=np.int64)
+        matrix = interactions.rows([row])
+        matrix.sort_indices()
+        return interactions.meal_ids[matrix.indices[matrix.data > 0]]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Dense user×meal DataFrame, equivalent to pivoting the activity table and filling gaps with 0.
+        """
+        return pd.DataFrame(self.matrix.toarray(), index=self.user_ids, columns=self.meal_ids)
+
+    def _position(self, row, col):
+        """
+        Position of the cell in the CSR data array, or None if it is not stored there.
+        """
+        n_rows, n_cols = self._matrix.shape
+        if row >= n_rows or col >= n_cols:
+            return None
+        start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+        pos = start + np.searchsorted(self._matrix.indices[start:end], col)
+        return pos if pos < end and self._matrix.indices[pos] == col else None
+
+    def _append(self, name, value):
+        """
+        Appends `value` to the array attribute `name` through its backing buffer, doubling the buffer when full.
+        Arrays handed out earlier keep their length.
+        """
+        array = getattr(self, name)
+        size = len(array)
+        buffer = self._buffers.get(name)
+        if buffer is None or size == len(buffer):
+            buffer = np.empty(max(2 * size, 16), dtype=array.dtype)
+            buffer[:size] = array
+            self._buffers[name] = buffer
+        buffer[size] = value
+        setattr(self, name, buffer[:size + 1])
+
+    def _add_user(self, user_id) -> int:
+        # ✅ Grow the arrays first and publish the index entry last, so that lock-free readers never see a
+        # user row the statistics do not have yet. The CSR structure only grows on the next fold.
+        row = len(self.user_ids)
+        self._append("row_sums", 0.0)
+        self._append("row_sq_sums", 0.0)
+        self._append("row_counts", 0)
+        self._append("user_ids", np.int64(user_id))
+        self.user_index[int(user_id)] = row
+        return row
+
+    def _add_meal(self, meal_id) -> int:
+        col = len(self.meal_ids)
+        self._append("meal_ids", np.int64(meal_id))
+        self.meal_index[int(meal_id)] = col
+        return col
+
+    def _pending_cells(self):
+        cells = np.array(list(self._pending.keys()), dtype=np.int64).reshape(-1, 2)
+        scores = np.fromiter(self._pending.values(), dtype=np.float64, count=len(self._pending))
+        return cells[:, 0], cells[:, 1], scores
+
+    def _pending_overlay(self):
+        """
+        The pending cells as (sorted rows that have any, a CSR matrix with one row per such row).
+        """
+        rows, cols, scores = self._pending_cells()
+        order = np.lexsort((cols, rows))  # Cells are unique, so sorting them gives the CSR layout directly
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        overlay_rows, starts = np.unique(rows, return_index=True)
+        return overlay_rows, sparse.csr_matrix(
+            (scores, cols, np.append(starts, len(rows))), shape=(len(overlay_rows), len(self.meal_ids)),
+        )
+
+    def _fold_pending(self):
+        rows, cols, scores = self._pending_cells()
+        pending = sparse.csr_matrix((scores, (rows, cols)), shape=self.shape)
+        matrix = (_resize(self._matrix, self.shape) + pending).tocsr()
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        self._matrix = matrix
+        self._pending = {}
+        self._overlay = None
+
+
+def _gather_rows(matrix: sparse.csr_matrix, rows, n_cols) -> sparse.csr_matrix:
+    """
+    Rows of `matrix` as a new CSR matrix with `n_cols` columns, at O(their non-zeros); rows past the end
+    of `matrix` come back empty.
+    """
+    n_rows = matrix.shape[0]
+    starts = matrix.indptr[np.minimum(rows, n_rows)]
+    lengths = matrix.indptr[np.minimum(rows + 1, n_rows)] - starts
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+    return sparse.csr_matrix((matrix.data[positions], matrix.indices[positions], indptr), shape=(len(rows), n_cols))
+
+
+def _resize(matrix: sparse.csr_matrix, shape) -> sparse.csr_matrix:
+    """
+    `matrix` grown to `shape` with empty rows and columns, sharing its data and indices.
+    """
+    if matrix.shape == shape:
+        return matrix
+    indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1])])
+    return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+
+
+class InteractionSnapshot:
+    """
+    Point-in-time view of an `InteractionMatrix`; see `InteractionMatrix.snapshot`.
+
+    The interactions are `base` (the CSR structure, which may have fewer rows and columns than the snapshot
+    when users or meals were added since the last fold) plus `overlay` (the pending cells, one row for each
+    user row in `overlay_rows`). `rows` and `dot` read both without folding them; `matrix` folds them on first use.
+    """
+
+    def __init__(self, user_ids, meal_ids, user_index, meal_index, base, overlay_rows, overlay,
+                 row_sums, row_sq_sums, row_counts):
+        self.user_ids = user_ids
+        self.meal_ids = meal_ids
+        self.user_index = user_index  # Shared with the live matrix: look users up with `row_of`
+        self.meal_index = meal_index
+        self.base = base
+        self.overlay_rows = overlay_rows
+        self.overlay = overlay
+        self.row_sums = row_sums
+        self.row_sq_sums = row_sq_sums
+        self.row_counts = row_counts
+        self._matrix = None
+
+    @property
+    def shape(self):
+        return (len(self.user_ids), len(self.meal_ids))
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """
+        Base and overlay folded into one CSR matrix (O(non-zeros), once per snapshot).
+        """
+        if self._matrix is None:
+            matrix = self.base
+            if self.overlay.nnz or matrix.shape != self.shape:
+                overlay = self.overlay.tocoo()
+                overlay = sparse.csr_matrix(
+                    (overlay.data, (self.overlay_rows[overlay.row], overlay.col)), shape=self.shape,
+                )
+                matrix = (_resize(matrix, self.shape) + overlay).tocsr()
+                matrix.eliminate_zeros()
+                matrix.sort_indices()
+            self._matrix = matrix
+        return self._matrix
+
+    def row_of(self, user_id):
+        """
+        The user's row, or None if the user is unknown to this snapshot.
+        """
+        row = self.user_index.get(int(user_id))
+        return row if row is not None and row < len(self.user_ids) else None
+
+    def rows(self, rows) -> sparse.csr_matrix:
+        """
+        The given user rows as a CSR matrix, at O(their non-zeros) rather than O(all non-zeros).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        selected = _gather_rows(self.base, rows, self.shape[1])  # Users added since the last fold come back empty
+        if self.overlay.nnz:
+            positions = np.searchsorted(self.overlay_rows, rows)
+            found = positions < len(self.overlay_rows)
+            found[found] = self.overlay_rows[positions[found]] == rows[found]
+            if found.any():
+                positions = np.where(found, positions, len(self.overlay_rows))  # Past the end: no pending cells
+                selected = (selected + _gather_rows(self.overlay, positions, self.shape[1])).tocsr()
+        return selected
+
+    def dot(self, other) -> np.ndarray:
+        """
+        `matrix @ other` for a (meals × k) sparse or dense `other`, as a dense (users × k) array.
+        """
+        n_base, m_base = self.base.shape
+        result = np.zeros((self.shape[0], other.shape[1]), dtype=np.float64)
+        result[:n_base] = _dense(self.base @ other[:m_base])
+        if self.overlay.nnz:
+            result[self.overlay_rows] += _dense(self.overlay @ other)
+        return result
+
+    def user_means(self) -> np.ndarray:
+        return self.row_sums / max(self.shape[1], 1)
+
+    def user_norms(self) -> np.ndarray:
+        return np.sqrt(self.row_sq_sums)
+
+    def user_centred_norms(self) -> np.ndarray:
+        centred = self.row_sq_sums - self.row_sums ** 2 / max(self.shape[1], 1)
+        return np.sqrt(np.clip(centred, 0, None))
+
+
+def _dense(matrix) -> np.ndarray:
+    return matrix.toarray() if sparse.issparse(matrix) else np.asarray(matrix)
+
+
+def interaction_score(liked, purchased, rated) -> int:
+    """
+    Interaction score for one activity row: one point per positive signal.
+    """
+    return int(bool(liked)) + int(bool(purchased)) + int(bool(rated))
+
+
+_interaction_matrix = None
+_lock = threading.Lock()
+
+
+def get_interaction_matrix(db: Session) -> InteractionMatrix:
+    """
+    Returns the shared interaction matrix, building it from the database on first use.
+    """
+    global _interaction_matrix
+    if _interaction_matrix is None:
+        with _lock:
+            if _interaction_matrix is None:
+                _interaction_matrix = InteractionMatrix.from_db(db)
+    return _interaction_matrix
+
+
+def apply_interaction_delta(user_id, meal_id, score):
+    """
+    Publishes a changed (user, meal) score to the shared matrix.
+
+    A build in flight holds the build lock until the matrix is assigned, so a delta that finds no matrix waits
+    for it and is applied on top; scores are absolute, so re-applying a row the build already read is harmless.
+    If no matrix is being built there is nothing to patch: the first build reads the committed row.
+    """
+    interaction_matrix = _interaction_matrix
+    if interaction_matrix is None:
+        with _lock:
+            interaction_matrix = _interaction_matrix
+    if interaction_matrix is not None:
+        with interaction_matrix._lock:
+            interaction_matrix.apply_delta(user_id, meal_id, score)
+            update_log.record("interaction", int(user_id), int(meal_id), float(score))
+
+
+def reset_interaction_matrix():
+    """
+    Drops the shared matrix so the next call to `get_interaction_matrix` rebuilds it.
+    """
+    global _interaction_matrix
+    with _lock:
+        _interaction_matrix = None
@@ -0,0 +1,227 @@
+import heapq
+import json
+import threading
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.recent_activity import RecentActivity
+from app.models.user import User
+from app.services.recommender.update_log import update_log
+
+
+class PopularityCounts:
+    """
+    Materialised like counts per meal: across all users, and per disease cohort (users sharing the exact
+    same `disease` text). Built from one aggregate query and then kept current with like/unlike deltas,
+    so the ranker reads counts for its candidates without scanning the activity table.
+    """
+
+    def __init__(self, global_counts=None, cohort_counts=None):
+        self.global_counts = dict(global_counts or {})
+        self.cohort_counts = {disease: dict(counts) for disease, counts in (cohort_counts or {}).items()}
+        self._cohort_top = {}  # disease -> cached most liked meal ids, dropped when the cohort changes
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_db(cls, db: Session):
+        """
+        Counts liked activity rows grouped by meal and the liking user's disease, in one query.
+        """
+        rows = db.query(RecentActivity.meal_id, User.disease, func.count()).join(
+            User, User.user_id == RecentActivity.user_id
+        ).filter(
+            RecentActivity.liked == True,
+            RecentActivity.meal_id.isnot(None),
+        ).group_by(RecentActivity.meal_id, User.disease).all()
+
+        popularity = cls()
+        for meal_id, disease, count in rows:
+            popularity._add(meal_id, disease, count)
+        return popularity
+
+    def save(self, path):
+        """
+        Writes the counts as JSON (cohort keys are disease strings; None is kept as null).
+        """
+        with self._lock:
+            data = {
+                "global": list(self.global_counts.items()),
+                "cohorts": [[disease, list(counts.items())] for disease, counts in self.cohort_counts.items()],
+            }
+        with open(path, "w") as counts_file:
+            json.dump(data, counts_file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as counts_file:
+            data = json.load(counts_file)
+        return cls(dict(data["global"]), {disease: dict(counts) for disease, counts in data["cohorts"]})
+
+    def meal_likes(self, meal_ids) -> np.ndarray:
+        """
+        Global like counts for `meal_ids`, in order.
+        """
+        counts = self.global_counts
+        return np.array([counts.get(int(meal_id), 0) for meal_id in meal_ids], dtype=np.float64)
+
+    def cohort_likes(self, disease, meal_ids) -> np.ndarray:
+        """
+        Like counts for `meal_ids` among users with this disease history, in order.
+        """
+        counts = self.cohort_counts.get(disease, {})
+        return np.array([counts.get(int(meal_id), 0) for meal_id in meal_ids], dtype=np.float64)
+
+    def cohort_top(self, disease, n=5):
+        """
+        The `n` meals most liked by the cohort, most liked first (ties: lowest meal id first).
+        """
+        with self._lock:
+            top = self._cohort_top.get(disease)
+            if top is None or len(top) < n:
+                counts = self.cohort_counts.get(disease, {})
+                top = [meal_id for meal_id, _ in heapq.nsmallest(n, counts.items(), key=lambda item: (-item[1], item[0]))]
+                self._cohort_top[disease] = top
+            return top[:n]
+
+    def apply_like_delta(self, meal_id, disease, delta):
+        """
+        Adds `delta` (+1 for a new like, -1 for an unlike) to the meal's global and cohort counts.
+        """
+        if meal_id is None or not delta:
+            return
+        with self._lock:
+            self._add(int(meal_id), disease, delta)
+
+    def set_counts(self, meal_id, disease, global_count, cohort_count):
+        """
+        Overwrites the meal's global and cohort counts, e.g. when replaying an update log entry.
+        """
+        with self._lock:
+            meal_id = int(meal_id)
+            add_count(self.global_counts, meal_id, global_count - self.global_counts.get(meal_id, 0))
+            cohort = self.cohort_counts.setdefault(disease, {})
+            add_count(cohort, meal_id, cohort_count - cohort.get(meal_id, 0))
+            self._cohort_top.pop(disease, None)
+
+    def counts(self, meal_id, disease):
+        """
+        (global count, cohort count) of one meal.
+        """
+        return self.global_counts.get(meal_id, 0), self.cohort_counts.get(disease, {}).get(meal_id, 0)
+
+    def move_like(self, meal_id, old_disease, new_disease):
+        """
+        Moves one like between cohorts (the liking user's disease changed); the global count is unchanged.
+        """
+        with self._lock:
+            self._add_to_cohort(int(meal_id), old_disease, -1)
+            self._add_to_cohort(int(meal_id), new_disease, 1)
+
+    def _add(self, meal_id, disease, delta):
+        add_count(self.global_counts, meal_id, delta)
+        self._add_to_cohort(meal_id, disease, delta)
+
+    def _add_to_cohort(self, meal_id, disease, delta):
+        add_count(self.cohort_counts.setdefault(disease, {}), meal_id, delta)
+        self._cohort_top.pop(disease, None)
+
+
+def add_count(counts, meal_id, delta):
+    """
+    Adds `delta` to a sparse count dict, dropping entries that reach zero.
+    """
+    count = counts.get(meal_id, 0) + delta
+    if count > 0:
+        counts[meal_id] = count
+    else:
+        counts.pop(meal_id, None)
+
+
+_popularity = None
+_lock = threading.Lock()
+_delta_lock = threading.Lock()  # Orders assignments of `_popularity` against deltas that found none
+_missed_deltas = 0  # Like deltas published while there were no counts to patch
+BUILD_ATTEMPTS = 5
+
+
+def get_popularity_counts(db: Session) -> PopularityCounts:
+    """
+    Returns the shared popularity counts, building them from the database on first use.
+
+    Deltas are relative, so one published while the build query runs may or may not be counted by it;
+    the build is queried again until no delta was missed (at most BUILD_ATTEMPTS times).
+    """
+    global _popularity
+    if _popularity is None:
+        with _lock:
+            attempts = 0
+            while _popularity is None:
+                attempts += 1
+                with _delta_lock:
+                    missed = _missed_deltas
+                counts = PopularityCounts.from_db(db)
+                with _delta_lock:
+                    if _missed_deltas == missed:
+                        _popularity = counts
+                    elif attempts >= BUILD_ATTEMPTS:
+                        print("Error building popularity counts: likes kept changing during the build")
+                        _popularity = counts
+    return _popularity
+
+
+def _published_counts():
+    """
+    The shared counts for a delta to patch, or None (noting the missed delta for a build in flight).
+    """
+    global _missed_deltas
+    popularity = _popularity
+    if popularity is None:
+        with _delta_lock:
+            popularity = _popularity
+            if popularity is None:
+                _missed_deltas += 1
+    return popularity
+
+
+def apply_like_delta(meal_id, disease, was_liked, liked):
+    """
+    Publishes a like/unlike by a user with `disease` to the shared counts.
+    If the counts have not been built yet there is nothing to patch: the next build reads the committed row.
+    """
+    if meal_id is None or bool(liked) == bool(was_liked):
+        return
+    popularity = _published_counts()
+    if popularity is not None:
+        with popularity._lock:
+            popularity.apply_like_delta(meal_id, disease, int(bool(liked)) - int(bool(was_liked)))
+            update_log.record("likes", int(meal_id), disease, *popularity.counts(int(meal_id), disease))
+
+
+def move_user_cohort(db: Session, user_id, old_disease, new_disease):
+    """
+    Moves a user's likes from their old disease cohort to the new one after a profile update.
+    """
+    if old_disease == new_disease:
+        return
+    popularity = _published_counts()
+    if popularity is None:
+        return
+    liked_meal_ids = [meal_id for meal_id, in db.query(RecentActivity.meal_id).filter(
+        RecentActivity.user_id == user_id,
+        RecentActivity.liked == True,
+        RecentActivity.meal_id.isnot(None),
+    ).all()]
+    for meal_id in liked_meal_ids:
+        with popularity._lock:
+            popularity.move_like(meal_id, old_disease, new_disease)
+            for disease in (old_disease, new_disease):
+                update_log.record("likes", int(meal_id), disease, *popularity.counts(int(meal_id), disease))
+
+
+def reset_popularity_counts():
+    """
+    Drops the shared counts so the next call to `get_popularity_counts` rebuilds them.
+    """
+    global _popularity
+    with _lock:
+        _popularity = None
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.user import User
+from app.services.recommender.content_model import ContentModel, get_content_model
+
+
+def user_profile_text(diet, disease) -> str:
+    """
+    Profile text a user is matched on: their recommended diet and parsed diseases, lowercased.
+    """
+    return ((diet or "") + " " + (disease or "")).lower()
+
+
+def profile_hash(profile_text: str) -> str:
+    return hashlib.sha256(profile_text.encode("utf-8")).hexdigest()
+
+
+class UserProfileCache:
+    """
+    LRU cache of users' TF-IDF profile vectors keyed by user_id.
+
+    Each entry remembers the profile hash and the content model fingerprint it was computed for,
+    so a changed profile or a refitted model is recomputed even without an explicit invalidation.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_vector(self, model: ContentModel, user_id, profile_text):
+        key = (profile_hash(profile_text), model.fingerprint)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        vector = model.transform([profile_text])
+        with self._lock:
+            self._entries[user_id] = (key, vector)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vector
+
+    def get_vectors(self, model: ContentModel, profiles):
+        """
+        Vectors for several `(user_id, profile_text)` pairs, stacked as rows of one sparse matrix.
+        Misses are transformed together in a single `transform` call.
+        """
+        vectors = [None] * len(profiles)
+        missing = []
+        with self._lock:
+            for i, (user_id, profile_text) in enumerate(profiles):
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] == (profile_hash(profile_text), model.fingerprint):
+                    self._entries.move_to_end(user_id)
+                    vectors[i] = entry[1]
+                else:
+                    missing.append(i)
+
+        if missing:
+            transformed = model.transform([profiles[i][1] for i in missing])
+            with self._lock:
+                for row, i in enumerate(missing):
+                    user_id, profile_text = profiles[i]
+                    vectors[i] = transformed[row]
+                    self._entries[user_id] = ((profile_hash(profile_text), model.fingerprint), vectors[i])
+                    self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return sparse.vstack(vectors).tocsr()
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+profile_cache = UserProfileCache(settings.USER_PROFILE_CACHE_SIZE)
+
+
+def get_user_profile_vector(model: ContentModel, user_id, profile_text):
+    """
+    Cached TF-IDF vector for the user's profile text.
+    """
+    return profile_cache.get_vector(model, user_id, profile_text)
+
+
+def get_user_profile_vectors(model: ContentModel, profiles):
+    """
+    Cached TF-IDF vectors for several `(user_id, profile_text)` pairs, as rows of one sparse matrix.
+    """
+    return profile_cache.get_vectors(model, profiles)
+
+
+def invalidate_user_profile(user_id):
+    """
+    Drops the cached profile vector, e.g. after the user's diseases or diet were updated.
+    """
+    profile_cache.invalidate(user_id)
+
+
+def score_all_users(db: Session, user_ids=None):
+    """
+    Content affinity of users against every meal, for batch refresh jobs.
+
+    Projects all user profiles in one `transform` call and scores them with a single sparse
+    matrix multiply. Returns (user_ids, meal_ids, affinity) where `affinity` is a sparse
+    users×meals CSR matrix of cosine similarities. `user_ids` limits scoring to those users.
+    """
+    model = get_content_model(db)
+    query = db.query(User.user_id, User.diet, User.disease)
+    if user_ids is not None:
+        query = query.filter(User.user_id.in_([int(user_id) for user_id in user_ids]))
+    rows = sorted(query.all(), key=lambda row: row.user_id)
+
+    scored_user_ids = np.array([row.user_id for row in rows], dtype=np.int64)
+    if not rows:
+        return scored_user_ids, model.meal_ids, sparse.csr_matrix((0, len(model.meal_ids)))
+
+    profiles = model.transform([user_profile_text(row.diet, row.disease) for row in rows])
+    affinity = (profiles @ model.meal_vectors.T).tocsr()
+    return scored_user_ids, model.meal_ids, affinity
@@ -0,0 +1,224 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.models.user import User
+from app.services.recommendations import store_recommendations_batch
+from app.services.recommender.workers import recommend_batch
+
+
+class RefreshScheduler:
+    """
+    Debounced, coalesced refresh of stored recommendations after interactions.
+
+    Interactions mark users (or a whole disease cohort) dirty instead of recomputing recommendations on the
+    request. A mark is due `window` seconds after it is first made; marking a user or cohort that is already
+    pending only moves its due time earlier, so a burst of interactions from one cohort costs one recompute
+    per member. A background thread refreshes due users in batches of `batch_size`, with at most `workers`
+    batches running at once, each on its own session. A batch is computed with one
+    `hybrid_recommendation_batch` call and stored with one bulk insert.
+
+    Cohorts are resolved to user ids when they fall due, with one query for all due cohorts.
+    """
+
+    def __init__(self, session_factory, window=None, batch_size=None, workers=None):
+        self.session_factory = session_factory
+        self.window = settings.RECOMMENDATION_REFRESH_WINDOW_SECONDS if window is None else window
+        self.batch_size = batch_size or settings.RECOMMENDATION_REFRESH_BATCH_SIZE
+        self.workers = workers or settings.RECOMMENDATION_REFRESH_WORKERS
+
+        # key -> [due, first marked]; keys are user ids and disease strings respectively
+        self._users = {}
+        self._cohorts = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._executor = None
+
+        self.marked = 0  # Marks received, including coalesced ones
+        self.coalesced = 0  # Marks absorbed by an entry that was already pending
+        self.refreshed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_lag = 0.0  # Seconds from first mark to refreshed, for the most recent user
+        self.max_lag = 0.0
+
+    def mark_users(self, user_ids, delay=None):
+        """
+        Schedules a refresh of the given users' recommendations `delay` seconds from now (default: the window).
+        """
+        with self._condition:
+            for user_id in user_ids:
+                self._mark(self._users, user_id, delay)
+            self._condition.notify()
+
+    def mark_cohort(self, disease, delay=None):
+        """
+        Schedules a refresh for every user with this disease history.
+        """
+        if disease is None:
+            return
+        with self._condition:
+            self._mark(self._cohorts, disease, delay)
+            self._condition.notify()
+
+    def _mark(self, pending, key, delay):
+        now = time.monotonic()
+        due = now + (self.window if delay is None else delay)
+        self.marked += 1
+        entry = pending.get(key)
+        if entry is None:
+            pending[key] = [due, now]
+        else:
+            self.coalesced += 1
+            entry[0] = min(entry[0], due)
+
+    def _take_due(self, now):
+        with self._condition:
+            users = {key: entry[1] for key, entry in self._users.items() if entry[0] <= now}
+            cohorts = {key: entry[1] for key, entry in self._cohorts.items() if entry[0] <= now}
+            for key in users:
+                del self._users[key]
+            for key in cohorts:
+                del self._cohorts[key]
+        return users, cohorts
+
+    def run_pending(self, now=None):
+        """
+        Refreshes every user whose mark is due; returns how many were refreshed.
+        """
+        users, cohorts = self._take_due(time.monotonic() if now is None else now)
+        if cohorts:
+            db = self.session_factory()
+            try:
+                members = db.query(User.user_id, User.disease).filter(User.disease.in_(list(cohorts))).all()
+            finally:
+                db.close()
+            for user_id, disease in members:
+                users[user_id] = min(users.get(user_id, cohorts[disease]), cohorts[disease])
+        if not users:
+            return 0
+
+        user_ids = sorted(users)
+        batches = [user_ids[i:i + self.batch_size] for i in range(0, len(user_ids), self.batch_size)]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refresh")
+        refreshed = sum(self._executor.map(lambda batch: self._refresh_batch(batch, users), batches))
+        with self._condition:
+            self.batches += len(batches)
+        return refreshed
+
+    def _refresh_batch(self, user_ids, marked_at):
+        db = self.session_factory()
+        try:
+            recommendations = recommend_batch(db, user_ids)
+            store_recommendations_batch(db, recommendations)
+        except Exception as e:
+            db.rollback()
+            with self._condition:
+                self.failed += len(user_ids)
+            print(f"Error updating recommendations for users {user_ids}: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+        refreshed = [user_id for user_id in user_ids if isinstance(recommendations.get(user_id), list)]
+        now = time.monotonic()
+        with self._condition:
+            self.refreshed += len(refreshed)
+            self.failed += len(user_ids) - len(refreshed)
+            for user_id in refreshed:
+                lag = now - marked_at[user_id]
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+        return len(refreshed)
+
+    def metrics(self):
+        """
+        Queue depth, refresh lag and counters, for monitoring.
+        """
+        now = time.monotonic()
+        with self._condition:
+            first_marks = [entry[1] for entry in self._users.values()] + [entry[1] for entry in self._cohorts.values()]
+            return {
+                "queue_depth": len(self._users) + len(self._cohorts),
+                "pending_users": len(self._users),
+                "pending_cohorts": len(self._cohorts),
+                "oldest_pending_seconds": now - min(first_marks) if first_marks else 0.0,
+                "marked": self.marked,
+                "coalesced": self.coalesced,
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_refresh_lag_seconds": self.last_lag,
+                "max_refresh_lag_seconds": self.max_lag,
+            }
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="recommendation-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _next_due(self):
+        dues = [entry[0] for entry in self._users.values()] + [entry[0] for entry in self._cohorts.values()]
+        return min(dues) if dues else None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    next_due = self._next_due()
+                    if next_due is not None and next_due <= time.monotonic():
+                        break
+                    self._condition.wait(None if next_due is None else next_due - time.monotonic())
+                if self._stopping:
+                    return
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"Error refreshing recommendations: {str(e)}")
+
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+def get_refresh_scheduler() -> RefreshScheduler:
+    """
+    The shared scheduler, started on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                from app.core.database import SessionLocal
+
+                scheduler = RefreshScheduler(SessionLocal)
+                scheduler.start()
+                _scheduler = scheduler
+    return _scheduler
+
+
+def stop_refresh_scheduler():
+    """
+    Stops the background thread; pending marks are dropped. Called when the application shuts down.
+    """
+    global _scheduler
+    with _lock:
+        if _scheduler is not None:
+            _scheduler.stop()
+            _scheduler = None
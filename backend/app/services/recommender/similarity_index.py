@@ -0,0 +1,284 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.services.recommender import artifacts
+from app.services.recommender.interaction_matrix import InteractionMatrix, get_interaction_matrix
+
+INDEX_DIR_NAME = "item_similarity"
+METRICS = ("pearson", "cosine")
+
+
+class ItemSimilarityIndex:
+    """
+    Precomputed top-K most similar meals for every meal.
+
+    Stored as three flat arrays so the index can be saved with NumPy and memory-mapped at startup:
+    `meal_ids` (M,) sorted, `neighbours` (M, K) neighbour meal ids padded with -1,
+    and `scores` (M, K) float32 similarities in descending order.
+    `path` is the published version directory the index was saved to or loaded from, if any.
+    """
+
+    def __init__(self, meal_ids, neighbours, scores, metric="pearson", path=None):
+        self.meal_ids = meal_ids
+        self.neighbours = neighbours
+        self.scores = scores
+        self.metric = metric
+        self.path = path
+        self._neighbour_matrix = None
+
+    @property
+    def k(self) -> int:
+        return self.neighbours.shape[1]
+
+    @classmethod
+    def build(cls, interactions: InteractionMatrix, k=50, metric="pearson"):
+        """
+        Computes top-K neighbour lists from the user×meal interaction matrix.
+
+        Similarity is computed only for meal pairs that share at least one user (the non-zeros of XᵀX):
+        every other pair has zero cosine similarity and negative Pearson correlation, so it can never
+        contribute to item-based scores.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown similarity metric '{metric}'. Choose from {', '.join(METRICS)}.")
+
+        interactions = interactions.snapshot()  # Ids and matrix from the same point in time
+        matrix = interactions.matrix.tocsc()
+        order = np.argsort(interactions.meal_ids, kind="stable")
+        matrix = matrix[:, order]
+        meal_ids = interactions.meal_ids[order]
+        n_users, n_meals = matrix.shape
+
+        col_sums = np.asarray(matrix.sum(axis=0), dtype=np.float64).ravel()
+        col_sq_sums = np.asarray(matrix.multiply(matrix).sum(axis=0), dtype=np.float64).ravel()
+        if metric == "pearson":
+            # Pearson over all users, zeros included, matching a filled pivot table
+            norms = np.sqrt(np.clip(col_sq_sums - col_sums ** 2 / max(n_users, 1), 0, None))
+        else:
+            norms = np.sqrt(col_sq_sums)
+
+        co_occurrence = (matrix.T @ matrix).tocsr()
+        co_occurrence.sort_indices()
+
+        neighbours = np.full((n_meals, k), -1, dtype=np.int64)
+        scores = np.zeros((n_meals, k), dtype=np.float32)
+
+        for i in range(n_meals):
+            start, end = co_occurrence.indptr[i], co_occurrence.indptr[i + 1]
+            cols = co_occurrence.indices[start:end]
+            dots = co_occurrence.data[start:end]
+
+            keep = cols != i  # Skip the meal itself
+            cols, dots = cols[keep], dots[keep]
+            if metric == "pearson":
+                dots = dots - col_sums[i] * col_sums[cols] / n_users
+            denom = norms[i] * norms[cols]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                similarity = np.where(denom > 0, dots / denom, 0.0)
+
+            if len(similarity) > k:
+                top = np.argpartition(-similarity, k - 1)[:k]
+                cols, similarity = cols[top], similarity[top]
+            ranked = np.argsort(-similarity, kind="stable")
+            count = len(ranked)
+            neighbours[i, :count] = meal_ids[cols[ranked]]
+            scores[i, :count] = similarity[ranked]
+
+        return cls(meal_ids, neighbours, scores, metric)
+
+    def save(self, path):
+        """
+        Writes the index as .npy files plus a small metadata file into `path`.
+        Use `publish` to replace a saved index that other processes may be reading.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "meal_ids.npy"), np.asarray(self.meal_ids))
+        np.save(os.path.join(path, "neighbours.npy"), np.asarray(self.neighbours))
+        np.save(os.path.join(path, "scores.npy"), np.asarray(self.scores))
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump({"metric": self.metric, "k": self.k, "meals": len(self.meal_ids)}, meta_file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a saved index; with `mmap=True` the arrays are memory-mapped read-only instead of read into memory.
+        """
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        return cls(
+            np.load(os.path.join(path, "meal_ids.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "neighbours.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, "scores.npy"), mmap_mode=mmap_mode),
+            meta["metric"],
+            path,
+        )
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the metric and the index arrays; identical builds get the same version name.
+        """
+        digest = hashlib.sha256(self.metric.encode("utf-8"))
+        for array in (self.meal_ids, self.neighbours, self.scores):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def publish(self, root):
+        """
+        Saves the index as a new immutable version under `root` and makes it the current one; files of
+        earlier versions, which readers may have memory-mapped, are left untouched.
+        """
+        self.path = artifacts.publish(root, self.fingerprint()[:16], self.save)
+        return self.path
+
+    def score_meals(self, meal_ids, exclude=None):
+        """
+        Item-based scores for a user who interacted with `meal_ids`: the sum of positive similarities
+        from each of those meals to its neighbours. Meals in `exclude` are left out.
+        Returns (candidate meal ids, scores), with candidates in ascending id order.
+        """
+        meal_ids = np.asarray(meal_ids, dtype=np.int64)
+        if len(self.meal_ids) == 0 or len(meal_ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        # Meals unknown to the index (added after the last build) are skipped
+        rows = np.clip(np.searchsorted(self.meal_ids, meal_ids), 0, len(self.meal_ids) - 1)
+        rows = rows[self.meal_ids[rows] == meal_ids]
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        # ✅ Gather the neighbour lists of the user's meals and sum scores per neighbour
+        neighbours = np.asarray(self.neighbours[rows]).ravel()
+        scores = np.asarray(self.scores[rows], dtype=np.float64).ravel()
+        keep = (neighbours >= 0) & (scores > 0)
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(neighbours, np.asarray(exclude, dtype=np.int64))
+        neighbours, scores = neighbours[keep], scores[keep]
+
+        candidates, positions = np.unique(neighbours, return_inverse=True)
+        return candidates, np.bincount(positions, weights=scores, minlength=len(candidates))
+
+    def neighbour_matrix(self) -> sparse.csr_matrix:
+        """
+        The positive neighbour lists as a sparse meal×meal matrix (rows and columns aligned with `meal_ids`),
+        built on first use.
+        """
+        if self._neighbour_matrix is None:
+            neighbours = np.asarray(self.neighbours)
+            scores = np.asarray(self.scores, dtype=np.float64)
+            keep = (neighbours >= 0) & (scores > 0)
+            rows = np.nonzero(keep)[0]
+            cols = np.searchsorted(self.meal_ids, neighbours[keep])
+            self._neighbour_matrix = sparse.csr_matrix(
+                (scores[keep], (rows, cols)), shape=(len(self.meal_ids), len(self.meal_ids)),
+            )
+        return self._neighbour_matrix
+
+    def score_meals_batch(self, meal_id_lists):
+        """
+        `score_meals` for several users at once, each excluding their own meals: one sparse matrix-matrix
+        product of the users' meal indicator rows with the neighbour matrix.
+        Returns a list of (candidate meal ids, scores), one per entry of `meal_id_lists`.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        if len(self.meal_ids) == 0 or not meal_id_lists:
+            return [empty for _ in meal_id_lists]
+
+        # Meals unknown to the index (added after the last build) are skipped
+        row_ids, cols = [], []
+        for i, meal_ids in enumerate(meal_id_lists):
+            meal_ids = np.asarray(meal_ids, dtype=np.int64)
+            positions = np.clip(np.searchsorted(self.meal_ids, meal_ids), 0, len(self.meal_ids) - 1)
+            positions = positions[self.meal_ids[positions] == meal_ids]
+            row_ids.append(np.full(len(positions), i, dtype=np.int64))
+            cols.append(positions)
+        row_ids, cols = np.concatenate(row_ids), np.concatenate(cols)
+        users = sparse.csr_matrix(
+            (np.ones(len(cols)), (row_ids, cols)), shape=(len(meal_id_lists), len(self.meal_ids)),
+        )
+
+        scored = (users @ self.neighbour_matrix()).tocsr()
+        scored.sort_indices()
+        results = []
+        for i, meal_ids in enumerate(meal_id_lists):
+            start, end = scored.indptr[i], scored.indptr[i + 1]
+            candidates = self.meal_ids[scored.indices[start:end]]
+            scores = scored.data[start:end]
+            keep = ~np.isin(candidates, np.asarray(meal_ids, dtype=np.int64))
+            results.append((np.asarray(candidates[keep], dtype=np.int64), scores[keep]))
+        return results
+
+
+def index_path() -> str:
+    return os.path.join(settings.ARTIFACTS_DIR, INDEX_DIR_NAME)
+
+
+_item_similarity_index = None
+_lock = threading.Lock()
+
+
+def load_item_similarity_index(path=None):
+    """
+    Memory-maps a saved index: the version directory `path`, or the currently published one.
+    Called at application startup and by worker processes.
+    """
+    global _item_similarity_index
+    path = path or artifacts.current_version_path(index_path())
+    if path is not None and (_item_similarity_index is None or _item_similarity_index.path != path):
+        with _lock:
+            _item_similarity_index = ItemSimilarityIndex.load(path)
+    return _item_similarity_index
+
+
+def get_item_similarity_index(db: Session) -> ItemSimilarityIndex:
+    """
+    Returns the shared index, building and saving it from the interaction matrix if no artifact exists yet.
+    """
+    global _item_similarity_index
+    if _item_similarity_index is None:
+        with _lock:
+            if _item_similarity_index is None:
+                index = ItemSimilarityIndex.build(
+                    get_interaction_matrix(db),
+                    k=settings.ITEM_SIMILARITY_TOP_K,
+                    metric=settings.ITEM_SIMILARITY_METRIC,
+                )
+                try:
+                    index.publish(index_path())
+                except OSError as e:
+                    print(f"Could not save item similarity index: {str(e)}")
+                _item_similarity_index = index
+    return _item_similarity_index
+
+
+def main():
+    """
+    Batch job: rebuilds the item similarity index from the database and saves it.
+
+    Usage: python -m app.services.recommender.similarity_index [--k 50] [--metric pearson|cosine]
+    """
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Build the item-item similarity index.")
+    parser.add_argument("--k", type=int, default=settings.ITEM_SIMILARITY_TOP_K)
+    parser.add_argument("--metric", choices=METRICS, default=settings.ITEM_SIMILARITY_METRIC)
+    parser.add_argument("--output", default=index_path())
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        index = ItemSimilarityIndex.build(InteractionMatrix.from_db(db), k=args.k, metric=args.metric)
+    finally:
+        db.close()
+    index.publish(args.output)
+    print(f"Saved {args.metric} similarity index for {len(index.meal_ids)} meals (k={index.k}) to {index.path}")
+
+
+if __name__ == "__main__":
+    main()
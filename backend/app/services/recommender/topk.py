@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def top_k(scores, k, exclude=None) -> np.ndarray:
+    """
+    Positions of the `k` highest scores, highest first.
+
+    Uses `argpartition` (O(n)) and only sorts the selected `k`. Ties are broken by position, lowest
+    first, so the result matches a stable descending sort. `exclude` is an optional boolean mask of
+    positions that must not be returned (e.g. meals the user already interacted with). NaN scores rank last.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    positions = np.arange(len(scores))
+    if exclude is not None:
+        positions = positions[~np.asarray(exclude, dtype=bool)]
+    values = np.nan_to_num(scores[positions], nan=-np.inf)
+
+    k = min(int(k), len(values))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k < len(values):
+        # Everything strictly above the k-th value is in; fill the rest with the lowest-positioned ties
+        kth = -np.partition(-values, k - 1)[k - 1]
+        above = np.flatnonzero(values > kth)
+        ties = np.flatnonzero(values == kth)[:k - len(above)]
+        selected = np.concatenate([above, ties])
+    else:
+        selected = np.arange(len(values))
+
+    order = np.lexsort((selected, -values[selected]))
+    return positions[selected[order]]
@@ -0,0 +1,37 @@
+import threading
+
+
+class UpdateLog:
+    """
+    Ordered record of in-place updates to the shared interaction matrix and popularity counts since the
+    last snapshot handed to recommendation worker processes (see `workers`).
+
+    Entries hold resulting values rather than increments, so replaying an entry a worker's snapshot already
+    contains is harmless:
+    ("interaction", user_id, meal_id, score) and ("likes", meal_id, disease, global_count, cohort_count).
+    Nothing is recorded while `enabled` is False, i.e. when no worker pool is running.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, *entry):
+        if self.enabled:
+            with self._lock:
+                self._entries.append(entry)
+
+    def entries(self):
+        with self._lock:
+            return tuple(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+
+update_log = UpdateLog()
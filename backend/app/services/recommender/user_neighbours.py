@@ -0,0 +1,177 @@
+import threading
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.services.recommender.interaction_matrix import (
+    InteractionMatrix, InteractionSnapshot, get_interaction_matrix,
+)
+from app.services.recommender.topk import top_k
+
+METRICS = ("pearson", "cosine")
+
+
+class RandomProjectionLSH:
+    """
+    Pure-NumPy random-projection (SimHash) index over user rows of the interaction matrix.
+
+    Each of `n_tables` tables hashes a user to the sign pattern of `n_bits` random projections of their
+    (mean-centred, for Pearson) score vector. Users sharing a bucket with the query in any table are
+    candidates; the engine then scores only those exactly.
+    """
+
+    def __init__(self, interactions: InteractionMatrix, n_tables=32, n_bits=8, metric="pearson", seed=42):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.metric = metric
+        interactions = interactions.snapshot()
+        self.n_users = len(interactions.user_ids)
+
+        rng = np.random.default_rng(seed)
+        n_meals = interactions.shape[1]
+        self.projections = rng.standard_normal((n_meals, n_tables * n_bits)).astype(np.float32)
+
+        keys = self._hash(interactions.dot(self.projections), interactions.row_sums / max(n_meals, 1))
+
+        # ✅ One sorted key array per table: a bucket lookup is a pair of binary searches
+        self.order = np.argsort(keys, axis=0, kind="stable")
+        self.sorted_keys = np.take_along_axis(keys, self.order, axis=0)
+
+    def _hash(self, projected, means) -> np.ndarray:
+        projected = np.asarray(projected, dtype=np.float32)
+        if self.metric == "pearson":
+            # Projection of the mean-centred rows, without densifying them: (x - μ)·r = x·r - μ·Σr
+            projected -= np.outer(means, self.projections.sum(axis=0)).astype(np.float32)
+        bits = (projected > 0).reshape(len(means), self.n_tables, self.n_bits)
+        return bits.astype(np.int64) @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def candidates(self, interactions: InteractionSnapshot, row) -> np.ndarray:
+        """
+        Rows that share a bucket with `row` in at least one table.
+        """
+        means = interactions.row_sums[row:row + 1] / max(interactions.shape[1], 1)
+        query = interactions.rows([row])[:, :len(self.projections)]  # Meals added after the build are not hashed
+        query_keys = self._hash(query @ self.projections, means)[0]
+        found = []
+        for table, key in enumerate(query_keys):
+            start = np.searchsorted(self.sorted_keys[:, table], key, side="left")
+            end = np.searchsorted(self.sorted_keys[:, table], key, side="right")
+            found.append(self.order[start:end, table])
+        return np.unique(np.concatenate(found))
+
+
+class UserNeighbourEngine:
+    """
+    Finds a user's most similar users without materialising the user×user similarity matrix.
+
+    Exact mode computes Pearson (or cosine) similarity of one user against every other user with a
+    single sparse mat-vec, using the per-user sums kept by the interaction matrix to mean-centre and
+    normalise on the fly. With an LSH index attached, only the LSH candidates are scored.
+    """
+
+    def __init__(self, interactions: InteractionMatrix, metric="pearson", lsh: RandomProjectionLSH = None):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown similarity metric '{metric}'. Choose from {', '.join(METRICS)}.")
+        self.interactions = interactions
+        self.metric = metric
+        self.lsh = lsh
+
+    def similarities(self, user_id, rows=None, interactions: InteractionSnapshot = None) -> np.ndarray:
+        """
+        Similarity between `user_id` and each user row in `rows` (all rows by default), read from
+        `interactions` (a fresh snapshot by default).
+        """
+        if interactions is None:
+            interactions = self.interactions.snapshot()
+        row = interactions.row_of(user_id)
+        query = interactions.rows([row]).T
+        if rows is None:
+            dots = interactions.dot(query).ravel()
+        else:
+            dots = np.asarray((interactions.rows(rows) @ query).toarray(), dtype=np.float64).ravel()
+
+        if rows is None:
+            rows = slice(None)
+        if self.metric == "pearson":
+            n_meals = max(interactions.shape[1], 1)
+            dots -= interactions.row_sums[row] * interactions.row_sums[rows] / n_meals
+            norms = interactions.user_centred_norms()
+        else:
+            norms = interactions.user_norms()
+        denom = norms[row] * norms[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(denom > 0, dots / denom, 0.0)
+
+    def top_neighbours(self, user_id, n=10):
+        """
+        Returns up to `n` (user_id, similarity) pairs for the most similar other users, most similar first.
+        """
+        interactions = self.interactions.snapshot()  # ✅ One consistent view while users are being added
+        row = interactions.row_of(user_id)
+        if row is None:
+            return []
+
+        rows = None
+        if self.lsh is not None and row < self.lsh.n_users:
+            rows = self.lsh.candidates(interactions, row)
+        similarity = self.similarities(user_id, rows, interactions)
+        rows = np.arange(len(similarity)) if rows is None else rows
+
+        ranked = top_k(similarity, n, exclude=rows == row)  # Exclude self-similarity
+        return [(int(interactions.user_ids[rows[i]]), float(similarity[i])) for i in ranked]
+
+    def top_neighbours_batch(self, user_ids, n=10):
+        """
+        `top_neighbours` for several users: {user_id: neighbours}. In exact mode the similarities of all of
+        them against every user come from one sparse matrix-matrix product; with LSH each user is queried alone.
+        """
+        interactions = self.interactions.snapshot()  # ✅ One consistent view while users are being added
+        known = [int(user_id) for user_id in user_ids if interactions.row_of(user_id) is not None]
+        results = {int(user_id): [] for user_id in user_ids}
+        if not known:
+            return results
+        if self.lsh is not None:
+            results.update({user_id: self.top_neighbours(user_id, n) for user_id in known})
+            return results
+
+        rows = np.array([interactions.row_of(user_id) for user_id in known], dtype=np.int64)
+        dots = interactions.dot(interactions.rows(rows).T).T
+        if self.metric == "pearson":
+            n_meals = max(interactions.shape[1], 1)
+            dots -= np.outer(interactions.row_sums[rows], interactions.row_sums) / n_meals
+            norms = interactions.user_centred_norms()
+        else:
+            norms = interactions.user_norms()
+        denom = np.outer(norms[rows], norms)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            similarity = np.where(denom > 0, dots / denom, 0.0)
+
+        columns = np.arange(similarity.shape[1])
+        for user_id, row, scores in zip(known, rows, similarity):
+            ranked = top_k(scores, n, exclude=columns == row)  # Exclude self-similarity
+            results[user_id] = [(int(interactions.user_ids[i]), float(scores[i])) for i in ranked]
+        return results
+
+
+_engine = None
+_lock = threading.Lock()
+
+
+def get_user_neighbour_engine(db: Session) -> UserNeighbourEngine:
+    """
+    Returns the shared engine for the current interaction matrix.
+    An LSH index is attached once the user count reaches USER_NEIGHBOUR_LSH_MIN_USERS (0 disables LSH).
+    """
+    global _engine
+    interactions = get_interaction_matrix(db)
+    engine = _engine
+    if engine is None or engine.interactions is not interactions:
+        with _lock:
+            if _engine is None or _engine.interactions is not interactions:
+                metric = settings.USER_SIMILARITY_METRIC
+                lsh = None
+                lsh_min_users = settings.USER_NEIGHBOUR_LSH_MIN_USERS
+                if lsh_min_users and len(interactions.user_ids) >= lsh_min_users:
+                    lsh = RandomProjectionLSH(interactions, metric=metric)
+                _engine = UserNeighbourEngine(interactions, metric=metric, lsh=lsh)
+            engine = _engine
+    return engine
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.services.meal_catalog import invalidate_meal_catalog
+from app.services.recommender import interaction_matrix, popularity
+from app.services.recommender.content_model import get_content_model, load_content_model
+from app.services.recommender.hybrid import hybrid_recommendation, hybrid_recommendation_batch
+from app.services.recommender.interaction_matrix import InteractionMatrix, get_interaction_matrix
+from app.services.recommender.popularity import PopularityCounts, get_popularity_counts
+from app.services.recommender.similarity_index import get_item_similarity_index, load_item_similarity_index
+from app.services.recommender.update_log import update_log
+
+SNAPSHOT_DIR_NAME = "worker_snapshots"
+
+
+class RecommendationWorkers:
+    """
+    Pool of worker processes that run `hybrid_recommendation` in parallel, outside the API process's GIL.
+
+    Workers attach read-only to the saved artifacts instead of receiving copies: the item similarity index
+    and the content model are memory-mapped from the immutable version directories this process is using
+    (each job names them, so workers follow a rebuild without ever reading files that are being written),
+    and the interaction matrix and popularity counts from a snapshot the pool writes at start. Each job carries the update log since that snapshot,
+    which the worker replays once, so recent interactions are visible without copying the matrix again.
+    When the log outgrows RECOMMENDER_SNAPSHOT_MAX_UPDATES a fresh snapshot is written and workers move to it;
+    this also bounds how long a worker keeps the private matrix copy that folding in new cells creates.
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.snapshot_dir = None
+        self._executor = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def start(self, db: Session):
+        # Make sure every artifact the workers map exists before they start
+        get_item_similarity_index(db)
+        get_content_model(db)
+        update_log.enabled = True
+        self.snapshot(db)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def snapshot(self, db: Session):
+        """
+        Saves the current interaction matrix and popularity counts to a new snapshot directory and clears
+        the update log. Holding both structures' locks keeps the snapshot and the log consistent.
+        """
+        interactions = get_interaction_matrix(db)
+        counts = get_popularity_counts(db)
+        with self._lock:
+            self._version += 1
+            path = self.snapshot_path(self._version)
+            with interactions._lock, counts._lock:
+                interactions.save(os.path.join(path, "interactions"))
+                counts.save(os.path.join(path, "popularity.json"))
+                update_log.clear()
+            self.snapshot_dir = path
+        # Jobs queued just before this snapshot may still need the previous one; anything older can go
+        # (workers that still map its files keep them until they move on, per POSIX unlink semantics)
+        if self._version > 2:
+            shutil.rmtree(self.snapshot_path(self._version - 2), ignore_errors=True)
+
+    def snapshot_path(self, version):
+        return os.path.join(settings.ARTIFACTS_DIR, SNAPSHOT_DIR_NAME, f"{os.getpid()}-{version}")
+
+    def submit(self, db: Session, user_id, top_n=15, batch=False):
+        """
+        Dispatches one recommendation job; returns a concurrent.futures.Future.
+        With `batch=True`, `user_id` is a list of users computed together by `hybrid_recommendation_batch`.
+        """
+        if len(update_log) > settings.RECOMMENDER_SNAPSHOT_MAX_UPDATES:
+            self.snapshot(db)
+        artifact_dirs = (get_item_similarity_index(db).path, get_content_model(db).path)
+        with self._lock:
+            snapshot_dir, updates = self.snapshot_dir, update_log.entries()
+        return self._executor.submit(run_job, snapshot_dir, artifact_dirs, updates, user_id, top_n, batch)
+
+    def shutdown(self):
+        update_log.enabled = False
+        update_log.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for version in (self._version - 1, self._version):
+            shutil.rmtree(self.snapshot_path(version), ignore_errors=True)
+        self.snapshot_dir = None
+
+
+# Worker process state: current snapshot, artifact version directories, log entries replayed
+_attached = {"snapshot_dir": None, "artifact_dirs": None, "applied": 0}
+
+
+def attach(snapshot_dir):
+    """
+    Points this worker's shared recommender state at a snapshot (memory-mapped, copy-on-write).
+    """
+    interaction_matrix._interaction_matrix = InteractionMatrix.load(os.path.join(snapshot_dir, "interactions"))
+    popularity._popularity = PopularityCounts.load(os.path.join(snapshot_dir, "popularity.json"))
+    _attached["snapshot_dir"] = snapshot_dir
+    _attached["applied"] = 0
+
+
+def attach_artifacts(artifact_dirs):
+    """
+    Memory-maps the similarity index and content model versions the API process is using.
+    Published versions are immutable, so the maps stay valid while newer versions are built.
+    """
+    index_dir, model_dir = artifact_dirs
+    attached = _attached["artifact_dirs"]
+    if attached is not None and attached[1] != model_dir:
+        # ✅ The new model was fitted on a newer catalog than the one cached here: reload both together
+        invalidate_meal_catalog()
+    load_item_similarity_index(index_dir)
+    load_content_model(model_dir)
+    _attached["artifact_dirs"] = artifact_dirs
+
+
+def replay(updates):
+    """
+    Applies the update log entries this worker has not seen yet.
+    """
+    for entry in updates[_attached["applied"]:]:
+        if entry[0] == "interaction":
+            interaction_matrix._interaction_matrix.apply_delta(*entry[1:])
+        elif entry[0] == "likes":
+            popularity._popularity.set_counts(*entry[1:])
+    _attached["applied"] = max(_attached["applied"], len(updates))
+
+
+def run_job(snapshot_dir, artifact_dirs, updates, user_id, top_n, batch=False):
+    """
+    Worker entry point for one recommendation job.
+    """
+    from app.core.database import SessionLocal
+
+    if _attached["artifact_dirs"] != artifact_dirs:
+        attach_artifacts(artifact_dirs)
+    if _attached["snapshot_dir"] != snapshot_dir:
+        attach(snapshot_dir)
+    replay(updates)
+
+    db = SessionLocal()
+    try:
+        if batch:
+            return hybrid_recommendation_batch(db, user_id, top_n)
+        return hybrid_recommendation(db, user_id, top_n)
+    finally:
+        db.close()
+
+
+_workers = None
+_lock = threading.Lock()
+
+
+def start_recommendation_workers(db: Session):
+    """
+    Starts the worker pool if RECOMMENDER_PROCESSES is set. Called at application startup.
+    """
+    global _workers
+    if settings.RECOMMENDER_PROCESSES > 0:
+        with _lock:
+            if _workers is None:
+                workers = RecommendationWorkers(settings.RECOMMENDER_PROCESSES)
+                workers.start(db)
+                _workers = workers
+    return _workers
+
+
+def stop_recommendation_workers():
+    global _workers
+    with _lock:
+        if _workers is not None:
+            _workers.shutdown()
+            _workers = None
+
+
+def recommend(db: Session, user_id, top_n=15):
+    """
+    Hybrid recommendations for one user: on the worker pool when it is running, otherwise in-process.
+    """
+    workers = _workers
+    if workers is None:
+        return hybrid_recommendation(db, user_id, top_n)
+    return workers.submit(db, user_id, top_n).result()
+
+
+def recommend_batch(db: Session, user_ids, top_n=15):
+    """
+    Hybrid recommendations for several users at once, {user_id: recommendations}: as one job on the
+    worker pool when it is running, otherwise in-process.
+    """
+    workers = _workers
+    if workers is None:
+        return hybrid_recommendation_batch(db, user_ids, top_n)
+    return workers.submit(db, list(user_ids), top_n, batch=True).result()
@@ -3,8 +3,10 @@ from app.repositories.user_repository import insert_user, get_user_by_username,
 from app.models.user import User
 import bcrypt
 from app.services.llm_service import LLMService
-from app.models.recommendations import Recommendation
-from app.services.recommender.hybrid import hybrid_recommendation
+from app.services.recommendations import store_recommendations
+from app.services.recommender.workers import recommend
+from app.services.recommender.popularity import move_user_cohort
+from app.services.recommender.profile_vectors import invalidate_user_profile
 
 # Function to hash password
 def hash_password(password: str) -> str:
@@ -44,20 +46,10 @@ def login_user(db: Session, username: str, password: str):
         return {"error": "Invalid credentials"}
 
     # ✅ Automatically generate recommendations on login
-    recommendations = hybrid_recommendation(db, user.user_id, top_n=5)
+    recommendations = recommend(db, user.user_id, top_n=5)
 
-    # ✅ Store recommendations in the database
-    db.query(Recommendation).filter(Recommendation.user_id == user.user_id).delete()  # ✅ Clear old recommendations
-    for rec in recommendations:
-        db_rec = Recommendation(
-            user_id=user.user_id,
-            meal_id=rec.get("meal_id"),
-            exercise_id=rec.get("exercise_id"),
-            recommendation_reason="Generated on login"
-        )
-        db.add(db_rec)
-
-    db.commit()
+    # ✅ Replace the stored recommendations in one transaction (bulk insert)
+    store_recommendations(db, user.user_id, recommendations, reason="Generated on login")
 
     # ✅ Return `user_id` along with success message
     return {
@@ -69,5 +61,10 @@ def login_user(db: Session, username: str, password: str):
 
 # Function to update user details
 def update_user(db: Session, user_id: int, height: float, weight: float, disease: str, diet: str):
-    return update_user_details(db, user_id, height, weight, disease, diet)
+    previous_disease = db.query(User.disease).filter(User.user_id == user_id).scalar()
+    user = update_user_details(db, user_id, height, weight, disease, diet)
+    if user:
+        invalidate_user_profile(user_id)  # ✅ Profile text changed; drop the cached profile vector
+        move_user_cohort(db, user_id, previous_disease, user.disease)  # ✅ Their likes now count for the new cohort
+    return user
 
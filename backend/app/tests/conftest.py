@@ -0,0 +1,116 @@
+import os
+import tempfile
+
+# Throwaway settings so the app modules can be imported without a configured environment
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "")
+os.environ.setdefault("ARTIFACTS_DIR", tempfile.mkdtemp())
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+from app.core.llm_gateway import LLMGateway
+
+
+class StubLLMServer:
+    """
+    A local stand-in for the chat completions API, serving POST /v1/chat/completions on 127.0.0.1 from a
+    background thread. Answers each prompt with `reply(prompt)` (by default the prompt itself) after `delay`
+    seconds, or `delay(prompt)` if it is callable, and fails the first `failures` requests with HTTP 500.
+    Records the prompts received and the peak number of requests in flight.
+    Also used by the benchmarks (benchmarks.fake_llm_server).
+    """
+
+    def __init__(self, delay=0.05, failures=0, reply=None, port=0):
+        self.delay = delay
+        self.failures = failures
+        self.reply = reply or (lambda prompt: prompt)
+        self.prompts = []
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt = body["messages"][-1]["content"]
+                with stub._lock:
+                    stub.requests += 1
+                    stub.prompts.append(prompt)
+                    fail = stub.requests <= stub.failures
+                    stub.in_flight += 1
+                    stub.peak_in_flight = max(stub.peak_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay(prompt) if callable(stub.delay) else stub.delay)
+                    if fail:
+                        self._send(500, {"error": {"message": "stub failure", "type": "server_error"}})
+                    else:
+                        self._send(200, {
+                            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                            "choices": [{
+                                "index": 0, "finish_reason": "stop",
+                                "message": {"role": "assistant", "content": stub.reply(prompt)},
+                            }],
+                        })
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.prompts = []
+            self.requests = 0
+            self.peak_in_flight = self.in_flight
+
+    def gateway(self, **kwargs):
+        client = openai.AsyncOpenAI(api_key="stub", base_url=self.base_url, max_retries=0)
+        return LLMGateway(client=client, model="stub-model", **kwargs)
+
+
+@pytest.fixture
+def llm_stub():
+    """
+    Starts a StubLLMServer per call, `llm_stub(delay=..., failures=..., reply=...)`; all are stopped after the test.
+    """
+    servers = []
+
+    def start(**kwargs):
+        server = StubLLMServer(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import re
+
+import pandas as pd
+import pytest
+from app.core import disease_parsing, llm_gateway, llm_integration
+from app.core.diet_index import DiseaseDietIndex, scan_diets
+from app.core.disease_parsing import (
+    DiseaseParseCache, disease_set_version, match_known_diseases, parse_numbered_diseases,
+)
+
+VALID_DISEASES = {
+    "anemia", "cancer", "diabeties", "goitre", "heart_disease", "hypertension", "kidney_disease", "obesity",
+    "pregnancy", "rickets", "scurvy",
+}
+
+
+def test_local_matcher_resolves_histories_that_only_name_known_diseases():
+    assert match_known_diseases("Diabetes and  hypertension", VALID_DISEASES) == ["diabeties", "hypertension"]
+    assert match_known_diseases("kidney disease, anemia, kidney_disease", VALID_DISEASES) == [
+        "kidney_disease", "anemia",
+    ]
+    assert match_known_diseases("I have chronic heart disease with obesity", VALID_DISEASES) == [
+        "heart_disease", "obesity",
+    ]
+
+
+def test_local_matcher_leaves_free_text_to_the_llm():
+    assert match_known_diseases("no diabetes, but high blood pressure", VALID_DISEASES) is None
+    assert match_known_diseases("type 2 diabetes", VALID_DISEASES) is None
+    assert match_known_diseases("and with", VALID_DISEASES) is None
+    # Spelt like a known disease, but a different condition
+    assert match_known_diseases("hypotension", VALID_DISEASES) is None
+    assert match_known_diseases("I have hypotension", VALID_DISEASES) is None
+
+
+def test_multi_item_replies_are_split_per_history():
+    reply = 'Here you go:\n{"1": ["anemia", "not_a_disease", "anemia"], "2": [], "4": "cancer, obesity"}'
+    assert parse_numbered_diseases(reply, 4, VALID_DISEASES) == [["anemia"], [], None, ["cancer", "obesity"]]
+    assert parse_numbered_diseases("anemia, cancer", 2, VALID_DISEASES) == [None, None]
+
+
+def test_parse_cache_is_keyed_by_normalised_text_and_disease_set(tmp_path):
+    version = disease_set_version(VALID_DISEASES)
+    cache = DiseaseParseCache(max_size=2, path=str(tmp_path / "cache.sqlite3"))
+    cache.put(DiseaseParseCache.key("High blood  pressure", version), ["hypertension"])
+
+    assert cache.get(DiseaseParseCache.key("high blood pressure ", version)) == ["hypertension"]
+    assert cache.get(DiseaseParseCache.key("high blood pressure", disease_set_version({"hypertension"}))) is None
+
+    # The in-memory LRU is bounded; evicted entries are still served from the persisted store
+    cache.put(DiseaseParseCache.key("b", version), [])
+    cache.put(DiseaseParseCache.key("c", version), ["cancer"])
+    assert len(cache) == 2
+    assert cache.get(DiseaseParseCache.key("high blood pressure", version)) == ["hypertension"]
+
+    reopened = DiseaseParseCache(path=str(tmp_path / "cache.sqlite3"))
+    assert reopened.get(DiseaseParseCache.key("c", version)) == ["cancer"]
+    assert reopened.get(DiseaseParseCache.key("b", version)) == []
+
+    # Batches are written with one commit and read back with one query
+    batch = {DiseaseParseCache.key(f"history {i}", version): ["anemia"] * (i % 2) for i in range(600)}
+    cache.put_many(batch)
+    reopened = DiseaseParseCache(max_size=10, path=str(tmp_path / "cache.sqlite3"))
+    assert reopened.get_many(list(batch) + ["unknown"]) == batch
+
+
+def test_diet_index_matches_the_table_scan():
+    meals = pd.DataFrame({
+        "Disease": ["['anemia', 'goitre']", "['heart_disease']", None, "['goitre', 'kidney_disease']"],
+        "Diet": ["['vegan_diet']", "['dash_diet', 'low_fat_diet']", "['paleo_diet']", "['high_protien_diet']"],
+    })
+    index = DiseaseDietIndex(meals)
+
+    assert index.diets["goitre"] == frozenset({"vegan_diet", "high_protien_diet"})
+    for diseases in (["anemia"], ["Goitre", "heart_disease"], ["disease"], ["scurvy"], []):
+        expected = set()
+        for disease in diseases:
+            expected |= scan_diets(meals, disease)
+        assert index.lookup(diseases) == expected
+
+
+@pytest.fixture
+def disease_data(tmp_path, monkeypatch):
+    pd.DataFrame({"Disease": ["anemia goitre", "hypertension", None]}).to_csv(tmp_path / "profiles.csv", index=False)
+    pd.DataFrame({
+        "Disease": ["['anemia']", "['goitre', 'hypertension']"], "Diet": ["['vegan_diet']", "['dash_diet']"],
+    }).to_csv(tmp_path / "meals.csv", index=False)
+    monkeypatch.setattr(llm_integration.settings, "USER_PROFILES_DATA_PATH", str(tmp_path / "profiles.csv"))
+    monkeypatch.setattr(llm_integration.settings, "MEALS_DATA_PATH", str(tmp_path / "meals.csv"))
+    monkeypatch.setattr(llm_integration, "_disease_data", None)
+    monkeypatch.setattr(disease_parsing, "_cache", DiseaseParseCache(path=str(tmp_path / "parses.sqlite3")))
+    return disease_parsing._cache
+
+
+def test_datasets_are_read_on_first_use_and_batches_resolve_locally(disease_data):
+    assert llm_integration.load_disease_data().valid_diseases == {"anemia", "goitre", "hypertension"}
+
+    results = asyncio.run(llm_integration.parse_diseases_and_recommend_diets(
+        ["Anemia and goitre", "", "hypertension", "anemia  and goitre"],
+    ))
+    assert results == [
+        {"diseases": ["anemia", "goitre"], "recommended_diet": "dash_diet, vegan_diet"},
+        {"diseases": [], "recommended_diet": "No diseases detected."},
+        {"diseases": ["hypertension"], "recommended_diet": "dash_diet"},
+        {"diseases": ["anemia", "goitre"], "recommended_diet": "dash_diet, vegan_diet"},
+    ]
+
+
+def stub_reply(prompt):
+    """
+    Answers disease prompts like the model would, except that multi-item replies leave out histories
+    mentioning "skip".
+    """
+    valid = ["anemia", "goitre", "hypertension"]
+    if "numbered medical histories" in prompt:
+        items = re.findall(r"^(\d+)\. (.*)$", prompt.split("\n\n")[1], flags=re.MULTILINE)
+        return json.dumps({number: [d for d in valid if d in history] for number, history in items
+                           if "skip" not in history})
+    history = prompt.split("\n\n")[1]
+    return ", ".join(d for d in valid if d in history)
+
+
+BATCH = [
+    "patient reports anemia", "goitre and hypertension", "skip: known goitre case", "patient reports anemia",
+    "notes mention hypertension", "",
+]
+
+
+def cached(cache, history):
+    return cache.get(DiseaseParseCache.key(history, llm_integration.load_disease_data().valid_diseases_version))
+
+
+def test_unresolved_histories_are_packed_into_multi_item_prompts(disease_data, llm_stub, monkeypatch):
+    monkeypatch.setattr(llm_integration.settings, "LLM_BATCH_ITEMS", 2)
+    stub = llm_stub(delay=0, reply=stub_reply)
+    monkeypatch.setattr(llm_gateway, "_gateway", stub.gateway(timeout=5, max_retries=0))
+    results = asyncio.run(llm_integration.parse_disease_histories(BATCH))
+
+    assert results == [["anemia"], ["goitre", "hypertension"], ["goitre"], ["anemia"], ["hypertension"], []]
+    # Three distinct histories need the LLM: packed two to a prompt, plus one re-ask for the item left out
+    batch_prompts = sorted(prompt for prompt in stub.prompts if "numbered medical histories" in prompt)
+    assert stub.requests == 3 and len(batch_prompts) == 2
+    assert "1. notes mention hypertension\n\n" in batch_prompts[0]
+    assert "1. patient reports anemia\n2. skip: known goitre case\n\n" in batch_prompts[1]
+    for history, diseases in zip(BATCH[:5], results):
+        assert cached(disease_data, history) == diseases
+
+
+def test_failed_batch_prompts_are_not_cached(disease_data, llm_stub, monkeypatch):
+    stub = llm_stub(delay=0, failures=100, reply=stub_reply)
+    monkeypatch.setattr(llm_gateway, "_gateway", stub.gateway(timeout=5, max_retries=0))
+    results = asyncio.run(llm_integration.parse_disease_histories(BATCH))
+
+    assert results == [[], ["goitre", "hypertension"], [], [], [], []]
+    assert stub.requests == 1  # One failed prompt; nothing is re-asked item by item
+    assert cached(disease_data, "goitre and hypertension") == ["goitre", "hypertension"]
+    assert cached(disease_data, "patient reports anemia") is None
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+
+def prompt(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_identical_concurrent_prompts_share_one_call(llm_stub):
+    stub = llm_stub(delay=0.2)
+    gateway = stub.gateway(timeout=5)
+
+    async def burst():
+        return await asyncio.gather(*(gateway.complete(prompt("diabetes")) for _ in range(20)))
+
+    assert asyncio.run(burst()) == ["diabetes"] * 20
+    assert stub.requests == 1
+
+    # Once the call finishes, the same prompt is sent again
+    assert asyncio.run(gateway.complete(prompt("diabetes"))) == "diabetes"
+    assert stub.requests == 2
+
+
+def test_calls_in_flight_are_bounded(llm_stub):
+    stub = llm_stub(delay=0.1)
+    gateway = stub.gateway(timeout=5, max_concurrency=3)
+
+    async def burst():
+        return await asyncio.gather(*(gateway.complete(prompt(f"history {i}")) for i in range(12)))
+
+    assert asyncio.run(burst()) == [f"history {i}" for i in range(12)]
+    assert stub.requests == 12
+    assert stub.peak_in_flight == 3
+
+
+def test_server_errors_are_retried_with_backoff(llm_stub):
+    stub = llm_stub(delay=0, failures=2)
+    gateway = stub.gateway(timeout=5, max_retries=2, backoff=0.01)
+    assert asyncio.run(gateway.complete(prompt("anemia"))) == "anemia"
+    assert stub.requests == 3
+
+    stub = llm_stub(delay=0, failures=5)
+    gateway = stub.gateway(timeout=5, max_retries=1, backoff=0.01)
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(gateway.complete(prompt("anemia")))
+    assert stub.requests == 2
+
+
+def test_each_attempt_is_bounded_by_the_timeout(llm_stub):
+    stub = llm_stub(delay=2.0)
+    gateway = stub.gateway(timeout=0.1, max_retries=1, backoff=0.01)
+    started = time.perf_counter()
+    with pytest.raises((asyncio.TimeoutError, openai.APITimeoutError)):
+        asyncio.run(gateway.complete(prompt("scurvy")))
+    # Both attempts gave up well before one unbounded reply (2 s); the slack absorbs scheduling noise
+    assert time.perf_counter() - started < stub.delay
+    assert stub.requests == 2
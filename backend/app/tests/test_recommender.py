@@ -0,0 +1,783 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.api.v1.endpoints import recommender as recommender_endpoint
+from app.core.database import Base
+from app.models import Meal, RecentActivity, User
+from app.services import meal_catalog
+from app.services.meal_catalog import get_meal_catalog
+from app.services.exercise_service import ExerciseIndex
+from app.services.meal_service import hydrate_meals
+from app.models.recommendations import Recommendation
+from app.services.recommender import (
+    artifacts, content_model, exercise_model, interaction_matrix, popularity, profile_vectors, refresh_scheduler,
+    similarity_index, user_neighbours,
+)
+from app.services.recommender.collaborative import recommend_item_based, recommend_user_based
+from app.services.recommender.hybrid import hybrid_recommendation, hybrid_recommendation_batch
+from app.services.recommender.interaction_matrix import apply_interaction_delta
+from app.services.recommender.popularity import PopularityCounts, apply_like_delta, get_popularity_counts
+from app.services.recommender.refresh_scheduler import RefreshScheduler
+from app.services.recommender.topk import top_k
+from app.repositories.recommendation_repository import get_recent_meal_recommendations
+from app.services import user_service
+from app.services.recommendations import store_recommendations, store_recommendations_batch
+from app.services.recommender import workers as recommender_workers
+from app.services.recommender.content_based import recommend_content_based
+from app.services.recommender.workers import RecommendationWorkers
+
+N_USERS = 30
+N_MEALS = 40
+
+
+def seed(db):
+    for meal_id in range(1, N_MEALS + 1):
+        db.add(Meal(
+            meal_id=meal_id,
+            name=f"meal {meal_id}",
+            veg_non=meal_id % 2 == 0,
+            nutrient="fiber" if meal_id % 3 else "protein",
+            disease="['diabeties', 'hypertension']" if meal_id % 4 else "['anemia']",
+            diet="['low_fat_diet', 'dash_diet']" if meal_id % 5 else "['vegan_diet']",
+            price=100,
+        ))
+    for user_id in range(1, N_USERS + 1):
+        db.add(User(
+            user_id=user_id,
+            username=f"user{user_id}",
+            password_hash="x",
+            email=f"user{user_id}@example.com",
+            veg_non=False,
+            height=170,
+            weight=70,
+            disease="diabeties" if user_id % 2 else "anemia",
+            diet="low_fat_diet",
+            gender=False,
+        ))
+    # Users in the same taste group interact with overlapping meals
+    for user_id in range(1, N_USERS + 1):
+        group = user_id % 3
+        for offset in range(8):
+            meal_id = (group * 12 + offset * 2 + user_id % 2) % N_MEALS + 1
+            db.add(RecentActivity(
+                user_id=user_id,
+                meal_id=meal_id,
+                liked=offset % 2 == 0,
+                purchased=offset % 3 == 0,
+                rated=False,
+            ))
+    db.commit()
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine, monkeypatch):
+    # Recommender caches are process-wide; give every test a fresh set
+    monkeypatch.setattr(meal_catalog, "_catalog", None)
+    monkeypatch.setattr(interaction_matrix, "_interaction_matrix", None)
+    monkeypatch.setattr(popularity, "_popularity", None)
+    monkeypatch.setattr(similarity_index, "_item_similarity_index", None)
+    monkeypatch.setattr(user_neighbours, "_engine", None)
+
+    session = sessionmaker(bind=engine)()
+    seed(session)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def meal_queries(statements):
+    return [statement for statement in statements if "FROM meals" in statement]
+
+
+def test_user_based_resolves_meals_in_one_query(db, statements):
+    recommend_user_based(db, 1)  # Warm the shared interaction matrix
+    statements.clear()
+
+    recommendations = recommend_user_based(db, 1, top_n=10)
+
+    assert len(recommendations) > 1
+    assert all(rec["score"] == "user-based" for rec in recommendations)
+    assert len(meal_queries(statements)) <= 1
+
+
+def test_item_based_resolves_meals_in_one_query(db, statements):
+    recommend_item_based(db, 1)  # Warm the interaction matrix and similarity index
+    statements.clear()
+
+    recommendations = recommend_item_based(db, 1, top_n=10)
+
+    assert len(recommendations) > 1
+    assert all(rec["score"] == "item-based" for rec in recommendations)
+    assert len(meal_queries(statements)) <= 1
+
+
+def test_hybrid_meal_queries_do_not_grow_with_candidates(db, statements):
+    hybrid_recommendation(db, 1)
+    statements.clear()
+
+    recommendations = hybrid_recommendation(db, 1, top_n=15)
+
+    assert len(recommendations) > 10
+    # Every stage reads meals from the warm in-memory catalog
+    assert meal_queries(statements) == []
+
+
+def test_hybrid_round_trips_are_constant(db, statements):
+    hybrid_recommendation(db, 1)
+    statements.clear()
+    hybrid_recommendation(db, 1, top_n=3)
+    small = len(statements)
+
+    statements.clear()
+    recommendations = hybrid_recommendation(db, 1, top_n=20)
+
+    # The user and their activities: independent of the number of candidates
+    assert len(statements) == small <= 2
+    meal_ids = [rec["meal_id"] for rec in recommendations]
+    assert len(meal_ids) == len(set(meal_ids))
+
+
+def test_hybrid_batch_matches_single_user_recommendations(db, statements):
+    user_ids = list(range(1, N_USERS + 1)) + [N_USERS + 1]
+    hybrid_recommendation_batch(db, user_ids[:2])  # Warm the shared caches
+    statements.clear()
+
+    batch = hybrid_recommendation_batch(db, user_ids, top_n=10)
+
+    # The users and all their activities, however many users there are
+    assert len(statements) <= 2
+    assert batch[N_USERS + 1] == {"error": "User not found"}
+    for user_id in user_ids[:-1]:
+        assert batch[user_id] == hybrid_recommendation(db, user_id, top_n=10)
+
+
+def test_worker_processes_match_in_process_recommendations(tmp_path, monkeypatch):
+    # Workers open their own connections, so they need a database file rather than a private in-memory one
+    database_url = f"sqlite:///{tmp_path / 'workers.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    seed(session)
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    for module, name in ((meal_catalog, "_catalog"), (interaction_matrix, "_interaction_matrix"),
+                         (popularity, "_popularity"), (similarity_index, "_item_similarity_index"),
+                         (user_neighbours, "_engine")):
+        monkeypatch.setattr(module, name, None)
+
+    workers = RecommendationWorkers(processes=2)
+    workers.start(session)
+    try:
+        assert workers.submit(session, 1, 10).result() == hybrid_recommendation(session, 1, 10)
+
+        # A rebuilt index is published as a new version; workers move to it with the next job
+        old_index = similarity_index.get_item_similarity_index(session)
+        old_scores = os.path.join(old_index.path, "scores.npy")
+        written = os.stat(old_scores).st_mtime_ns
+        rebuilt = similarity_index.ItemSimilarityIndex.build(interaction_matrix.get_interaction_matrix(session), k=5)
+        rebuilt.publish(similarity_index.index_path())
+        monkeypatch.setattr(similarity_index, "_item_similarity_index", rebuilt)
+        assert rebuilt.path != old_index.path
+        assert os.stat(old_scores).st_mtime_ns == written
+        assert workers.submit(session, 1, 10).result() == hybrid_recommendation(session, 1, 10)
+
+        # Updates after the snapshot reach the workers through the update log
+        activity = RecentActivity(user_id=1, meal_id=N_MEALS, liked=True, purchased=True)
+        session.add(activity)
+        session.commit()
+        apply_interaction_delta(1, N_MEALS, 2)
+        apply_like_delta(N_MEALS, session.get(User, 1).disease, False, True)
+        for user_id in (1, 2, 3):
+            assert workers.submit(session, user_id, 10).result() == hybrid_recommendation(session, user_id, 10)
+        assert workers.submit(session, [1, 2, 3], 10, batch=True).result() == hybrid_recommendation_batch(
+            session, [1, 2, 3], 10)
+    finally:
+        workers.shutdown()
+        session.close()
+        engine.dispose()
+
+
+def test_worker_attaching_a_newer_content_model_reloads_its_catalog(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(content_model.settings, "ARTIFACTS_DIR", str(tmp_path))
+    monkeypatch.setattr(meal_catalog.settings, "MEAL_CATALOG_CHECK_SECONDS", 3600)  # No re-check of its own
+    monkeypatch.setattr(content_model, "_content_model", None)
+    monkeypatch.setattr(content_model, "_model_catalog", None)
+    monkeypatch.setattr(recommender_workers, "_attached", {"snapshot_dir": None, "artifact_dirs": None, "applied": 0})
+    index_dir = similarity_index.get_item_similarity_index(db).path
+
+    # The worker attaches the current model and caches the catalog it matches
+    recommender_workers.attach_artifacts((index_dir, content_model.get_content_model(db).path))
+    assert recommend_content_based(db, 1, 10)
+
+    # The API process adds a meal and publishes a model fitted on the new catalog
+    db.add(Meal(meal_id=N_MEALS + 1, name="new meal", veg_non=False, nutrient="iron", disease="['anemia']",
+                diet="['vegan_diet']", price=100))
+    db.commit()
+    newer = content_model.ContentModel.build(meal_catalog.MealCatalog.from_db(db))
+    newer.publish(content_model.model_path())
+
+    recommender_workers.attach_artifacts((index_dir, newer.path))
+    model = content_model.get_content_model(db)
+    assert model.path == newer.path  # Used as published, not refitted
+    np.testing.assert_array_equal(model.meal_ids, get_meal_catalog(db).meal_ids)
+    assert recommend_content_based(db, 1, 10)
+
+
+def test_refresh_scheduler_coalesces_marks_into_one_refresh_per_user(db, engine, monkeypatch):
+    refreshed = []
+
+    def recommend_batch(db, user_ids, top_n=15):
+        refreshed.extend(user_ids)
+        return hybrid_recommendation_batch(db, user_ids, top_n)
+
+    monkeypatch.setattr(refresh_scheduler, "recommend_batch", recommend_batch)
+    scheduler = RefreshScheduler(sessionmaker(bind=engine), window=60, batch_size=4, workers=1)
+
+    # A burst of interactions from the "diabeties" cohort (odd user ids), plus one "anemia" user
+    for user_id in (1, 3, 5, 1, 3):
+        scheduler.mark_users([user_id], delay=0)
+        scheduler.mark_cohort("diabeties")
+    scheduler.mark_users([2])
+    assert scheduler.metrics()["queue_depth"] == 5
+    assert scheduler.metrics()["coalesced"] == 6
+
+    # Only the users marked with no delay are due yet
+    assert scheduler.run_pending() == 3
+    assert sorted(refreshed) == [1, 3, 5]
+
+    refreshed.clear()
+    assert scheduler.run_pending(now=float("inf")) == N_USERS // 2 + 1
+    assert sorted(refreshed) == sorted(list(range(1, N_USERS + 1, 2)) + [2])
+    metrics = scheduler.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["refreshed"] == N_USERS // 2 + 4
+    assert metrics["batches"] == 1 + 4
+    assert db.query(Recommendation).filter(Recommendation.user_id == 2).count() > 0
+    scheduler.stop()
+
+
+def test_recommendation_sets_are_written_in_one_statement_per_table_operation(db, statements):
+    store_recommendations(db, 1, [{"meal_id": meal_id} for meal_id in range(1, 6)])
+    statements.clear()
+
+    store_recommendations(db, 1, [{"meal_id": meal_id} for meal_id in range(10, 30)])
+
+    writes = [statement for statement in statements if statement.split()[0] in ("DELETE", "INSERT")]
+    assert len(writes) == 2
+    stored = db.query(Recommendation.meal_id).filter(Recommendation.user_id == 1).all()
+    assert sorted(meal_id for (meal_id,) in stored) == list(range(10, 30))
+
+    statements.clear()
+    store_recommendations_batch(db, {
+        1: [{"meal_id": 3}],
+        2: [{"meal_id": meal_id} for meal_id in range(1, 11)],
+        3: {"error": "User not found"},
+    })
+    writes = [statement for statement in statements if statement.split()[0] in ("DELETE", "INSERT")]
+    assert len(writes) == 2
+    counts = dict(db.query(Recommendation.user_id, func.count()).group_by(Recommendation.user_id).all())
+    assert counts == {1: 1, 2: 10}
+
+
+def test_stored_recommendations_are_served_with_one_joined_query(db, statements):
+    store_recommendations(db, 1, [{"meal_id": meal_id} for meal_id in (7, 3, 12)])
+    statements.clear()
+
+    rows = get_recent_meal_recommendations(db, 1, datetime.utcnow() - timedelta(hours=24))
+
+    assert len(statements) == 1
+    assert [row.meal_id for row in rows] == [7, 3, 12]
+    assert tuple(rows[0]) == (
+        7, "meal 7", "fiber", "['diabeties', 'hypertension']", "['low_fat_diet', 'dash_diet']", False,
+        "Based on your preferences and similar users",
+    )
+    assert get_recent_meal_recommendations(db, 1, datetime.utcnow() + timedelta(hours=1)) == []
+
+
+def test_interaction_invalidates_the_stored_set_before_the_next_read(db, monkeypatch):
+    marked = []
+    monkeypatch.setattr(recommender_endpoint, "get_refresh_scheduler", lambda: SimpleNamespace(mark_cohort=marked.append))
+    stored = recommender_endpoint._recommend_meals(db, 1, 10, False)["recommendations"]
+    disliked = stored[0]["meal_id"]
+
+    request = recommender_endpoint.InteractionRequest(user_id=1, meal_id=disliked, action="dislike")
+    recommender_endpoint._interact_with_meal(request, db)
+
+    # The caller's set is dropped synchronously; only the cohort refresh is debounced
+    assert db.query(Recommendation).filter(Recommendation.user_id == 1).count() == 0
+    assert marked == ["diabeties"]
+    fresh = recommender_endpoint._recommend_meals(db, 1, 10, False)["recommendations"]
+    assert fresh == hybrid_recommendation(db, 1, 10)
+
+
+def test_popularity_counts_follow_like_deltas(db):
+    counts = get_popularity_counts(db)
+    user = db.get(User, 2)
+    activities = db.query(RecentActivity).filter(RecentActivity.user_id == 2).order_by(RecentActivity.activity_id).all()
+
+    # Unlike one meal, like another: the same change interact_with_meal makes
+    for activity in activities[:2]:
+        was_liked = activity.liked
+        activity.liked = not was_liked
+        db.commit()
+        apply_like_delta(activity.meal_id, user.disease, was_liked, activity.liked)
+
+    recounted = PopularityCounts.from_db(db)
+    assert counts.global_counts == recounted.global_counts
+    assert counts.cohort_counts == recounted.cohort_counts
+    assert counts.cohort_top("anemia", 5) == recounted.cohort_top("anemia", 5)
+
+
+@pytest.mark.parametrize("fold_cells", [4096, 0])  # New cells kept in the overlay, or folded on every write
+def test_interaction_deltas_match_a_rebuild_from_the_database(db, monkeypatch, fold_cells):
+    monkeypatch.setattr(interaction_matrix.settings, "INTERACTION_FOLD_CELLS", fold_cells)
+    interactions = interaction_matrix.get_interaction_matrix(db)
+    before = interactions.snapshot()
+    activities = db.query(RecentActivity).filter(RecentActivity.user_id == 2).order_by(RecentActivity.activity_id).all()
+
+    # An existing cell drops to zero, another changes score; a new meal, a new user, and a new user on a new meal
+    activities[0].liked = activities[0].purchased = activities[0].rated = False
+    activities[1].rated = True
+    db.add_all([
+        RecentActivity(user_id=3, meal_id=N_MEALS + 1, liked=True, purchased=False, rated=False),
+        RecentActivity(user_id=N_USERS + 1, meal_id=5, liked=True, purchased=True, rated=False),
+        RecentActivity(user_id=N_USERS + 2, meal_id=N_MEALS + 2, liked=True, purchased=True, rated=True),
+    ])
+    db.commit()
+    for activity in db.query(RecentActivity).filter(RecentActivity.meal_id.isnot(None)).all():
+        score = interaction_matrix.interaction_score(activity.liked, activity.purchased, activity.rated)
+        if 2 < activity.user_id <= N_USERS and activity.meal_id <= N_MEALS:
+            continue  # Unchanged rows
+        interactions.apply_delta(activity.user_id, activity.meal_id, score)
+
+    rebuilt = interaction_matrix.InteractionMatrix.from_db(db)
+    patched = interactions.snapshot()
+    assert bool(patched.overlay.nnz) == bool(fold_cells)
+    expected = rebuilt.to_frame()
+    order = np.argsort(patched.user_ids, kind="stable"), np.argsort(patched.meal_ids, kind="stable")
+
+    # The snapshot's readers see base plus overlay without folding them
+    np.testing.assert_array_equal(patched.rows(order[0]).toarray()[:, order[1]], expected.to_numpy())
+    np.testing.assert_array_equal(patched.dot(np.eye(patched.shape[1]))[order[0]][:, order[1]], expected.to_numpy())
+    pd.testing.assert_frame_equal(interactions.to_frame().sort_index().sort_index(axis=1), expected)
+    for stat in ("row_sums", "row_sq_sums", "row_counts"):
+        expected_stat = pd.Series(getattr(rebuilt, stat), index=rebuilt.user_ids)
+        actual = pd.Series(getattr(patched, stat), index=patched.user_ids).sort_index()
+        pd.testing.assert_series_equal(actual, expected_stat, check_dtype=False)
+    assert interactions.has_user(N_USERS + 2) and patched.shape == rebuilt.shape
+    assert sorted(interactions.user_meals(N_USERS + 2)) == [N_MEALS + 2]
+
+    # A snapshot taken before the new users and meals keeps consistent shapes
+    assert before.shape == (N_USERS, len(before.meal_ids)) == before.matrix.shape
+    assert len(before.row_sums) == len(before.row_counts) == N_USERS
+    assert before.row_of(N_USERS + 1) is None and before.rows([0]).shape == (1, len(before.meal_ids))
+
+
+@pytest.mark.parametrize("metric", ["pearson", "cosine"])
+def test_item_similarity_index_matches_brute_force_similarity(metric, tmp_path):
+    rng = np.random.default_rng(0)
+    dense = rng.integers(0, 4, size=(25, 12)) * (rng.random((25, 12)) < 0.4)
+    dense[:, 3] = 2  # Same score from every user: zero variance, so Pearson similarity 0
+    meal_ids = rng.permutation(np.arange(100, 112))
+    users, meals = np.nonzero(dense)
+    interactions = interaction_matrix.InteractionMatrix.from_interactions(users, meal_ids[meals], dense[users, meals])
+    k = 4
+    index = similarity_index.ItemSimilarityIndex.build(interactions, k=k, metric=metric)
+
+    # Brute force over the dense matrix, columns in ascending meal id order
+    order = np.argsort(meal_ids)
+    columns = dense[:, order].astype(np.float64)
+    if metric == "pearson":
+        columns = columns - columns.mean(axis=0)
+    norms = np.linalg.norm(columns, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = np.where(np.outer(norms, norms) > 0, columns.T @ columns / np.outer(norms, norms), 0.0)
+    shared_users = (dense[:, order].T > 0).astype(int) @ (dense[:, order] > 0).astype(int) > 0
+
+    np.testing.assert_array_equal(index.meal_ids, meal_ids[order])
+    for i in range(len(order)):
+        candidates = [j for j in range(len(order)) if j != i and shared_users[i, j]]
+        top = sorted((expected[i, j] for j in candidates), reverse=True)[:k]
+        found = index.neighbours[i] >= 0
+        assert found.sum() == len(top)
+        np.testing.assert_allclose(index.scores[i, found], top, rtol=1e-5, atol=1e-6)
+        for neighbour, score in zip(index.neighbours[i, found], index.scores[i, found]):
+            j = np.searchsorted(index.meal_ids, neighbour)
+            assert shared_users[i, j]
+            np.testing.assert_allclose(score, expected[i, j], rtol=1e-5, atol=1e-6)
+
+    # Publish, then load the version back memory-mapped, as the app and the workers do
+    path = index.publish(str(tmp_path / "index"))
+    assert artifacts.current_version_path(str(tmp_path / "index")) == path
+    loaded = similarity_index.ItemSimilarityIndex.load(path)
+    assert isinstance(loaded.scores, np.memmap) and loaded.metric == metric
+    for name in ("meal_ids", "neighbours", "scores"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(index, name))
+    user_meals = meal_ids[np.nonzero(dense[0])[0]]
+    for got, want in zip(loaded.score_meals(user_meals), index.score_meals(user_meals)):
+        np.testing.assert_array_equal(got, want)
+
+
+def clustered_interactions(n_users, n_meals, per_user, spread, seed=0):
+    # Users draw meals around one of 20 taste clusters; a small spread makes neighbourhoods well separated
+    rng = np.random.default_rng(seed)
+    centres = np.repeat(rng.integers(0, 20, n_users) * (n_meals // 20), per_user)
+    user_ids = np.repeat(np.arange(1, n_users + 1), per_user)
+    meal_ids = (centres + rng.normal(0, spread, len(user_ids)).astype(np.int64)) % n_meals + 1
+    return interaction_matrix.InteractionMatrix.from_interactions(user_ids, meal_ids, rng.integers(1, 4, len(user_ids)))
+
+
+@pytest.mark.parametrize("metric", ["pearson", "cosine"])
+def test_user_neighbours_match_a_dense_reference(metric):
+    interactions = clustered_interactions(60, 40, 8, spread=4)
+    # Pending cells on existing, new and re-scored users and meals, read through the overlay
+    for user_id, meal_id, score in ((3, 7, 3), (61, 7, 2), (61, 1000, 1), (5, 1000, 3), (2, 1000, 2)):
+        interactions.apply_delta(user_id, meal_id, score)
+    assert interactions.snapshot().overlay.nnz
+
+    engine = user_neighbours.UserNeighbourEngine(interactions, metric=metric)
+    n = 7
+    batch = engine.top_neighbours_batch(list(interactions.user_ids) + [10_000], n)
+    assert batch[10_000] == [] and engine.top_neighbours(10_000, n) == []
+    singles = {int(user_id): engine.top_neighbours(user_id, n) for user_id in interactions.user_ids}
+
+    dense = interactions.to_frame().to_numpy()
+    if metric == "pearson":
+        expected = np.corrcoef(dense)
+    else:
+        norms = np.linalg.norm(dense, axis=1)
+        expected = dense @ dense.T / np.outer(norms, norms)
+    np.fill_diagonal(expected, -np.inf)  # A user is never their own neighbour
+
+    for row, user_id in enumerate(interactions.user_ids):
+        single = singles[int(user_id)]
+        for neighbours in (single, batch[int(user_id)]):
+            assert len(neighbours) == n
+            np.testing.assert_allclose([score for _, score in neighbours], np.sort(expected[row])[::-1][:n], atol=1e-9)
+            for neighbour, score in neighbours:
+                np.testing.assert_allclose(score, expected[row, interactions.user_index[neighbour]], atol=1e-9)
+        assert [u for u, _ in single] == [u for u, _ in batch[int(user_id)]]
+
+
+@pytest.mark.parametrize("metric", ["pearson", "cosine"])
+def test_lsh_neighbours_recall_the_exact_neighbours(metric):
+    interactions = clustered_interactions(1000, 200, 20, spread=5)
+    exact = user_neighbours.UserNeighbourEngine(interactions, metric=metric)
+    lsh = user_neighbours.RandomProjectionLSH(interactions, metric=metric)
+    approximate = user_neighbours.UserNeighbourEngine(interactions, metric=metric, lsh=lsh)
+
+    queries = interactions.user_ids[:200]
+    hits = candidates = 0
+    for user_id in queries:
+        found, expected = approximate.top_neighbours(user_id, 10), exact.top_neighbours(user_id, 10)
+        hits += len({u for u, _ in found} & {u for u, _ in expected})
+        candidates += len(lsh.candidates(interactions.snapshot(), interactions.user_index[int(user_id)]))
+        # Candidates are scored exactly, so every score LSH returns is the exact similarity
+        similarity = exact.similarities(user_id)
+        for neighbour, score in found:
+            np.testing.assert_allclose(score, similarity[interactions.user_index[neighbour]], atol=1e-9)
+    assert hits / (10 * len(queries)) >= 0.9
+    assert candidates / len(queries) < 0.25 * len(interactions.user_ids)  # Far fewer rows scored than exact mode
+
+
+def test_top_k_matches_a_stable_descending_sort():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        scores = rng.integers(0, 5, rng.integers(1, 30)).astype(float)  # Many ties
+        for k in (1, 3, len(scores) - 1, len(scores), len(scores) + 5):
+            np.testing.assert_array_equal(top_k(scores, k), np.argsort(-scores, kind="stable")[:k])
+
+    # Ties go to the lowest position
+    np.testing.assert_array_equal(top_k([1, 3, 3, 2, 3], 2), [1, 2])
+    np.testing.assert_array_equal(top_k([1, 3, 3, 2, 3], 4), [1, 2, 4, 3])
+
+
+def test_top_k_edge_cases():
+    for k in (0, -1):
+        result = top_k([3.0, 1.0], k)
+        assert result.dtype == np.int64 and len(result) == 0
+    assert len(top_k([], 3)) == 0
+    np.testing.assert_array_equal(top_k([2.0, 5.0, 1.0], 10), [1, 0, 2])
+
+    # Excluded positions are never returned; the rest keep their original positions
+    scores = [9.0, 1.0, 8.0, 7.0, 8.0]
+    exclude = np.array([True, False, False, False, False])
+    np.testing.assert_array_equal(top_k(scores, 2, exclude=exclude), [2, 4])
+    np.testing.assert_array_equal(top_k(scores, 10, exclude=exclude), [2, 4, 3, 1])
+    assert len(top_k(scores, 3, exclude=np.ones(5, dtype=bool))) == 0
+
+    # NaN scores rank last, below -inf, in position order
+    scores = [np.nan, 1.0, np.nan, -np.inf, 0.5]
+    np.testing.assert_array_equal(top_k(scores, 2), [1, 4])
+    np.testing.assert_array_equal(top_k(scores, 4), [1, 4, 3, 0])
+    np.testing.assert_array_equal(top_k(scores, 5), [1, 4, 3, 0, 2])
+
+
+def test_interaction_delta_during_a_cold_build_is_not_lost(db, monkeypatch):
+    queried, release = threading.Event(), threading.Event()
+    from_db = interaction_matrix.InteractionMatrix.from_db
+
+    def slow_from_db(cls, session):
+        built = from_db(session)  # Queried before the new activity is committed
+        queried.set()
+        release.wait(5)
+        return built
+
+    monkeypatch.setattr(interaction_matrix.InteractionMatrix, "from_db", classmethod(slow_from_db))
+    build = threading.Thread(target=interaction_matrix.get_interaction_matrix, args=(db,))
+    build.start()
+    assert queried.wait(5)
+
+    db.add(RecentActivity(user_id=N_USERS + 1, meal_id=1, liked=True, purchased=False, rated=False))
+    db.commit()
+    delta = threading.Thread(target=apply_interaction_delta, args=(N_USERS + 1, 1, 1))
+    delta.start()
+    time.sleep(0.1)  # The delta finds no matrix while the build is in flight
+    release.set()
+    build.join(5)
+    delta.join(5)
+
+    assert interaction_matrix.get_interaction_matrix(db).has_user(N_USERS + 1)
+
+
+def test_like_delta_during_a_cold_build_is_counted_once(db, monkeypatch):
+    queried, release = threading.Event(), threading.Event()
+    from_db = PopularityCounts.from_db
+
+    def slow_from_db(cls, session):
+        built = from_db(session)
+        if not queried.is_set():  # Only the first query races the like
+            queried.set()
+            release.wait(5)
+        return built
+
+    monkeypatch.setattr(PopularityCounts, "from_db", classmethod(slow_from_db))
+    build = threading.Thread(target=get_popularity_counts, args=(db,))
+    build.start()
+    assert queried.wait(5)
+
+    db.add(RecentActivity(user_id=1, meal_id=N_MEALS, liked=True, purchased=False, rated=False))
+    db.commit()
+    apply_like_delta(N_MEALS, db.get(User, 1).disease, False, True)  # Finds no counts: the build is in flight
+    release.set()
+    build.join(5)
+
+    recounted = from_db(db)
+    assert get_popularity_counts(db).global_counts == recounted.global_counts
+    assert get_popularity_counts(db).cohort_counts == recounted.cohort_counts
+
+
+def test_meal_catalog_reloads_only_when_version_changes(db, statements, monkeypatch):
+    monkeypatch.setattr(meal_catalog.settings, "MEAL_CATALOG_CHECK_SECONDS", 0)
+    catalog = get_meal_catalog(db)
+    assert len(catalog) == N_MEALS
+
+    statements.clear()
+    assert get_meal_catalog(db) is catalog
+    assert len(meal_queries(statements)) == 1  # Only the version marker
+
+    db.add(Meal(meal_id=N_MEALS + 1, name="new meal", veg_non=False))
+    db.commit()
+    reloaded = get_meal_catalog(db)
+    assert reloaded is not catalog
+    assert hydrate_meals(db, [N_MEALS + 1, 1])[0]["name"] == "new meal"
+
+
+def test_content_model_versions_are_published_without_rewriting_mapped_files(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(content_model.settings, "ARTIFACTS_DIR", str(tmp_path))
+    monkeypatch.setattr(meal_catalog.settings, "MEAL_CATALOG_CHECK_SECONDS", 0)
+    monkeypatch.setattr(content_model, "_content_model", None)
+    monkeypatch.setattr(content_model, "_model_catalog", None)
+
+    first = content_model.get_content_model(db)
+    mapped = content_model.ContentModel.load(first.path)  # As a worker process maps it
+    assert isinstance(mapped.meal_ids, np.memmap)
+    before = np.array(mapped.meal_vectors.data)
+    data_file = os.path.join(first.path, "data.npy")
+    written = os.stat(data_file).st_mtime_ns
+
+    # A catalog change publishes a new version next to the one still mapped
+    db.add(Meal(meal_id=N_MEALS + 1, name="new meal", veg_non=False, nutrient="iron", disease="['anemia']",
+                diet="['vegan_diet']", price=100))
+    db.commit()
+    second = content_model.get_content_model(db)
+    assert second.path != first.path
+    assert artifacts.current_version_path(content_model.model_path()) == second.path
+    assert os.stat(data_file).st_mtime_ns == written
+    np.testing.assert_array_equal(mapped.meal_vectors.data, before)
+
+    # Publishing a build that already exists (e.g. from another process) reuses its directory
+    assert second.publish(content_model.model_path()) == second.path
+    assert content_model.load_content_model().path == second.path
+
+
+class CountingModel(content_model.ContentModel):
+    """
+    Content model that counts the profile texts it transforms.
+    """
+
+    def __init__(self, model, fingerprint=None):
+        super().__init__(model.vectorizer, model.meal_ids, model.meal_vectors, fingerprint or model.fingerprint)
+        self.transformed = []
+
+    def transform(self, texts):
+        self.transformed.extend(texts)
+        return super().transform(texts)
+
+
+def test_profile_vectors_are_cached_per_profile_text_and_model(db):
+    model = CountingModel(content_model.ContentModel.build(get_meal_catalog(db)))
+    cache = profile_vectors.UserProfileCache(max_size=3)
+
+    first = cache.get_vector(model, 1, "low_fat_diet diabeties")
+    assert cache.get_vector(model, 1, "low_fat_diet diabeties") is first
+    assert model.transformed == ["low_fat_diet diabeties"]
+
+    # A changed profile text, or a refitted model, is recomputed without an explicit invalidation
+    changed = cache.get_vector(model, 1, "vegan_diet anemia")
+    assert (changed != first).nnz and model.transformed[-1] == "vegan_diet anemia"
+    refitted = CountingModel(model, fingerprint="refitted")
+    cache.get_vector(refitted, 1, "vegan_diet anemia")
+    assert refitted.transformed == ["vegan_diet anemia"]
+
+    # The batch path returns the same rows as one lookup per user, transforming only the misses at once
+    profiles = [(1, "vegan_diet anemia"), (2, "dash_diet hypertension"), (3, "low_fat_diet diabeties")]
+    stacked = cache.get_vectors(refitted, profiles)
+    assert refitted.transformed == ["vegan_diet anemia", "dash_diet hypertension", "low_fat_diet diabeties"]
+    for row, (user_id, text) in enumerate(profiles):
+        np.testing.assert_allclose(stacked[row].toarray(), cache.get_vector(refitted, user_id, text).toarray())
+        uncached = content_model.ContentModel.transform(refitted, [text])  # Bypasses the transform counter
+        np.testing.assert_allclose(stacked[row].toarray(), uncached.toarray())
+
+    # Bounded to max_size, evicting the least recently used user
+    cache.get_vector(refitted, 1, "vegan_diet anemia")
+    cache.get_vectors(refitted, [(4, "vegan_diet"), (5, "dash_diet")])
+    assert len(cache) == 3
+    assert set(cache._entries) == {1, 4, 5}
+
+
+def test_updating_a_user_invalidates_their_profile_vector(db, monkeypatch):
+    cache = profile_vectors.UserProfileCache()
+    monkeypatch.setattr(profile_vectors, "profile_cache", cache)
+    model = content_model.ContentModel.build(get_meal_catalog(db))
+    for user_id in (1, 2):
+        profile_vectors.get_user_profile_vector(model, user_id, "low_fat_diet diabeties")
+
+    user_service.update_user(db, 1, 170, 70, "anemia", "vegan_diet")
+    assert set(cache._entries) == {2}
+
+
+def exercise_data(n=60):
+    return pd.DataFrame({
+        "exercise": [f"exercise {i % 5}" for i in range(n)],
+        "bmi": [18 + i * 0.3 for i in range(n)],
+        "exercise_intensity": [1 + i % 10 for i in range(n)],
+    })
+
+
+def test_intensity_table_matches_the_forest():
+    model = exercise_model.ExerciseModel.train(exercise_data(200))
+    table = model.table
+    # A dense grid plus every split point, where an off-by-one interval would show
+    bmi = np.concatenate([np.linspace(5, 80, 5001), table.thresholds * table.scale + table.mean])
+
+    forest = model.forest.predict(model.scaler.transform(bmi.reshape(-1, 1)))
+    np.testing.assert_array_equal(table.predict(bmi), forest)
+    assert model.predict(31.4, engine="table") == model.predict(31.4, engine="forest")
+
+
+def test_exercise_model_is_reused_until_the_csv_changes(tmp_path, monkeypatch):
+    data_path = tmp_path / "exercise.csv"
+    exercise_data().to_csv(data_path, index=False)
+    monkeypatch.setattr(exercise_model.settings, "EXERCISE_DATA_PATH", str(data_path))
+    monkeypatch.setattr(exercise_model.settings, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(exercise_model, "_exercise_model", None)
+    monkeypatch.setattr(exercise_model, "_exercises", None)
+
+    trained = exercise_model.get_exercise_model()  # Trained and saved on first use
+    monkeypatch.setattr(exercise_model, "_exercise_model", None)
+    loaded = exercise_model.load_exercise_model()
+    assert loaded is not None and loaded is not trained
+    assert loaded.predict(24.5) == trained.predict(24.5)
+    # Served from meta.json, without asking the forest again
+    loaded.forest = None
+    assert loaded.feature_importance == trained.feature_importance == {"bmi": 1.0}
+
+    with open(data_path, "a") as data_file:
+        data_file.write("exercise 1,30.0,7\n")
+    monkeypatch.setattr(exercise_model, "_exercise_model", None)
+    assert exercise_model.load_exercise_model() is None  # Stale: trained on the old CSV
+
+    # Retraining publishes a new version; the files of the old one are not rewritten
+    old_path = artifacts.current_version_path(exercise_model.model_path())
+    old_files = {name: os.stat(os.path.join(old_path, name)).st_mtime_ns for name in os.listdir(old_path)}
+    monkeypatch.setattr(exercise_model, "_exercises", None)
+    exercise_model.get_exercise_model()
+    assert artifacts.current_version_path(exercise_model.model_path()) != old_path
+    assert {name: os.stat(os.path.join(old_path, name)).st_mtime_ns for name in os.listdir(old_path)} == old_files
+
+
+def select_exercises_with_pandas(exercise_df, predicted_intensity):
+    """
+    The DataFrame selection recommend_exercises used to run, with a stable sort so ties are deterministic.
+    """
+    intensity_range = (max(0, predicted_intensity - 1), min(10, predicted_intensity + 1))
+    filtered = exercise_df[exercise_df["exercise_intensity"].between(*intensity_range)]
+    if len(filtered) < 5:
+        intensity_range = (max(0, predicted_intensity - 2), min(10, predicted_intensity + 2))
+        filtered = exercise_df[exercise_df["exercise_intensity"].between(*intensity_range)]
+
+    selected = pd.DataFrame()
+    for exercise_type in filtered["exercise"].unique():
+        type_exercises = filtered[filtered["exercise"] == exercise_type].copy()
+        type_exercises["intensity_diff"] = abs(type_exercises["exercise_intensity"] - predicted_intensity)
+        selected = pd.concat([selected, type_exercises.sort_values("intensity_diff", kind="stable").head(2)])
+    return selected.head(5)
+
+
+def test_exercise_index_selects_the_same_exercises_as_the_dataframe_filter():
+    rng = np.random.default_rng(0)
+    exercise_df = pd.DataFrame({
+        "exercise": [f"exercise {i}" for i in rng.integers(1, 11, 400)],
+        "duration": rng.integers(10, 60, 400),
+        "calories_burn": rng.random(400) * 500,
+        "exercise_intensity": rng.integers(1, 11, 400),
+    })
+    sparse_df = exercise_df[exercise_df["exercise_intensity"] != 5].head(40)  # Forces the widened band
+
+    for frame in (exercise_df, sparse_df):
+        index = ExerciseIndex(frame)
+        for predicted_intensity in np.linspace(0, 11, 45):
+            expected = select_exercises_with_pandas(frame, predicted_intensity)
+            selected = index.recommend(predicted_intensity, limit=5)
+
+            assert [row["exercise"] for row in selected] == list(expected["exercise"])
+            assert [row["calories_burn"] for row in selected] == list(expected["calories_burn"])
+            assert [row["intensity_diff"] for row in selected] == list(expected["intensity_diff"])
@@ -0,0 +1,98 @@
+"""
+Benchmark: disease-history parsing throughput (histories/s) for a bulk onboarding batch, against a local
+fake LLM server (benchmarks.fake_llm_server).
+
+Compares one `parse_disease_history` call per history, all awaited at once (so bounded only by the gateway's
+LLM_MAX_CONCURRENCY), with `parse_disease_histories`, which dedupes, resolves cached and locally matched
+histories first and packs the rest LLM_BATCH_ITEMS to a prompt. The parse cache is memory-only and emptied
+before every run; both paths must return the same diseases.
+
+A batch mixes histories that only name diseases (resolved locally), free-text histories (need the LLM) and
+repeats of earlier histories, in the given proportions.
+
+Usage (from backend/): python -m benchmarks.bench_batch_parsing [--histories 100 500] [--duplicates 0.3]
+    [--local 0.3] [--base-latency 0.3] [--item-latency 0.02] [--batch-items 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ARTIFACTS_DIR", tempfile.mkdtemp())
+os.environ.setdefault("OPENAI_API_KEY", "fake")  # Only ever sent to the fake server
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "cleaned")
+os.environ.setdefault("USER_PROFILES_DATA_PATH", os.path.join(DATA_DIR, "cleaned_user_profiles.csv"))
+os.environ.setdefault("MEALS_DATA_PATH", os.path.join(DATA_DIR, "cleaned_meals.csv"))
+
+from app.core.config import settings
+from app.core.disease_parsing import get_disease_parse_cache
+from benchmarks.fake_llm_server import FakeLLMServer
+
+FREE_TEXT = (
+    "patient reports {0} since childhood",
+    "family history of {0}; currently treated for {1}",
+    "referred by the clinic for {0}, previously {1}",
+)
+
+
+def make_histories(valid_diseases, count, duplicates, local, rng):
+    names = [disease.replace("_", " ") for disease in sorted(valid_diseases)]
+    histories = []
+    for i in range(count):
+        if histories and rng.random() < duplicates:
+            histories.append(rng.choice(histories))
+        elif rng.random() < local:
+            histories.append(" and ".join(rng.sample(names, 2)))
+        else:
+            histories.append(rng.choice(FREE_TEXT).format(*rng.sample(names, 2)) + f" (case {i})")
+    return histories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--histories", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    parser.add_argument("--local", type=float, default=0.3)
+    parser.add_argument("--base-latency", type=float, default=0.3)
+    parser.add_argument("--item-latency", type=float, default=0.02)
+    parser.add_argument("--batch-items", type=int, default=settings.LLM_BATCH_ITEMS)
+    args = parser.parse_args()
+
+    fake = FakeLLMServer(base_latency=args.base_latency, item_latency=args.item_latency).start()
+    settings.OPENAI_BASE_URL = fake.base_url
+    settings.DISEASE_PARSE_CACHE_FILE = ""
+    settings.LLM_BATCH_ITEMS = args.batch_items
+    from app.core import llm_integration
+
+    cache = get_disease_parse_cache()
+    rng = random.Random(0)
+    print(f"Fake LLM: {args.base_latency * 1e3:.0f} ms + {args.item_latency * 1e3:.0f} ms/history; "
+          f"LLM_MAX_CONCURRENCY={settings.LLM_MAX_CONCURRENCY}, LLM_BATCH_ITEMS={args.batch_items}")
+    print(f"{'histories':>9} {'path':>11} {'seconds':>8} {'hist/s':>8} {'LLM calls':>9} {'identical':>9}")
+    for count in args.histories:
+        histories = make_histories(llm_integration.load_disease_data().valid_diseases, count, args.duplicates, args.local, rng)
+
+        async def per_history():
+            return await asyncio.gather(*(llm_integration.parse_disease_history(h) for h in histories))
+
+        async def batch():
+            return await llm_integration.parse_disease_histories(histories)
+
+        results = {}
+        for path, run in (("per-history", per_history), ("batch", batch)):
+            cache.clear()
+            fake.reset_counts()
+            started = time.perf_counter()
+            results[path] = asyncio.run(run())
+            elapsed = time.perf_counter() - started
+            identical = "" if path == "per-history" else str(results[path] == results["per-history"])
+            print(f"{count:>9} {path:>11} {elapsed:>8.2f} {count / elapsed:>8.0f} {fake.requests:>9} {identical:>9}")
+
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: the cached-read path of GET /recommend/{user_id} (stored recommendations less than 24 hours old).
+
+Times the handler body for users 1..`--users` and reports p50/p99 latency and statements per request for:
+- "previous": the Recommendation ORM rows, then their meals resolved through the meal catalog
+- "joined": the current path, one query joining recommendations to meals
+`--db-latency-ms` adds a sleep to every SQL statement, modelling the round trip to a remote database.
+Users without stored recommendations get them generated and stored before timing starts.
+
+Needs a populated database: DATABASE_URL must point at it (a SQLite file works).
+
+Usage (from backend/): python -m benchmarks.bench_cached_recommendations [--requests 2000] [--users 100]
+    [--db-latency-ms 0 2]
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+import numpy as np
+from sqlalchemy import event
+from app.api.v1.endpoints.recommender import _recommend_meals
+from app.core.database import SessionLocal, engine
+from app.models.recommendations import Recommendation
+from app.services.meal_service import get_meals_by_ids, meal_to_dict
+
+
+def previous_cached_read(db, user_id, top_n, refresh):
+    # The read path before the joined query: ORM rows, then the meals from the catalog
+    recent_time = datetime.utcnow() - timedelta(hours=24)
+    stored_recommendations = db.query(Recommendation).filter(
+        Recommendation.user_id == user_id,
+        Recommendation.created_at > recent_time
+    ).all()
+    meals = get_meals_by_ids(db, [rec.meal_id for rec in stored_recommendations])
+    recommendations_list = []
+    for rec in stored_recommendations:
+        meal = meals.get(rec.meal_id)
+        if meal:
+            recommendations_list.append({
+                **meal_to_dict(meal),
+                "is_vegetarian": True if meal["veg_non"] == 0 else False,
+                "reason": rec.recommendation_reason
+            })
+    return {"user_id": user_id, "recommendations": recommendations_list}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--db-latency-ms", type=float, nargs="+", default=[0, 2])
+    args = parser.parse_args()
+    user_ids = [i % args.users + 1 for i in range(args.requests)]
+
+    latency = {"ms": 0.0}
+    statements = {"count": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def delay(*_):
+        statements["count"] += 1
+        if latency["ms"]:
+            time.sleep(latency["ms"] / 1e3)
+
+    db = SessionLocal()
+    try:
+        for user_id in range(1, args.users + 1):
+            _recommend_meals(db, user_id, 10, False)  # Stores recommendations for users that have none
+
+        print(f"{'path':>9} {'db ms':>6} {'p50 ms':>8} {'p99 ms':>8} {'statements':>11}")
+        for latency["ms"] in args.db_latency_ms:
+            for name, handler in (("previous", previous_cached_read), ("joined", _recommend_meals)):
+                latencies = []
+                statements["count"] = 0
+                for user_id in user_ids:
+                    started = time.perf_counter()
+                    handler(db, user_id, 10, False)
+                    latencies.append(time.perf_counter() - started)
+                latencies = np.array(latencies) * 1e3
+                print(f"{name:>9} {latency['ms']:>6g} {np.percentile(latencies, 50):>8.2f} "
+                      f"{np.percentile(latencies, 99):>8.2f} {statements['count'] / len(user_ids):>11.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: diets for 1-8 diseases from the precomputed DiseaseDietIndex vs the per-request scan
+`recommend_diet` used before (str.contains over the meals table plus ast.literal_eval per matching row).
+
+Disease lists are drawn from the diseases in the meals dataset; both paths must return the same diets.
+
+Usage (from backend/): python -m benchmarks.bench_diet_index [--meals-csv ../data/cleaned/cleaned_meals.csv]
+    [--diseases 1 2 4 8] [--repeats 200]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from app.core.diet_index import DiseaseDietIndex, scan_diets
+
+DEFAULT_MEALS_CSV = os.path.join(os.path.dirname(__file__), "..", "..", "data", "cleaned", "cleaned_meals.csv")
+
+
+def scan_lookup(disease_diet_map, diseases):
+    # The previous path: one scan of the table per disease
+    matched_diets = set()
+    for disease in diseases:
+        matched_diets.update(scan_diets(disease_diet_map, disease))
+    return matched_diets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals-csv", default=DEFAULT_MEALS_CSV)
+    parser.add_argument("--diseases", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    disease_diet_map = pd.read_csv(args.meals_csv)
+    started = time.perf_counter()
+    index = DiseaseDietIndex(disease_diet_map)
+    print(f"Index build: {(time.perf_counter() - started) * 1e3:.1f} ms for {len(index.diets)} diseases, "
+          f"{len(disease_diet_map)} meals")
+
+    rng = np.random.default_rng(0)
+    known = sorted(index.diets)
+    print(f"{'diseases':>8} {'scan ms':>9} {'index µs':>9} {'speedup':>8} {'identical':>9}")
+    for n_diseases in args.diseases:
+        queries = [list(rng.choice(known, size=min(n_diseases, len(known)), replace=False))
+                   for _ in range(args.repeats)]
+
+        started = time.perf_counter()
+        scanned = [scan_lookup(disease_diet_map, diseases) for diseases in queries]
+        scan_s = (time.perf_counter() - started) / len(queries)
+
+        started = time.perf_counter()
+        indexed = [index.lookup(diseases) for diseases in queries]
+        index_s = (time.perf_counter() - started) / len(queries)
+
+        print(f"{n_diseases:>8} {scan_s * 1e3:>9.2f} {index_s * 1e6:>9.1f} {scan_s / index_s:>7.0f}x "
+              f"{str(scanned == indexed):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: refreshing a cohort's recommendations with one `hybrid_recommendation_batch` call vs
+`hybrid_recommendation` once per user.
+
+Times both for the first N users of the database for each `--users` size, with the profile vector cache
+cold and warm, and checks that the two give identical recommendations.
+
+Needs a populated database: DATABASE_URL must point at it (a SQLite file works).
+
+Usage (from backend/): python -m benchmarks.bench_hybrid_batch [--users 10 50 100]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.services.recommender.hybrid import hybrid_recommendation, hybrid_recommendation_batch
+from app.services.recommender.profile_vectors import profile_cache
+
+
+def timed(fn, cold):
+    if cold:
+        profile_cache.clear()
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 50, 100])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        all_user_ids = [user_id for (user_id,) in db.query(User.user_id).order_by(User.user_id).all()]
+        hybrid_recommendation_batch(db, all_user_ids[:2])  # Warm the catalog, matrices and models
+
+        print(f"{'users':>6} {'cache':>5} {'per-user ms':>12} {'batch ms':>9} {'speedup':>8} {'identical':>9}")
+        for n_users in args.users:
+            user_ids = all_user_ids[:n_users]
+            for cold in (True, False):
+                single_ms, single = timed(lambda: {u: hybrid_recommendation(db, u) for u in user_ids}, cold)
+                batch_ms, batch = timed(lambda: hybrid_recommendation_batch(db, user_ids), cold)
+                identical = all(batch[user_id] == single[user_id] for user_id in user_ids)
+                print(f"{len(user_ids):>6} {'cold' if cold else 'warm':>5} {single_ms:>12.1f} {batch_ms:>9.1f} "
+                      f"{single_ms / batch_ms:>7.1f}x {str(identical):>9}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: interleaved /interact writes and /recommend reads against the shared interaction matrix.
+
+Each step writes one new (user, meal) cell with `apply_delta` (every 20th step for a new user), then reads
+what a recommendation for that user reads: a snapshot with the user's meals, and their exact top neighbours.
+Compares INTERACTION_FOLD_CELLS=0, which folds every new cell into the CSR matrix like the earlier
+fold-on-read path did, with the default pending overlay.
+
+Usage (from backend/): python -m benchmarks.bench_interaction_deltas [--users 1000 10000 100000] [--steps 200]
+"""
+import argparse
+import os
+import time
+
+# The benchmark never touches the database, but importing the app requires these settings
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+import numpy as np
+from app.core.config import settings
+from app.services.recommender.user_neighbours import UserNeighbourEngine
+from benchmarks.bench_user_neighbours import synthetic_interactions
+
+
+def run(n_users, meals, per_user, steps, fold_cells):
+    settings.INTERACTION_FOLD_CELLS = fold_cells
+    interactions = synthetic_interactions(n_users, meals, per_user)
+    engine = UserNeighbourEngine(interactions)
+    rng = np.random.default_rng(1)
+    write = snapshot = neighbours = 0.0
+    for step in range(steps):
+        user_id = n_users + 1 + step if step % 20 == 0 else int(rng.integers(1, n_users + 1))
+        meal_id = int(rng.integers(1, meals + 1))
+
+        started = time.perf_counter()
+        interactions.apply_delta(user_id, meal_id, 2)
+        written = time.perf_counter()
+        interactions.user_meals(user_id)
+        snapshotted = time.perf_counter()
+        engine.top_neighbours(user_id, 20)
+        finished = time.perf_counter()
+
+        write += written - started
+        snapshot += snapshotted - written
+        neighbours += finished - snapshotted
+    return write / steps * 1e6, snapshot / steps * 1e6, neighbours / steps * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--meals", type=int, default=300)
+    parser.add_argument("--per-user", type=int, default=15)
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args()
+
+    default_fold_cells = settings.INTERACTION_FOLD_CELLS
+    print(f"{'users':>8} {'fold cells':>10} {'write µs':>9} {'user meals µs':>13} {'neighbours ms':>13}")
+    for n_users in args.users:
+        for fold_cells in (0, default_fold_cells):
+            write_us, snapshot_us, neighbours_ms = run(n_users, args.meals, args.per_user, args.steps, fold_cells)
+            print(f"{n_users:>8} {fold_cells:>10} {write_us:>9.1f} {snapshot_us:>13.1f} {neighbours_ms:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: process startup cost of the LLM integration, measured in fresh interpreters.
+
+For each run a new Python process times `import app.main` (what every uvicorn worker pays before serving),
+then the deferred pieces on first use: `load_disease_data()` (the user profile and meals CSVs plus the diet
+index) and the gateway's OpenAI client (importing openai and constructing AsyncOpenAI). It also records
+whether the import alone read the datasets or imported openai; both should be False.
+
+Usage (from backend/): python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "cleaned")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.core import llm_integration
+from app.core.llm_gateway import get_llm_gateway
+lazy = llm_integration._disease_data is None and "openai" not in sys.modules
+llm_integration.load_disease_data()
+loaded = time.perf_counter()
+get_llm_gateway().client
+client = time.perf_counter()
+print(json.dumps({"import": imported - started, "data": loaded - imported, "client": client - loaded, "lazy": lazy}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=os.environ.get("DATABASE_URL", "sqlite://"),
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "unused"),
+        ARTIFACTS_DIR=os.environ.get("ARTIFACTS_DIR", tempfile.mkdtemp()),
+        USER_PROFILES_DATA_PATH=os.environ.get(
+            "USER_PROFILES_DATA_PATH", os.path.join(DATA_DIR, "cleaned_user_profiles.csv")
+        ),
+        MEALS_DATA_PATH=os.environ.get("MEALS_DATA_PATH", os.path.join(DATA_DIR, "cleaned_meals.csv")),
+    )
+    backend_dir = os.path.join(os.path.dirname(__file__), "..")
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=backend_dir, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'step':>26} {'median ms':>10} {'min ms':>8}")
+    for step, label in (("import", "import app.main"), ("data", "load_disease_data (1st)"),
+                        ("client", "OpenAI client (1st)")):
+        times = [run[step] * 1e3 for run in runs]
+        print(f"{label:>26} {statistics.median(times):>10.0f} {min(times):>8.0f}")
+    print(f"Import left datasets and openai unloaded: {all(run['lazy'] for run in runs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: top-N user neighbours for user-based CF.
+
+Compares the previous pandas path (dense pivot + full user×user Pearson matrix, then one column),
+the exact sparse engine and the random-projection LSH engine on synthetic interaction data.
+Recall is measured against the exact engine's neighbour lists.
+
+Usage (from backend/): python -m benchmarks.bench_user_neighbours [--users 1000 10000 100000]
+"""
+import argparse
+import os
+import time
+
+# The benchmark never touches the database, but importing the app requires these settings
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+import numpy as np
+from app.services.recommender.interaction_matrix import InteractionMatrix
+from app.services.recommender.user_neighbours import RandomProjectionLSH, UserNeighbourEngine
+
+
+def synthetic_interactions(n_users, n_meals, per_user, seed=0):
+    rng = np.random.default_rng(seed)
+    # Users draw meals from a few overlapping taste clusters so neighbourhoods are meaningful
+    clusters = rng.integers(0, 20, n_users)
+    user_ids = np.repeat(np.arange(1, n_users + 1), per_user)
+    centres = np.repeat(clusters * (n_meals // 20), per_user)
+    meal_ids = (centres + rng.normal(0, n_meals / 15, len(user_ids)).astype(np.int64)) % n_meals + 1
+    scores = rng.integers(1, 4, len(user_ids))
+    return InteractionMatrix.from_interactions(user_ids, meal_ids, scores)
+
+
+def time_queries(fn, queries):
+    start = time.perf_counter()
+    results = [fn(user_id) for user_id in queries]
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+
+def pandas_neighbours(interactions, user_id, n):
+    # The previous per-request path: dense pivot and a full Pearson matrix between users
+    user_ratings = interactions.to_frame()
+    similarity = user_ratings.T.corr(method="pearson").fillna(0)
+    return similarity[user_id].drop(user_id).sort_values(ascending=False).head(n)
+
+
+def recall(found, expected):
+    hits = sum(len({u for u, _ in f} & {u for u, _ in e}) for f, e in zip(found, expected))
+    return hits / max(sum(len(e) for e in expected), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--meals", type=int, default=300)
+    parser.add_argument("--per-user", type=int, default=15)
+    parser.add_argument("--neighbours", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--pandas-max-users", type=int, default=2000,
+                        help="skip the pandas path above this size (its memory grows with users²)")
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'pandas ms':>10} {'exact ms':>9} {'lsh build s':>11} {'lsh ms':>7} {'lsh recall':>10} {'lsh cand.':>9}")
+    for n_users in args.users:
+        interactions = synthetic_interactions(n_users, args.meals, args.per_user)
+        queries = np.random.default_rng(1).choice(interactions.user_ids, args.queries, replace=False)
+
+        exact = UserNeighbourEngine(interactions)
+        exact_ms, expected = time_queries(lambda u: exact.top_neighbours(u, args.neighbours), queries)
+
+        pandas_ms = float("nan")
+        if n_users <= args.pandas_max_users:
+            pandas_ms, _ = time_queries(lambda u: pandas_neighbours(interactions, u, args.neighbours), queries[:3])
+
+        start = time.perf_counter()
+        lsh = RandomProjectionLSH(interactions)
+        build_s = time.perf_counter() - start
+        approximate = UserNeighbourEngine(interactions, lsh=lsh)
+        lsh_ms, found = time_queries(lambda u: approximate.top_neighbours(u, args.neighbours), queries)
+        snapshot = interactions.snapshot()
+        candidates = np.mean([len(lsh.candidates(snapshot, snapshot.row_of(u))) for u in queries])
+
+        pandas_col = "skipped" if np.isnan(pandas_ms) else f"{pandas_ms:.1f}"
+        print(f"{n_users:>8} {pandas_col:>10} {exact_ms:>9.2f} {build_s:>11.2f} {lsh_ms:>7.2f} "
+              f"{recall(found, expected):>10.2f} {candidates:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: hybrid recommendations in the API process vs on the process-pool workers.
+
+Runs `--requests` recommendations for users 1..`--users` sequentially in-process, then through
+RecommendationWorkers with each `--processes` count (jobs submitted all at once), and reports throughput.
+On Linux it also reports each worker's private and shared resident memory from /proc/<pid>/smaps_rollup,
+showing the memory-mapped artifacts are shared rather than copied per worker.
+
+Needs a populated database: DATABASE_URL must point at it (a SQLite file works).
+
+Usage (from backend/): python -m benchmarks.bench_workers [--processes 1 2 4] [--requests 200] [--users 100]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+from app.core.database import SessionLocal
+from app.services.recommender.hybrid import hybrid_recommendation
+from app.services.recommender.workers import RecommendationWorkers
+
+
+def memory_kb(pid):
+    """
+    (private, shared) resident kB of a process, or None where smaps_rollup is unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            fields = dict(line.split(":", 1) for line in smaps if ":" in line)
+    except OSError:
+        return None
+    kb = {name: int(value.split()[0]) for name, value in fields.items() if value.strip().endswith("kB")}
+    return kb["Private_Clean"] + kb["Private_Dirty"], kb["Shared_Clean"] + kb["Shared_Dirty"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+    user_ids = [i % args.users + 1 for i in range(args.requests)]
+
+    db = SessionLocal()
+    try:
+        hybrid_recommendation(db, 1)  # Warm the in-process caches
+        started = time.perf_counter()
+        for user_id in user_ids:
+            hybrid_recommendation(db, user_id)
+        elapsed = time.perf_counter() - started
+        print(f"{'mode':>12} {'req/s':>8} {'worker private MB':>18} {'worker shared MB':>17}")
+        print(f"{'in-process':>12} {args.requests / elapsed:>8.1f}")
+
+        for processes in args.processes:
+            workers = RecommendationWorkers(processes)
+            workers.start(db)
+            try:
+                # Warm every worker: attach to the snapshot and artifacts, import the app
+                for future in [workers.submit(db, user_id) for user_id in user_ids[:processes * 4]]:
+                    future.result()
+                started = time.perf_counter()
+                for future in [workers.submit(db, user_id) for user_id in user_ids]:
+                    future.result()
+                elapsed = time.perf_counter() - started
+
+                memory = [memory_kb(pid) for pid in workers._executor._processes]
+                private = shared = "n/a"
+                if all(memory):
+                    private = f"{sum(m[0] for m in memory) / len(memory) / 1024:.1f}"
+                    shared = f"{sum(m[1] for m in memory) / len(memory) / 1024:.1f}"
+                print(f"{f'{processes} workers':>12} {args.requests / elapsed:>8.1f} {private:>18} {shared:>17}")
+            finally:
+                workers.shutdown()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
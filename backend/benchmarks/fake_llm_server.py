@@ -0,0 +1,75 @@
+"""
+A local fake of the chat completions API for benchmarks, understanding the prompts in app.core.llm_integration.
+
+Disease prompts are "answered" by substring matching the history against the listed diseases (single prompts
+get a comma-separated list, numbered multi-item prompts a JSON object); anything else gets a canned diet.
+Each reply takes `base_latency` seconds plus `item_latency` per history in the prompt, to mimic an LLM's
+round trip and per-item generation time.
+
+Usage (from backend/): python -m benchmarks.fake_llm_server [--port 8765] [--base-latency 0.3]
+    [--item-latency 0.02], then point OPENAI_BASE_URL at http://127.0.0.1:8765/v1
+"""
+import argparse
+import json
+import re
+
+from app.tests.conftest import StubLLMServer
+
+
+def find_diseases(history, valid_diseases):
+    # Listed diseases named in the history, in order of mention
+    history = history.lower()
+    positions = {}
+    for disease in valid_diseases:
+        found = [p for p in (history.find(disease), history.find(disease.replace("_", " "))) if p >= 0]
+        if found:
+            positions[disease] = min(found)
+    return sorted(positions, key=positions.get)
+
+
+def answer(prompt):
+    """
+    The fake model's reply to `prompt`, and the number of histories it covered.
+    """
+    listed = re.search(r"in this list: (.*?)\.\n", prompt)
+    valid_diseases = [d.strip() for d in listed.group(1).split(",")] if listed else []
+
+    if "numbered medical histories" in prompt:
+        items = re.findall(r"^(\d+)\. (.*)$", prompt.split("\n\n")[1], flags=re.MULTILINE)
+        return json.dumps({number: find_diseases(history, valid_diseases) for number, history in items}), len(items)
+    if prompt.startswith("Extract diseases"):
+        history = prompt.split("\n\n")[1]
+        return ", ".join(find_diseases(history, valid_diseases)), 1
+    return "A balanced diet rich in vegetables, whole grains and lean protein.", 1
+
+
+class FakeLLMServer(StubLLMServer):
+    """
+    The tests' StubLLMServer (app.tests.conftest), answering every prompt with `answer`.
+    """
+
+    def __init__(self, port=0, base_latency=0.3, item_latency=0.02):
+        super().__init__(
+            delay=lambda prompt: base_latency + item_latency * answer(prompt)[1],
+            reply=lambda prompt: answer(prompt)[0],
+            port=port,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--base-latency", type=float, default=0.3)
+    parser.add_argument("--item-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.port, args.base_latency, args.item_latency)
+    print(f"Fake LLM listening on {server.base_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
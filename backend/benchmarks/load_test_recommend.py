@@ -0,0 +1,86 @@
+"""
+Load test: concurrent GET /api/v1/recommender/recommend/{user_id} requests.
+
+Fires `--requests` requests with at most `--concurrency` in flight and reports throughput and latency
+percentiles. Without `--url` the app is driven in-process through httpx's ASGI transport (using the
+configured DATABASE_URL), so a handler that blocks the event loop shows up as throughput that does not
+grow with concurrency. `--db-latency-ms` adds a sleep to every SQL statement in-process, to model the
+round trip to a remote database that a local SQLite file does not have.
+
+Usage (from backend/):
+    python -m benchmarks.load_test_recommend [--url http://localhost:8000] [--concurrency 1 8 32]
+        [--requests 200] [--users 1-100] [--refresh] [--db-latency-ms 2]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "")
+
+import httpx
+import numpy as np
+
+ENDPOINT = "/api/v1/recommender/recommend/{user_id}"
+
+
+def parse_users(value):
+    first, _, last = value.partition("-")
+    return list(range(int(first), int(last or first) + 1))
+
+
+async def fire(client, user_ids, n_requests, concurrency, refresh):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(
+                ENDPOINT.format(user_id=user_ids[i % len(user_ids)]),
+                params={"top_n": 10, "refresh": str(refresh).lower()},
+            )
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return time.perf_counter() - started, np.array(latencies), errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; omit to drive the app in-process")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=parse_users, default=parse_users("1-100"))
+    parser.add_argument("--refresh", action="store_true", help="Force fresh recommendations instead of stored ones")
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="In-process only: simulated latency per statement")
+    args = parser.parse_args()
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        from app.main import app
+        if args.db_latency_ms:
+            from sqlalchemy import event
+            from app.core.database import engine
+
+            @event.listens_for(engine, "before_cursor_execute")
+            def delay(*_):
+                time.sleep(args.db_latency_ms / 1e3)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app", timeout=120)
+
+    async with client:
+        await fire(client, args.users, len(args.users), 8, args.refresh)  # Warm caches and artifacts
+        print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for concurrency in args.concurrency:
+            elapsed, latencies, errors = await fire(client, args.users, args.requests, concurrency, args.refresh)
+            print(f"{concurrency:>11} {args.requests / elapsed:>8.1f} {np.percentile(latencies, 50) * 1e3:>8.1f} "
+                  f"{np.percentile(latencies, 99) * 1e3:>8.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
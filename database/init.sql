@@ -90,6 +90,9 @@ CREATE TABLE IF NOT EXISTS recommendations (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Stored recommendations are read per user, newest only
+CREATE INDEX IF NOT EXISTS ix_recommendations_user_id_created_at ON recommendations (user_id, created_at);
+
 -- Recreate Exercise User Profiles Table
 CREATE TABLE IF NOT EXISTS exercise_user_profiles (
     user_id SERIAL PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,